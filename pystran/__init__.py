@@ -50,8 +50,10 @@ readily using numerical integration.
   neutral axis must pass through the centroid.
 - Warping of the cross sections is not modelled, hence only free torsion
   effects are included.
-- Member loading is not considered. All member loading needs to be converted to
-  nodal forces.
+- Member loads (distributed, concentrated on the span, and thermal) are
+  converted to equivalent joint loads, and their fixed-end forces are added to
+  the resultants (both the vectorized ones of ``resultants`` and the
+  single-member functions of ``beam`` and ``truss`` used by the plots).
 - Internal hinges can be modelled with linked joints. No member end releases
   are implemented.
 - Degrees of freedom are only along the global Cartesian axes. Skew supports
@@ -74,6 +76,15 @@ __all__ = [
     "beam",
     "spring",
     "plots",
+    "graph",
+    "spatial",
+    "eigen",
+    "dynamics",
+    "superelement",
+    "resultants",
+    "loadcases",
+    "memberloads",
+    "influence",
     "Abaqus_import"
 ]
 
@@ -89,4 +100,13 @@ from . import rigid
 from . import beam
 from . import spring
 from . import plots
+from . import graph
+from . import spatial
+from . import eigen
+from . import dynamics
+from . import superelement
+from . import resultants
+from . import loadcases
+from . import memberloads
+from . import influence
 from . import Abaqus_import
\ No newline at end of file
@@ -2,7 +2,67 @@
 Define utility for assembling.
 """
 
-from numpy import arange
+from numpy import arange, array, asarray, concatenate, repeat, tile, float64, int64
+import scipy.sparse
+
+
+class SparseAssembler:
+    """
+    Collector of the entries of a sparse global matrix.
+
+    An instance can be passed to the assembly functions of the members in
+    place of a dense global matrix: :func:`assemble` then records the degrees
+    of freedom and the local matrices. The sparse global matrix is formed at
+    the end with :meth:`tocsc` (duplicate entries are summed). Alternatively,
+    the local matrices may be retrieved with :meth:`element_blocks`, for
+    element-by-element evaluation of matrix-vector products.
+
+    Parameters
+    ----------
+    shape
+        Shape of the global matrix.
+    """
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.dofs = []
+        self.blocks = []
+
+    def add(self, dof, k):
+        """
+        Record the local matrix ``k`` for the degrees of freedom ``dof``.
+        """
+        self.dofs.append(asarray(dof, dtype=int64))
+        self.blocks.append(asarray(k, dtype=float64))
+
+    def tocsc(self):
+        """
+        Form the sparse global matrix in the compressed sparse column format.
+        """
+        if not self.blocks:
+            return scipy.sparse.csc_matrix(self.shape)
+        rows = concatenate([repeat(dof, len(dof)) for dof in self.dofs])
+        cols = concatenate([tile(dof, len(dof)) for dof in self.dofs])
+        vals = concatenate([k.ravel() for k in self.blocks])
+        return scipy.sparse.coo_matrix((vals, (rows, cols)), shape=self.shape).tocsc()
+
+    def element_blocks(self):
+        """
+        Retrieve the recorded local matrices, grouped by their size.
+
+        Returns
+        -------
+        list
+            List of pairs ``(dofs, ks)``: ``dofs`` is an integer array with
+            one row of degrees of freedom per local matrix, and ``ks`` is a
+            three-dimensional array of the local matrices of the same size.
+        """
+        groups = {}
+        for dof, k in zip(self.dofs, self.blocks):
+            groups.setdefault(len(dof), ([], []))
+            groups[len(dof)][0].append(dof)
+            groups[len(dof)][1].append(k)
+        return [(array(d), array(k)) for d, k in groups.values()]
 
 
 def assemble(kg, dof, k):
@@ -16,7 +76,7 @@ def assemble(kg, dof, k):
     Parameters
     ----------
     kg
-        Global matrix.
+        Global matrix (a dense array, or a :class:`SparseAssembler`).
     dof
         Array of degrees of freedom.
     k
@@ -26,6 +86,9 @@ def assemble(kg, dof, k):
     -------
     kg
     """
+    if isinstance(kg, SparseAssembler):
+        kg.add(dof, k)
+        return kg
     for r in arange(len(dof)):
         for c in arange(len(dof)):
             gr, gc = dof[r], dof[c]
@@ -2,7 +2,7 @@
 Define beam mechanical quantities.
 """
 
-from numpy import dot, outer, concatenate, zeros
+from numpy import dot, outer, concatenate, zeros, array
 from pystran import geometry
 from pystran.geometry import herm_basis_xi2, herm_basis_xi3, herm_basis
 from pystran import gauss
@@ -519,6 +519,43 @@ def beam_3d_xy_3rd_deriv_displ_matrix(e_y, e_z, h):
     return B
 
 
+def _fixed_end_force(member, quantity, h, xi):
+    # The internal force of the fixed-end state of a member with member loads
+    # (refer to pystran.memberloads.set_fixed_end_state), obtained by statics
+    # from the fixed-end forces at the first joint and the loads on the span.
+    if "fixed_end" not in member:
+        return 0.0
+    F = member["fixed_end"]["forces"]
+    if len(F) == 2:
+        # A truss member: only the axial force
+        return F[0]
+    x = h * (1 + xi) / 2
+    # The resultants of the loads on [0, x], and their moments about x
+    P = dict(x=0.0, y=0.0, z=0.0)
+    Mq = dict(x=0.0, y=0.0, z=0.0)
+    for load in member["fixed_end"]["loads"]:
+        d = load["direction"]
+        if load["type"] == "distributed":
+            qi, qj = load["qi"], load["qj"]
+            P[d] += qi * x + (qj - qi) * x**2 / (2 * h)
+            Mq[d] += qi * x**2 / 2 + (qj - qi) * x**3 / (6 * h)
+        elif x >= h * (1 + load["xi"]) / 2:
+            P[d] += load["P"]
+            Mq[d] += load["P"] * (x - h * (1 + load["xi"]) / 2)
+    if len(F) == 6:
+        values = dict(N=F[0] - P["x"], Qz=F[1] - P["z"], My=F[2] + F[1] * x - Mq["z"])
+    else:
+        values = dict(
+            N=F[0] - P["x"],
+            Qy=F[1] - P["y"],
+            Qz=F[2] - P["z"],
+            T=F[3],
+            My=F[4] + F[2] * x - Mq["z"],
+            Mz=F[5] - F[1] * x + Mq["y"],
+        )
+    return values[quantity]
+
+
 def beam_2d_moment(member, i, j, xi):
     r"""
     Compute 2d beam moment based on the displacements stored at the joints. The
@@ -527,7 +564,9 @@ def beam_2d_moment(member, i, j, xi):
     The moment is mathematically defined as :math:`M = -EI d^2w/dx^2`.
 
     The curvature is computed with the curvature-displacement matrix :math:`B`
-    by the function :func:`beam_2d_curv_displ_matrix`.
+    by the function :func:`beam_2d_curv_displ_matrix`. The moment of the
+    fixed-end state of the member loads is added (refer to
+    :func:`pystran.memberloads.set_fixed_end_state`).
 
     Parameters
     ----------
@@ -550,13 +589,13 @@ def beam_2d_moment(member, i, j, xi):
     --------
     :func:`beam_2d_curv_displ_matrix`
     """
-    _, e_z, h = geometry.member_2d_geometry(i, j)
+    _, e_z, h = geometry.member_geometry(member, i, j)
     sect = member["section"]
     E, I = sect["E"], sect["I"]
     ui, uj = i["displacements"], j["displacements"]
     u = concatenate([ui, uj])
     B = beam_2d_curv_displ_matrix(e_z, h, xi)
-    return (-E * I * dot(B, u))[0] # return a scalar
+    return (-E * I * dot(B, u))[0] + _fixed_end_force(member, "My", h, xi)
 
 
 def beam_3d_moment(member, i, j, axis, xi):
@@ -572,7 +611,9 @@ def beam_3d_moment(member, i, j, axis, xi):
 
     The curvatures are computed with  curvature-displacement matrices :math:`B`
     by the functions :func:`beam_3d_xz_curv_displ_matrix` and
-    :func:`beam_3d_xy_curv_displ_matrix`, respectively.
+    :func:`beam_3d_xy_curv_displ_matrix`, respectively. The moment of the
+    fixed-end state of the member loads is added (refer to
+    :func:`pystran.memberloads.set_fixed_end_state`).
 
     Parameters
     ----------
@@ -594,7 +635,7 @@ def beam_3d_moment(member, i, j, axis, xi):
         The moment resultant.
     """
     sect = member["section"]
-    _, e_y, e_z, h = geometry.member_3d_geometry(i, j, sect["xy_vector"], sect["xz_vector"])
+    _, e_y, e_z, h = geometry.member_geometry(member, i, j)
     E, Iy, Iz = sect["E"], sect["Iy"], sect["Iz"]
     ui, uj = i["displacements"], j["displacements"]
     u = concatenate([ui, uj])
@@ -604,7 +645,7 @@ def beam_3d_moment(member, i, j, axis, xi):
     else:
         B = beam_3d_xy_curv_displ_matrix(e_y, e_z, h, xi)
         M = +E * Iz * dot(B, u)
-    return M[0] # return a scalar
+    return M[0] + _fixed_end_force(member, "M" + axis, h, xi)
 
 
 def beam_3d_torsion_moment(member, i, j, xi):
@@ -618,6 +659,8 @@ def beam_3d_torsion_moment(member, i, j, xi):
     :func:`beam_3d_torsion_displ_matrix`.
 
     The torsion moment is uniform along the beam. Hence, ``xi`` does not matter.
+    The moment of the fixed-end state of the member loads is added (refer to
+    :func:`pystran.memberloads.set_fixed_end_state`).
 
     Parameters
     ----------
@@ -637,13 +680,13 @@ def beam_3d_torsion_moment(member, i, j, xi):
         The moment resultant.
     """
     sect = member["section"]
-    e_x, _, _, h = geometry.member_3d_geometry(i, j, sect["xy_vector"], sect["xz_vector"])
+    e_x, _, _, h = geometry.member_geometry(member, i, j)
     G, J = sect["G"], sect["J"]
     ui, uj = i["displacements"][3:6], j["displacements"][3:6]
     u = concatenate([ui, uj])
     B = beam_3d_torsion_displ_matrix(e_x, h, 0.0)  # single-point integration
     T = G * J * dot(B, u)
-    return T[0] # return a scalar
+    return T[0] + _fixed_end_force(member, "T", h, xi)
 
 
 def beam_2d_axial_force(member, i, j, xi):
@@ -654,7 +697,9 @@ def beam_2d_axial_force(member, i, j, xi):
     Refer to the function :func:`pystran.truss.truss_strain_displacement` that computes
     the strain-displacement matrix for a truss member.
 
-    The axial force is uniform along the beam. Hence, ``xi`` does not matter.
+    The axial force is uniform along the beam, unless the beam carries member
+    loads along its axis (the force of the fixed-end state of the member
+    loads is added, refer to :func:`pystran.memberloads.set_fixed_end_state`).
 
     Parameters
     ----------
@@ -678,23 +723,23 @@ def beam_2d_axial_force(member, i, j, xi):
     :func:`pystran.truss.truss_strain_displacement`
     """
     sect = member["section"]
-    e_x, _, h = geometry.member_2d_geometry(i, j)
+    e_x, _, h = geometry.member_geometry(member, i, j)
     E, A = sect["E"], sect["A"]
     ui, uj = i["displacements"][0:2], j["displacements"][0:2]
     u = concatenate([ui, uj])
     B = truss.truss_strain_displacement(e_x, h)
     N = E * A * dot(B, u)
-    return N[0] # return a scalar
+    return N[0] + _fixed_end_force(member, "N", h, xi)
 
 def _beam_2d_volume(member, i, j):
     sect = member["section"]
-    _, _, h = geometry.member_2d_geometry(i, j)
+    _, _, h = geometry.member_geometry(member, i, j)
     A = sect["A"]
     return A * h  # return the volume
 
 def _beam_3d_volume(member, i, j):
     sect = member["section"]
-    _, _, _, h = geometry.member_3d_geometry(i, j, sect["xy_vector"], sect["xz_vector"])
+    _, _, _, h = geometry.member_geometry(member, i, j)
     A = sect["A"]
     return A * h  # return the volume
 
@@ -727,7 +772,9 @@ def beam_3d_axial_force(member, i, j, xi):
     r"""
     Compute 3d beam or truss axial force based on the displacements stored at the joints.
 
-    The axial force is uniform along the beam. Hence, ``xi`` does not matter.
+    The axial force is uniform along the beam, unless the beam carries member
+    loads along its axis (the force of the fixed-end state of the member
+    loads is added, refer to :func:`pystran.memberloads.set_fixed_end_state`).
 
     Parameters
     ----------
@@ -747,13 +794,13 @@ def beam_3d_axial_force(member, i, j, xi):
         The force resultant.
     """
     sect = member["section"]
-    e_x, _, _, h = geometry.member_3d_geometry(i, j, sect['xy_vector'], sect['xz_vector'])
+    e_x, _, _, h = geometry.member_geometry(member, i, j)
     E, A = sect["E"], sect["A"]
     ui, uj = i["displacements"][0:3], j["displacements"][0:3]
     u = concatenate([ui, uj])
     B = beam_3d_stretch_displ_matrix(e_x, h, 0.0)  # single-point integration
     N = E * A * dot(B, u)
-    return N[0] # return a scalar
+    return N[0] + _fixed_end_force(member, "N", h, xi)
 
 
 def beam_3d_shear_force(member, i, j, axis, xi):
@@ -761,7 +808,9 @@ def beam_3d_shear_force(member, i, j, axis, xi):
     Compute 3d shear force based on the displacements stored at the joints.
 
     The shear force in the direction of axis ``axis``  (``'y'`` or ``'z'``) is
-    uniform along the beam.  Hence, ``xi`` does not matter.
+    uniform along the beam, unless the beam carries transverse member loads
+    (the force of the fixed-end state of the member loads is added, refer to
+    :func:`pystran.memberloads.set_fixed_end_state`).
 
     Parameters
     ----------
@@ -783,7 +832,7 @@ def beam_3d_shear_force(member, i, j, axis, xi):
         The force resultant.
     """
     sect = member["section"]
-    _, e_y, e_z, h = geometry.member_3d_geometry(i, j, sect["xy_vector"], sect["xz_vector"])
+    _, e_y, e_z, h = geometry.member_geometry(member, i, j)
     E, Iy, Iz = sect["E"], sect["Iy"], sect["Iz"]
     ui, uj = i["displacements"], j["displacements"]
     u = concatenate([ui, uj])
@@ -793,7 +842,7 @@ def beam_3d_shear_force(member, i, j, axis, xi):
     else:
         B = beam_3d_xy_3rd_deriv_displ_matrix(e_y, e_z, h)
         Q = -E * Iz * dot(B, u)
-    return Q[0]
+    return Q[0] + _fixed_end_force(member, "Q" + axis, h, xi)
 
 
 def beam_2d_shear_force(member, i, j, xi):
@@ -801,7 +850,9 @@ def beam_2d_shear_force(member, i, j, xi):
     Compute 2d beam shear force based on the displacements stored at the
     joints.
 
-    The shear force is uniform along the beam.  Hence, ``xi`` does not matter.
+    The shear force is uniform along the beam, unless the beam carries
+    transverse member loads (the force of the fixed-end state of the member
+    loads is added, refer to :func:`pystran.memberloads.set_fixed_end_state`).
 
     Parameters
     ----------
@@ -820,13 +871,13 @@ def beam_2d_shear_force(member, i, j, xi):
     float
         The force resultant.
     """
-    _, e_z, h = geometry.member_2d_geometry(i, j)
+    _, e_z, h = geometry.member_geometry(member, i, j)
     sect = member["section"]
     E, I = sect["E"], sect["I"]
     ui, uj = i["displacements"], j["displacements"]
     u = concatenate([ui, uj])
     B = beam_2d_3rd_deriv_displ_matrix(e_z, h)
-    return (-E * I * dot(B, u))[0] # return a scalar
+    return (-E * I * dot(B, u))[0] + _fixed_end_force(member, "Qz", h, xi)
 
 
 def beam_3d_stretch_displ_matrix(e_x, h, xi):
@@ -956,7 +1007,7 @@ def beam_3d_torsion_displ_matrix(e_x, h, xi):
     return B
 
 
-def assemble_stiffness(Kg, member, i, j):
+def assemble_stiffness(Kg, member, i, j, geom=None):
     """
     Assemble beam stiffness matrix.
 
@@ -980,6 +1031,9 @@ def assemble_stiffness(Kg, member, i, j):
         Dictionary that defines the data of the first joint of the member.
     j
         Dictionary that defines the data of the second joint of the member.
+    geom
+        Optional: the geometry of the member (refer to
+        :func:`pystran.geometry.member_geometry`).
 
     Returns
     -------
@@ -999,7 +1053,7 @@ def assemble_stiffness(Kg, member, i, j):
     dof = concatenate([i["dof"], j["dof"]])
     if beam_is_2d:
         sect = member["section"]
-        e_x, e_z, h = geometry.member_2d_geometry(i, j)
+        e_x, e_z, h = geometry.member_geometry(member, i, j, geom)
         # Add stiffness in bending.
         E, I = sect["E"], sect["I"]
         k = beam_2d_bending_stiffness(e_z, h, E, I)
@@ -1011,7 +1065,7 @@ def assemble_stiffness(Kg, member, i, j):
         Kg = assemble.assemble(Kg, dof, k)
     else:
         sect = member["section"]
-        e_x, e_y, e_z, h = geometry.member_3d_geometry(i, j, sect["xy_vector"], sect["xz_vector"])
+        e_x, e_y, e_z, h = geometry.member_geometry(member, i, j, geom)
         # Add stiffness in bending.
         E, Iy, Iz = sect["E"], sect["Iy"], sect["Iz"]
         kxy, kxz = beam_3d_bending_stiffness(e_y, e_z, h, E, Iy, Iz)
@@ -1030,7 +1084,7 @@ def assemble_stiffness(Kg, member, i, j):
     return Kg
 
 
-def assemble_mass(Mg, member, i, j):
+def assemble_mass(Mg, member, i, j, geom=None):
     """
     Assemble beam mass matrix.
 
@@ -1050,6 +1104,9 @@ def assemble_mass(Mg, member, i, j):
         Dictionary that defines the data of the first joint of the member.
     j
         Dictionary that defines the data of the second joint of the member.
+    geom
+        Optional: the geometry of the member (refer to
+        :func:`pystran.geometry.member_geometry`).
 
     Returns
     -------
@@ -1067,10 +1124,10 @@ def assemble_mass(Mg, member, i, j):
     sect = member["section"]
     rho, A = sect["rho"], sect["A"]
     if beam_is_2d:
-        e_x, e_z, h = geometry.member_2d_geometry(i, j)
+        e_x, e_z, h = geometry.member_geometry(member, i, j, geom)
         m = beam_2d_mass(e_x, e_z, h, rho, A)
     else:
-        e_x, e_y, e_z, h = geometry.member_3d_geometry(i, j, sect["xy_vector"], sect["xz_vector"])
+        e_x, e_y, e_z, h = geometry.member_geometry(member, i, j, geom)
         Ix = sect["Ix"]
         m = beam_3d_mass(e_x, e_y, e_z, h, rho, A, Ix)
     Mg = assemble.assemble(Mg, dof, m)
@@ -1212,6 +1269,138 @@ def beam_3d_mass(e_x, e_y, e_z, h, rho, A, Ix):
     return m
 
 
+def beam_2d_lumped_mass(h, rho, A, lumping="HRZ"):
+    r"""
+    Compute beam lumped (diagonal) mass matrix in 2d.
+
+    Half of the mass of the beam is assigned to each joint in each direction
+    of translation. The rotational inertia depends on the lumping scheme:
+
+    - ``"HRZ"``: the diagonal of the consistent mass matrix (refer to
+      :func:`beam_2d_mass`) is scaled so that the total mass in each direction
+      is preserved, which gives the rotational inertia
+      :math:`\rho A h^3/78`.
+    - ``"row-sum"``: the rows of the consistent mass matrix are summed, which
+      gives zero rotational inertia (the rotations are then massless).
+
+    Parameters
+    ----------
+    h
+        Length of the beam.
+    rho
+        Mass density of the material.
+    A
+        Area of the cross section.
+    lumping
+        Optional: ``"HRZ"`` (default) or ``"row-sum"``.
+
+    Returns
+    -------
+    array
+        Diagonal of the mass matrix of the beam (a vector).
+    """
+    mt = rho * A * h / 2
+    if lumping == "HRZ":
+        mr = rho * A * h**3 / 78
+    elif lumping == "row-sum":
+        mr = 0.0
+    else:
+        raise ValueError(f"Unknown lumping {lumping}")
+    return array([mt, mt, mr, mt, mt, mr])
+
+
+def beam_3d_lumped_mass(e_x, h, rho, A, Ix, lumping="HRZ"):
+    r"""
+    Compute beam lumped (diagonal) mass matrix in 3d.
+
+    Half of the mass of the beam is assigned to each joint in each direction
+    of translation, and half of the mass moment of inertia about the axis of
+    the beam, :math:`\rho I_x h`, is assigned to each joint. The rotational
+    inertia about the axes perpendicular to the beam depends on the lumping
+    scheme (refer to :func:`beam_2d_lumped_mass`): :math:`\rho A h^3/78` for
+    ``"HRZ"``, zero for ``"row-sum"``.
+
+    The rotational inertia of the joint is a tensor, which is diagonal in the
+    local coordinate system of the beam. Its diagonal in the global
+    coordinate system is used.
+
+    Parameters
+    ----------
+    e_x
+        Unit vector of the local cartesian coordinate system in the direction
+        of the axis of the beam.
+    h
+        Length of the beam.
+    rho
+        Mass density of the material.
+    A
+        Area of the cross section.
+    Ix
+        Second moment of area of the cross section for rotation about x.
+    lumping
+        Optional: ``"HRZ"`` (default) or ``"row-sum"``.
+
+    Returns
+    -------
+    array
+        Diagonal of the mass matrix of the beam (a vector).
+    """
+    mt = rho * A * h / 2
+    if lumping == "HRZ":
+        mb = rho * A * h**3 / 78
+    elif lumping == "row-sum":
+        mb = 0.0
+    else:
+        raise ValueError(f"Unknown lumping {lumping}")
+    mx = rho * Ix * h / 2
+    # Diagonal of mb * I + (mx - mb) * outer(e_x, e_x)
+    mr = mb + (mx - mb) * e_x**2
+    return concatenate([[mt, mt, mt], mr, [mt, mt, mt], mr])
+
+
+def assemble_lumped_mass(mg, member, i, j, lumping="HRZ", geom=None):
+    """
+    Assemble beam lumped mass matrix.
+
+    Parameters
+    ----------
+    mg
+        Diagonal of the global structural mass matrix (a vector).
+    member
+        Dictionary that defines the data of the member.
+    i
+        Dictionary that defines the data of the first joint of the member.
+    j
+        Dictionary that defines the data of the second joint of the member.
+    lumping
+        Optional: ``"HRZ"`` (default) or ``"row-sum"``.
+    geom
+        Optional: the geometry of the member (refer to
+        :func:`pystran.geometry.member_geometry`).
+
+    Returns
+    -------
+    array
+        Updated global vector is returned.
+
+    See Also
+    --------
+    :func:`beam_2d_lumped_mass`
+    :func:`beam_3d_lumped_mass`
+    """
+    beam_is_2d = len(i["coordinates"]) == len(j["coordinates"]) == 2
+    dof = concatenate([i["dof"], j["dof"]])
+    sect = member["section"]
+    rho, A = sect["rho"], sect["A"]
+    if beam_is_2d:
+        _, _, h = geometry.member_geometry(member, i, j, geom)
+        mg[dof] += beam_2d_lumped_mass(h, rho, A, lumping)
+    else:
+        e_x, _, _, h = geometry.member_geometry(member, i, j, geom)
+        mg[dof] += beam_3d_lumped_mass(e_x, h, rho, A, sect["Ix"], lumping)
+    return mg
+
+
 def beam_3d_end_forces(member, i, j):
     """
     Compute the end forces of a beam element in 3d.
@@ -1235,10 +1424,10 @@ def beam_3d_end_forces(member, i, j):
         ``'Myi'``, ``'Mzi'``, ``'Nj'``, ``'Qyj'``, ``'Qzj'``, ``'Tj'``,
         ``'Myj'``, ``'Mzj'``,  is returned.
     """
-    Ni = beam_3d_axial_force(member, i, j, 0.0)
-    Nj = -beam_3d_axial_force(member, i, j, 0.0)
-    Ti = beam_3d_torsion_moment(member, i, j, 0.0)
-    Tj = -beam_3d_torsion_moment(member, i, j, 0.0)
+    Ni = beam_3d_axial_force(member, i, j, -1.0)
+    Nj = -beam_3d_axial_force(member, i, j, +1.0)
+    Ti = beam_3d_torsion_moment(member, i, j, -1.0)
+    Tj = -beam_3d_torsion_moment(member, i, j, +1.0)
     Myi = beam_3d_moment(member, i, j, "y", -1.0)
     Myj = -beam_3d_moment(member, i, j, "y", +1.0)
     Mzi = beam_3d_moment(member, i, j, "z", -1.0)
@@ -1285,8 +1474,8 @@ def beam_2d_end_forces(member, i, j):
         Dictionary with the keys ``'Ni'``, ``'Qzi'``, ``'Myi'``,  ``'Nj'``,
         ``'Qzj'``, ``'Myj'``,  is returned.
     """
-    Ni = beam_2d_axial_force(member, i, j, 0.0)
-    Nj = -beam_2d_axial_force(member, i, j, 0.0)
+    Ni = beam_2d_axial_force(member, i, j, -1.0)
+    Nj = -beam_2d_axial_force(member, i, j, +1.0)
     Myi = beam_2d_moment(member, i, j, -1.0)
     Myj = -beam_2d_moment(member, i, j, +1.0)
     Qzi = beam_2d_shear_force(member, i, j, -1.0)
@@ -0,0 +1,1147 @@
+"""
+Define the functions for the analysis of the response of the model to
+time-dependent loading.
+
+The loads that vary in time are attached to the joints with
+:func:`add_load_history`. The supports are assumed to be fixed (zero motion)
+in the dynamic analyses, except in the response spectrum analysis
+(:func:`response_spectrum`), where the supports move together.
+"""
+
+from math import pi
+from numbers import Integral
+from numpy import array, zeros, asarray, interp, float64, int64, arange, ones, atleast_1d
+from numpy import complex128, empty, linspace, where, repeat, diff, einsum, vstack
+from numpy import bincount, inf
+from numpy.linalg import eigvalsh
+from numpy.lib.format import open_memmap
+from concurrent.futures import ThreadPoolExecutor
+import scipy.sparse
+import scipy.sparse.csgraph
+from scipy.sparse.linalg import splu
+from scipy.linalg import cho_factor, cho_solve, solve
+from pystran.model import build_stiffness_matrix, build_mass_matrix
+from pystran.model import build_lumped_mass_vector, build_element_stiffness_blocks
+from pystran.assemble import SparseAssembler
+from pystran import geometry, spring, rigid, resultants
+
+
+def add_load_history(j, dof, history):
+    """
+    Add a time-dependent load to a joint.
+
+    Several histories may be added to the same degree of freedom: they are
+    summed.
+
+    Parameters
+    ----------
+    j
+        The joint (obtained from the model as ``m["joints"][jid]``).
+    dof
+        The degree of freedom (0, 1, ...). Refer to the model key ``'freedoms'``.
+    history
+        Either a function of time, ``history(t)``, returning the signed
+        magnitude of the load, or a pair of sequences ``(times, values)``,
+        which is interpolated linearly (the load is constant outside of the
+        range of the times).
+
+    Returns
+    -------
+    None
+
+    Examples
+    --------
+    >>> dynamics.add_load_history(j, freedoms.U2, ([0.0, 0.01, 0.02], [0.0, -5e3, 0.0]))
+    >>> dynamics.add_load_history(j, freedoms.U1, lambda t: 100.0 * sin(40 * t))
+    """
+    if not callable(history):
+        times, values = history
+        history = (array(times, dtype=float64), array(values, dtype=float64))
+        if history[0].shape != history[1].shape:
+            raise RuntimeError("Times and values of the history must match")
+    if "load_histories" not in j:
+        j["load_histories"] = {}
+    if dof not in j["load_histories"]:
+        j["load_histories"][dof] = []
+    j["load_histories"][dof].append(history)
+    return None
+
+
+def _load_histories(m):
+    # Collect the load histories of all the joints: the global degrees of
+    # freedom, and the histories themselves.
+    dofs, histories = [], []
+    for joint in m["joints"].values():
+        if "load_histories" in joint:
+            for dof, hs in joint["load_histories"].items():
+                for h in hs:
+                    dofs.append(joint["dof"][dof])
+                    histories.append(h)
+    return dofs, histories
+
+
+def _load_distribution(m):
+    # The sparse matrix that distributes the load histories to the free
+    # degrees of freedom, and the histories themselves.
+    nf = m["nfreedof"]
+    dofs, histories = _load_histories(m)
+    dofs = array(dofs, dtype=int64)
+    free = dofs < nf
+    P = scipy.sparse.csr_matrix(
+        (ones(free.sum()), (dofs[free], arange(len(dofs))[free])),
+        shape=(nf, len(dofs)),
+    )
+    return P, histories
+
+
+def _history_values(histories, t):
+    # The values of all the load histories at one time: the solvers evaluate
+    # the loads step by step, instead of for all the times at once.
+    return array(
+        [h(t) if callable(h) else interp(t, h[0], h[1]) for h in histories], dtype=float64
+    )
+
+
+def _output_array(out, filename, shape):
+    if out is not None:
+        if out.shape != shape:
+            raise RuntimeError(f"Output array must have the shape {shape}")
+        return out
+    if filename is not None:
+        return open_memmap(filename, mode="w+", dtype=float64, shape=shape)
+    return zeros(shape)
+
+
+def _check_numbering(m):
+    if not ("ntotaldof" in m) or m["ntotaldof"] <= 0:
+        raise RuntimeError(
+            "No degrees of freedom: the numbers of degrees of freedom need to be generated"
+        )
+    if not ("nfreedof" in m) or m["nfreedof"] <= 0:
+        raise RuntimeError("No free degrees of freedom: nothing to compute")
+
+
+def solve_transient(
+    m,
+    dt,
+    nsteps,
+    alpha=0.0,
+    damping=(0.0, 0.0),
+    U0=None,
+    V0=None,
+    dofs=None,
+    out=None,
+    filename=None,
+):
+    r"""
+    Solve the linear transient dynamics of the discrete model.
+
+    The equation of motion
+
+    .. math::
+        M \cdot A + C \cdot V + K \cdot U = F(t)
+
+    is integrated in time with the Hilber-Hughes-Taylor (HHT-:math:`\alpha`)
+    method with a constant time step. The parameters of the Newmark formulas
+    are :math:`\beta = (1-\alpha)^2/4` and :math:`\gamma = 1/2 - \alpha`, so
+    that for :math:`\alpha=0` the method is the trapezoidal rule (Newmark
+    average acceleration). Negative values of :math:`\alpha` (down to
+    :math:`-1/3`) introduce numerical dissipation of the high frequencies.
+
+    The damping matrix is of the Rayleigh type, :math:`C = a_0 M + a_1 K`.
+
+    The effective stiffness matrix
+
+    .. math::
+        K_{\mathrm{eff}} = \frac{1}{\beta \Delta t^2} M + \frac{(1+\alpha)\gamma}{\beta \Delta t} C + (1+\alpha) K
+
+    is factorized once, and then each time step requires only a forward and
+    back substitution. The loads are evaluated step by step, so that apart
+    from the recorded displacements the memory does not grow with the number
+    of the time steps.
+
+    The loads are defined with :func:`add_load_history`. The supports are
+    fixed. The mass matrix may be singular (some degrees of freedom may carry
+    no mass), as long as the effective stiffness matrix is not: the initial
+    acceleration is computed for the degrees of freedom with mass only.
+
+    :func:`number_dofs` must be called before this function.
+
+    The displacements are recorded at all the time steps into an array with
+    one row per time step (including the initial condition) and one column per
+    recorded degree of freedom. The array may be supplied by the caller (for
+    instance, a memory-mapped array), or it may be created as a memory-mapped
+    ``.npy`` file. After the function returns, the times are available as
+    ``m["times"]``, the recorded displacements as
+    ``m["displacement_history"]``, and the recorded degrees of freedom as
+    ``m["history_dofs"]``.
+
+    Parameters
+    ----------
+    m
+        The model.
+    dt
+        Time step.
+    nsteps
+        Number of time steps.
+    alpha
+        Optional: the HHT parameter (:math:`-1/3 \le \alpha \le 0`). Default is
+        0.
+    damping
+        Optional: the coefficients :math:`(a_0, a_1)` of the Rayleigh damping.
+        Default is no damping.
+    U0
+        Optional: the initial displacement of the free degrees of freedom.
+    V0
+        Optional: the initial velocity of the free degrees of freedom.
+    dofs
+        Optional: the global numbers of the degrees of freedom to record.
+        Default is all the free degrees of freedom.
+    out
+        Optional: the array into which the displacements are recorded, of the
+        shape ``(nsteps + 1, len(dofs))``.
+    filename
+        Optional: if ``out`` is not supplied, the displacements are recorded
+        into a memory-mapped file of this name (in the ``.npy`` format).
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    :func:`add_load_history`
+    """
+    _check_numbering(m)
+    if not (-1.0 / 3.0 <= alpha <= 0.0):
+        raise ValueError("The HHT parameter must be between -1/3 and 0")
+    nf = m["nfreedof"]
+    beta = (1 - alpha) ** 2 / 4
+    gamma = 1 / 2 - alpha
+
+    K = build_stiffness_matrix(m)[0:nf, 0:nf]
+    M = build_mass_matrix(m)[0:nf, 0:nf]
+    a0, a1 = damping
+    C = a0 * M + a1 * K
+
+    times = arange(nsteps + 1) * dt
+    P, histories = _load_distribution(m)
+
+    if dofs is None:
+        dofs = arange(nf)
+    dofs = atleast_1d(asarray(dofs, dtype=int64))
+    record = dofs < nf
+    history = _output_array(out, filename, (nsteps + 1, len(dofs)))
+
+    U = zeros(nf) if U0 is None else array(U0, dtype=float64)
+    V = zeros(nf) if V0 is None else array(V0, dtype=float64)
+    F = P @ _history_values(histories, times[0])
+    # The initial acceleration of the degrees of freedom without mass (for
+    # instance, the rotations with the row-sum lumped mass) is zero
+    A = zeros(nf)
+    massed = (M != 0.0).any(axis=1)
+    R = F - C @ V - K @ U
+    A[massed] = solve(M[massed][:, massed], R[massed], assume_a="sym")
+
+    Keff = M / (beta * dt**2) + (1 + alpha) * gamma / (beta * dt) * C + (1 + alpha) * K
+    factor = cho_factor(Keff)
+
+    history[0, :] = 0.0
+    history[0, record] = U[dofs[record]]
+    for n in range(nsteps):
+        Fn1 = P @ _history_values(histories, times[n + 1])
+        # Predictors
+        Ut = U + dt * V + dt**2 * (1 / 2 - beta) * A
+        Vt = V + dt * (1 - gamma) * A
+        rhs = (1 + alpha) * Fn1 - alpha * F + alpha * (C @ V + K @ U)
+        rhs += M @ Ut / (beta * dt**2)
+        rhs += (1 + alpha) * (C @ (gamma / (beta * dt) * Ut - Vt))
+        Un1 = cho_solve(factor, rhs)
+        A = (Un1 - Ut) / (beta * dt**2)
+        V = Vt + gamma * dt * A
+        U, F = Un1, Fn1
+        history[n + 1, :] = 0.0
+        history[n + 1, record] = U[dofs[record]]
+
+    if hasattr(history, "flush"):
+        history.flush()
+    m["times"] = times
+    m["displacement_history"] = history
+    m["history_dofs"] = dofs
+    return None
+
+
+def _check_modes(m):
+    if not ("eigvals" in m and "eigvecs" in m):
+        raise RuntimeError(
+            "No modes: the free vibration needs to be solved with solve_free_vibration"
+        )
+
+
+def _modal_basis(m, nmodes, damping_ratios):
+    # The retained modes: the squared angular frequencies, the mass-normalized
+    # mode shapes (one column per mode), and the damping ratios.
+    _check_modes(m)
+    eigvals = asarray(m["eigvals"], dtype=float64)
+    if nmodes is None:
+        nmodes = len(eigvals)
+    if not (0 < nmodes <= len(eigvals)):
+        raise ValueError(f"The number of modes must be between 1 and {len(eigvals)}")
+    omega2 = eigvals[0:nmodes]
+    Phi = asarray(m["eigvecs"])[:, 0:nmodes]
+    zeta = asarray(damping_ratios, dtype=float64)
+    zeta = zeros(nmodes) + (zeta if zeta.ndim == 0 else zeta[0:nmodes])
+    return omega2, Phi, zeta
+
+
+def _mass_product(m, V):
+    # The product of the mass matrix of the free degrees of freedom with the
+    # vector V. The mass matrix with which the modes were computed is used:
+    # it is either a matrix, or a vector (lumped mass).
+    nf = m["nfreedof"]
+    M = m["M"] if "M" in m else build_mass_matrix(m, sparse=True)
+    if M.ndim == 1:
+        return M[0:nf] * V
+    return M[0:nf, 0:nf] @ V
+
+
+def _load_vector(m):
+    # The amplitudes of the loads applied to the free degrees of freedom.
+    nf = m["nfreedof"]
+    F = zeros(nf)
+    for joint in m["joints"].values():
+        if "loads" in joint:
+            for dof, value in joint["loads"].items():
+                gr = joint["dof"][dof]
+                if gr < nf:
+                    F[gr] += value
+    return F
+
+
+def _residual_flexibility(m, omega2, Phi, P):
+    # The static response to the loads P that is missing from the truncated
+    # modal expansion: (K^-1 - Phi Omega^-2 Phi^T) P.
+    if (omega2 <= 0.0).any():
+        raise RuntimeError("Static correction requires a model without rigid body modes")
+    nf = m["nfreedof"]
+    K = build_stiffness_matrix(m)[0:nf, 0:nf]
+    return cho_solve(cho_factor(K), P) - Phi @ ((Phi.T @ P) / omega2[:, None])
+
+
+def solve_modal_transient(
+    m,
+    dt,
+    nsteps,
+    damping_ratios=0.0,
+    nmodes=None,
+    static_correction=False,
+    U0=None,
+    V0=None,
+    dofs=None,
+    out=None,
+    filename=None,
+):
+    r"""
+    Solve the linear transient dynamics by modal superposition.
+
+    The displacements are approximated as a combination of the mode shapes
+    computed by :func:`pystran.model.solve_free_vibration`,
+    :math:`U = \Phi \cdot q`. The mode shapes are normalized with respect to
+    the mass matrix, and therefore the modal coordinates :math:`q_k` satisfy
+    uncoupled equations
+
+    .. math::
+        \ddot q_k + 2 \zeta_k \omega_k \dot q_k + \omega_k^2 q_k = \phi_k^T \cdot F(t)
+
+    where :math:`\zeta_k` is the modal damping ratio. The equations of all the
+    retained modes are integrated simultaneously with the trapezoidal rule
+    (Newmark average acceleration). The cost of a time step is proportional
+    to the number of retained modes, not to the number of degrees of freedom.
+
+    When only the lowest modes are retained, the static response of the
+    truncated modes may be added (the static correction, also known as the
+    mode acceleration method):
+
+    .. math::
+        U = \Phi \cdot q + (K^{-1} - \Phi \cdot \Omega^{-2} \cdot \Phi^T) \cdot F(t)
+
+    The loads are defined with :func:`add_load_history`, and the results are
+    recorded in the same way as by :func:`solve_transient`.
+
+    Parameters
+    ----------
+    m
+        The model.
+    dt
+        Time step.
+    nsteps
+        Number of time steps.
+    damping_ratios
+        Optional: the modal damping ratio, either a single number for all the
+        modes, or an array with one value per mode. Default is no damping.
+    nmodes
+        Optional: the number of the lowest modes to retain. Default is all the
+        modes that were computed.
+    static_correction
+        Optional: add the static response of the truncated modes? Default is
+        ``False``.
+    U0
+        Optional: the initial displacement of the free degrees of freedom.
+    V0
+        Optional: the initial velocity of the free degrees of freedom.
+    dofs
+        Optional: the global numbers of the degrees of freedom to record.
+        Default is all the free degrees of freedom.
+    out
+        Optional: the array into which the displacements are recorded, of the
+        shape ``(nsteps + 1, len(dofs))``.
+    filename
+        Optional: if ``out`` is not supplied, the displacements are recorded
+        into a memory-mapped file of this name (in the ``.npy`` format).
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    :func:`solve_transient`
+    :func:`pystran.model.solve_free_vibration`
+    """
+    _check_numbering(m)
+    nf = m["nfreedof"]
+    omega2, Phi, zeta = _modal_basis(m, nmodes, damping_ratios)
+    omega = omega2.clip(0.0) ** 0.5
+    c = 2 * zeta * omega
+
+    times = arange(nsteps + 1) * dt
+    P, histories = _load_distribution(m)
+    # The matrix that gives the modal loads
+    PhiP = Phi.T @ P
+
+    if dofs is None:
+        dofs = arange(nf)
+    dofs = atleast_1d(asarray(dofs, dtype=int64))
+    record = dofs < nf
+    Phi_r = Phi[dofs[record], :]
+    if static_correction:
+        R_r = _residual_flexibility(m, omega2, Phi, P.toarray())[dofs[record], :]
+    history = _output_array(out, filename, (nsteps + 1, len(dofs)))
+
+    q = zeros(len(omega2))
+    v = zeros(len(omega2))
+    if U0 is not None:
+        q = Phi.T @ _mass_product(m, asarray(U0, dtype=float64))
+    if V0 is not None:
+        v = Phi.T @ _mass_product(m, asarray(V0, dtype=float64))
+    h = _history_values(histories, times[0])
+    a = PhiP @ h - c * v - omega2 * q
+    keff = 4 / dt**2 + 2 / dt * c + omega2
+
+    def _record(n, h):
+        history[n, :] = 0.0
+        U_r = Phi_r @ q
+        if static_correction:
+            U_r += R_r @ h
+        history[n, record] = U_r
+
+    _record(0, h)
+    for n in range(nsteps):
+        h = _history_values(histories, times[n + 1])
+        qt = q + dt * v + dt**2 / 4 * a
+        vt = v + dt / 2 * a
+        q = (PhiP @ h + 4 / dt**2 * qt + c * (2 / dt * qt - vt)) / keff
+        a = (q - qt) * 4 / dt**2
+        v = vt + dt / 2 * a
+        _record(n + 1, h)
+
+    if hasattr(history, "flush"):
+        history.flush()
+    m["times"] = times
+    m["displacement_history"] = history
+    m["history_dofs"] = dofs
+    return None
+
+
+def modal_harmonic_response(
+    m, frequencies, damping_ratios=0.0, nmodes=None, static_correction=False, dofs=None
+):
+    r"""
+    Compute the steady-state harmonic response by modal superposition.
+
+    The loads defined with :func:`pystran.model.add_load` are taken as the
+    amplitudes of harmonic loads :math:`F e^{i \Omega t}`. The complex amplitude
+    of the displacement at the excitation angular frequency :math:`\Omega` is
+
+    .. math::
+        U = \sum_k \frac{\phi_k \phi_k^T \cdot F}{\omega_k^2 - \Omega^2 + 2 i \zeta_k \omega_k \Omega}
+
+    summed over the retained modes, optionally with the static correction for
+    the truncated modes (refer to :func:`solve_modal_transient`). All the
+    excitation frequencies are evaluated at once.
+
+    Parameters
+    ----------
+    m
+        The model.
+    frequencies
+        Array of the excitation frequencies (in Hertz).
+    damping_ratios
+        Optional: the modal damping ratio, either a single number for all the
+        modes, or an array with one value per mode. Default is no damping.
+    nmodes
+        Optional: the number of the lowest modes to retain. Default is all the
+        modes that were computed.
+    static_correction
+        Optional: add the static response of the truncated modes? Default is
+        ``False``.
+    dofs
+        Optional: the global numbers of the degrees of freedom for which the
+        response is computed. Default is all the free degrees of freedom.
+
+    Returns
+    -------
+    array
+        Complex array of the displacement amplitudes, one row per frequency
+        and one column per degree of freedom in ``dofs`` (the amplitudes of
+        the prescribed degrees of freedom are zero).
+    """
+    _check_numbering(m)
+    nf = m["nfreedof"]
+    omega2, Phi, zeta = _modal_basis(m, nmodes, damping_ratios)
+    omega = omega2.clip(0.0) ** 0.5
+    if dofs is None:
+        dofs = arange(nf)
+    dofs = atleast_1d(asarray(dofs, dtype=int64))
+    record = dofs < nf
+    F = _load_vector(m)
+    W = 2 * pi * atleast_1d(asarray(frequencies, dtype=float64))
+    # The modal amplitudes for all the frequencies and all the modes at once
+    D = omega2[None, :] - W[:, None] ** 2 + 2j * (zeta * omega)[None, :] * W[:, None]
+    q = (Phi.T @ F)[None, :] / D
+    result = zeros((len(W), len(dofs)), dtype=complex128)
+    result[:, record] = q @ Phi[dofs[record], :].T
+    if static_correction:
+        R = _residual_flexibility(m, omega2, Phi, F[:, None])[:, 0]
+        result[:, record] += R[dofs[record]][None, :]
+    return result
+
+
+def _chunks(n, nchunks):
+    # Split range(n) into at most nchunks contiguous slices of similar size.
+    bounds = linspace(0, n, min(max(nchunks, 1), max(n, 1)) + 1).astype(int64)
+    return [slice(bounds[k], bounds[k + 1]) for k in range(len(bounds) - 1)]
+
+
+def _direct_sweep(K, M, C, F, W, dofs):
+    # Solve (K - W^2 M + i W C) U = F for all the angular frequencies in W.
+    # The sparsity pattern is the same for all the frequencies. The fill-in
+    # reducing ordering is therefore computed only once (reverse
+    # Cuthill-McKee), and the factorizations use the permuted matrices as
+    # given. SciPy's interface to SuperLU cannot reuse the symbolic
+    # factorization, so splu still redoes it (without the ordering) for
+    # each frequency.
+    S = (abs(K) + abs(M) + abs(C)).tocsr()
+    p = scipy.sparse.csgraph.reverse_cuthill_mckee(S, symmetric_mode=True)
+    # Express all three matrices on the common pattern, so that the
+    # combination for each frequency is a sum of the arrays of values.
+    pattern = S[p, :][:, p].tocsc()
+    pattern.sort_indices()
+    rows = pattern.indices
+    cols = repeat(arange(pattern.shape[1]), diff(pattern.indptr))
+    Kd, Md, Cd = [asarray(A[p, :][:, p].tocsr()[rows, cols]).ravel() for A in (K, M, C)]
+    Fp = F[p]
+    # Position of each output degree of freedom in the permuted order
+    inverse = empty(len(p), dtype=int64)
+    inverse[p] = arange(len(p))
+    out = inverse[dofs]
+    A = scipy.sparse.csc_matrix(
+        (zeros(len(rows), dtype=complex128), pattern.indices, pattern.indptr),
+        shape=pattern.shape,
+    )
+    result = zeros((len(W), len(dofs)), dtype=complex128)
+    for k, w in enumerate(W):
+        A.data[:] = Kd - w**2 * Md + 1j * w * Cd
+        lu = splu(A, permc_spec="NATURAL")
+        result[k, :] = lu.solve(Fp.astype(complex128))[out]
+    return result
+
+
+def frequency_response(
+    m,
+    frequencies,
+    method="direct",
+    damping=(0.0, 0.0),
+    damping_ratios=None,
+    nmodes=None,
+    dofs=None,
+    workers=1,
+):
+    r"""
+    Compute the frequency response of the model for many frequencies at once.
+
+    The loads defined with :func:`pystran.model.add_load` are taken as the
+    amplitudes of harmonic loads :math:`F e^{i \Omega t}`, and the complex
+    amplitudes of the displacements are computed from
+
+    .. math::
+        (K - \Omega^2 M + i \Omega C) \cdot U = F
+
+    for all the excitation frequencies. Only the displacements of the
+    requested degrees of freedom are returned.
+
+    Two methods are available:
+
+    - ``"direct"``: the sparse complex matrix is factorized for each
+      frequency. The sparsity pattern does not change with the frequency,
+      hence the ordering of the unknowns is computed only once, and the
+      matrices are combined on a fixed pattern. The symbolic factorization
+      is not reused, however: SciPy's sparse LU solver does not expose it,
+      so it is repeated for each frequency.
+    - ``"modal"``: the modes computed by
+      :func:`pystran.model.solve_free_vibration` are superposed (refer to
+      :func:`modal_harmonic_response`).
+
+    The list of frequencies can be split into chunks which are processed in
+    parallel by a pool of threads.
+
+    Parameters
+    ----------
+    m
+        The model.
+    frequencies
+        Array of the excitation frequencies (in Hertz).
+    method
+        Optional: ``"direct"`` (default) or ``"modal"``.
+    damping
+        Optional: the coefficients :math:`(a_0, a_1)` of the Rayleigh damping,
+        :math:`C = a_0 M + a_1 K`. Default is no damping. For the modal method
+        the equivalent modal damping ratios are used,
+        :math:`\zeta_k = a_0 / (2 \omega_k) + a_1 \omega_k / 2`.
+    damping_ratios
+        Optional: for the modal method only, the modal damping ratios (one
+        number, or one per mode), used instead of the Rayleigh damping.
+    nmodes
+        Optional: for the modal method only, the number of the lowest modes to
+        retain (the static correction is applied for the truncated modes).
+    dofs
+        Optional: the global numbers of the degrees of freedom for which the
+        response is computed. Default is all the free degrees of freedom.
+    workers
+        Optional: the number of threads. Default is 1.
+
+    Returns
+    -------
+    array
+        Complex array of the displacement amplitudes, of the shape
+        ``(len(frequencies), len(dofs))``.
+
+    See Also
+    --------
+    :func:`modal_harmonic_response`
+    """
+    _check_numbering(m)
+    nf = m["nfreedof"]
+    frequencies = atleast_1d(asarray(frequencies, dtype=float64))
+    if dofs is None:
+        dofs = arange(nf)
+    dofs = atleast_1d(asarray(dofs, dtype=int64))
+    record = dofs < nf
+    a0, a1 = damping
+
+    if method == "direct":
+        K = build_stiffness_matrix(m, sparse=True)[0:nf, 0:nf]
+        M = build_mass_matrix(m, sparse=True)[0:nf, 0:nf]
+        C = a0 * M + a1 * K
+        F = _load_vector(m)
+
+        def sweep(f):
+            return _direct_sweep(K, M, C, F, 2 * pi * f, dofs[record])
+
+    elif method == "modal":
+        _check_modes(m)
+        if damping_ratios is None:
+            n = len(m["eigvals"]) if nmodes is None else nmodes
+            omega = asarray(m["eigvals"][0:n], dtype=float64).clip(0.0) ** 0.5
+            # Rigid body modes are not damped by the mass-proportional part
+            safe = where(omega > 0.0, omega, 1.0)
+            damping_ratios = where(omega > 0.0, a0 / (2 * safe), 0.0) + a1 * omega / 2
+        # The static correction does not depend on the frequency: the
+        # stiffness matrix is factorized once, not in every chunk
+        if nmodes is not None and nmodes < len(m["eigvals"]):
+            omega2, Phi, _ = _modal_basis(m, nmodes, damping_ratios)
+            R = _residual_flexibility(m, omega2, Phi, _load_vector(m)[:, None])[:, 0]
+        else:
+            R = zeros(nf)
+
+        def sweep(f):
+            U = modal_harmonic_response(m, f, damping_ratios, nmodes, False, dofs[record])
+            return U + R[dofs[record]][None, :]
+
+    else:
+        raise ValueError(f"Unknown method {method}")
+
+    result = zeros((len(frequencies), len(dofs)), dtype=complex128)
+    chunks = _chunks(len(frequencies), workers)
+    if workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(lambda c: sweep(frequencies[c]), chunks))
+    else:
+        parts = [sweep(frequencies[c]) for c in chunks]
+    for c, part in zip(chunks, parts):
+        result[c, record] = part
+    return result
+
+
+def _influence_vector(m, direction):
+    # Rigid-body translation of the structure in the given direction,
+    # restricted to the free degrees of freedom.
+    nf, dim = m["nfreedof"], m["dim"]
+    if isinstance(direction, Integral):
+        d = zeros(dim)
+        d[direction] = 1.0
+    else:
+        d = asarray(direction, dtype=float64)
+        d = d / (d @ d) ** 0.5
+    r = zeros(nf)
+    for joint in m["joints"].values():
+        dof = joint["dof"][0:dim]
+        free = dof < nf
+        r[dof[free]] = d[free]
+    return r
+
+
+def participation_factors(m, direction):
+    r"""
+    Compute the modal participation factors and effective modal masses.
+
+    For the mass-normalized mode shapes :math:`\phi_k` (computed by
+    :func:`pystran.model.solve_free_vibration`), the participation factor of
+    the mode :math:`k` for the excitation of the supports in the direction
+    given by the influence vector :math:`r` (the rigid-body translation of the
+    structure) is :math:`\Gamma_k = \phi_k^T \cdot M \cdot r`, and the
+    effective modal mass is :math:`\Gamma_k^2`. The effective masses of all
+    the modes add up to the total mass that moves in the given direction,
+    :math:`r^T \cdot M \cdot r`.
+
+    Parameters
+    ----------
+    m
+        The model.
+    direction
+        Either the translation degree of freedom (``freedoms.U1``, ...) or a
+        vector of the direction of the excitation.
+
+    Returns
+    -------
+    tuple of gamma, effective_masses, total_mass
+        The arrays of the participation factors and of the effective masses
+        (one per mode), and the total mass moving in the given direction.
+    """
+    _check_numbering(m)
+    _check_modes(m)
+    r = _influence_vector(m, direction)
+    Mr = _mass_product(m, r)
+    gamma = asarray(m["eigvecs"]).T @ Mr
+    return gamma, gamma**2, r @ Mr
+
+
+def modal_combination(X, frequencies, damping_ratio=0.05, method="CQC"):
+    r"""
+    Combine the peak modal responses.
+
+    The square root of the sum of squares (SRSS) combination is
+    :math:`R = \sqrt{\sum_k X_k^2}`. The complete quadratic combination (CQC)
+    is :math:`R = \sqrt{\sum_k \sum_l X_k \rho_{kl} X_l}`, with the correlation
+    coefficients (equal damping ratio :math:`\zeta` for all the modes, and
+    :math:`r = \omega_l / \omega_k`)
+
+    .. math::
+        \rho_{kl} = \frac{8 \zeta^2 (1 + r) r^{3/2}}{(1 - r^2)^2 + 4 \zeta^2 r (1 + r)^2}
+
+    Any number of response quantities is combined at once.
+
+    Parameters
+    ----------
+    X
+        Array of the modal responses, the last axis corresponds to the modes.
+    frequencies
+        Array of the modal frequencies.
+    damping_ratio
+        Optional: the modal damping ratio (used only by CQC). Default is 0.05.
+    method
+        Optional: ``"CQC"`` (default) or ``"SRSS"``.
+
+    Returns
+    -------
+    array
+        The combined responses (the shape of ``X`` without the last axis).
+    """
+    X = asarray(X, dtype=float64)
+    if method == "SRSS":
+        return ((X**2).sum(axis=-1)) ** 0.5
+    elif method == "CQC":
+        f = asarray(frequencies, dtype=float64)
+        r = f[None, :] / f[:, None]
+        z = damping_ratio
+        rho = 8 * z**2 * (1 + r) * r**1.5 / ((1 - r**2) ** 2 + 4 * z**2 * r * (1 + r) ** 2)
+        return einsum("...k,kl,...l->...", X, rho, X).clip(0.0) ** 0.5
+    raise ValueError(f"Unknown method {method}")
+
+
+def _spectral_values(spectrum, frequencies):
+    if callable(spectrum):
+        return array([spectrum(f) for f in frequencies], dtype=float64)
+    fs, values = spectrum
+    return interp(frequencies, asarray(fs, dtype=float64), asarray(values, dtype=float64))
+
+
+def _modal_end_forces(m, Y):
+    # The end forces of the members for all the modal displacements at once:
+    # the columns of Y are the displacements of all the degrees of freedom.
+    # One row per member and end force, the members of all the kinds stacked.
+    modal = resultants.end_forces(m, Y)
+    rows = [r["forces"].reshape(-1, Y.shape[1]) for r in modal.values()]
+    return modal, (vstack(rows) if rows else zeros((0, Y.shape[1])))
+
+
+def response_spectrum(
+    m, spectrum, direction, damping_ratio=0.05, nmodes=None, method="CQC"
+):
+    r"""
+    Compute the response of the structure to the excitation of the supports
+    described by a response spectrum.
+
+    The peak displacement of the mode :math:`k` is
+
+    .. math::
+        Y_k = \phi_k \frac{\Gamma_k S_a(f_k)}{\omega_k^2}
+
+    where :math:`\Gamma_k` is the participation factor (refer to
+    :func:`participation_factors`), and :math:`S_a` is the spectral
+    (pseudo-)acceleration at the frequency of the mode. The peak
+    displacements, reactions, and member end forces of all the modes are
+    computed at once, and then combined with :func:`modal_combination`. The
+    modal combination produces positive envelopes, the signs of the combined
+    quantities are not meaningful.
+
+    :func:`pystran.model.solve_free_vibration` must be called before this
+    function. The structure must not have rigid body modes.
+
+    Parameters
+    ----------
+    m
+        The model.
+    spectrum
+        The spectral acceleration, either a function of the frequency (in
+        Hertz), or a pair of sequences ``(frequencies, values)``, which is
+        interpolated linearly.
+    direction
+        Either the translation degree of freedom (``freedoms.U1``, ...) or a
+        vector of the direction of the excitation.
+    damping_ratio
+        Optional: the modal damping ratio, for the CQC combination. Default is
+        0.05.
+    nmodes
+        Optional: the number of the lowest modes to retain. Default is all the
+        modes that were computed.
+    method
+        Optional: ``"CQC"`` (default) or ``"SRSS"``.
+
+    Returns
+    -------
+    dict
+        Dictionary with the keys:
+
+        - ``"participation_factors"``, ``"effective_masses"``: arrays (one
+          value per retained mode),
+        - ``"total_mass"``: the total mass moving in the given direction,
+        - ``"modal_displacements"``: the peak displacements of the modes (one
+          column per mode, one row per degree of freedom),
+        - ``"displacements"``: the combined displacements (one per degree of
+          freedom),
+        - ``"reactions"``: dictionary of the combined reactions, indexed by the
+          joint identifier, and then by the degree of freedom (refer to
+          :func:`pystran.model.statics_reactions`),
+        - ``"end_forces"``: dictionary of the combined end forces, indexed by the
+          kind of the members (refer to :func:`pystran.resultants.end_forces`),
+          the member identifier, and then the names of the end forces (refer
+          to :func:`pystran.beam.beam_2d_end_forces`,
+          :func:`pystran.beam.beam_3d_end_forces`; the truss members have
+          only the axial force ``'N'``).
+
+    See Also
+    --------
+    :func:`participation_factors`
+    :func:`modal_combination`
+    """
+    nf, nt = m["nfreedof"], m["ntotaldof"]
+    omega2, Phi, _ = _modal_basis(m, nmodes, 0.0)
+    if (omega2 <= 0.0).any():
+        raise RuntimeError("Response spectrum analysis requires a model without rigid body modes")
+    gamma, effective_masses, total_mass = participation_factors(m, direction)
+    n = len(omega2)
+    gamma, effective_masses = gamma[0:n], effective_masses[0:n]
+    frequencies = omega2**0.5 / (2 * pi)
+    Sa = _spectral_values(spectrum, frequencies)
+
+    # The peak displacements of all the modes
+    Y = zeros((nt, n))
+    Y[0:nf, :] = Phi * (gamma * Sa / omega2)[None, :]
+
+    results = dict(
+        participation_factors=gamma,
+        effective_masses=effective_masses,
+        total_mass=total_mass,
+        modal_displacements=Y,
+        displacements=modal_combination(Y, frequencies, damping_ratio, method),
+    )
+
+    # The reactions of all the modes
+    K = build_stiffness_matrix(m, sparse=True)
+    R = modal_combination(K[nf:nt, :] @ Y, frequencies, damping_ratio, method)
+    reactions = {}
+    for joint in m["joints"].values():
+        if "supports" in joint:
+            reactions[joint["jid"]] = {
+                dof: R[joint["dof"][dof] - nf] for dof in joint["supports"].keys()
+            }
+    results["reactions"] = reactions
+
+    # The end forces of all the members for all the modes, combined in one go
+    modal, rows = _modal_end_forces(m, Y)
+    combined = modal_combination(rows, frequencies, damping_ratio, method)
+    end_forces = {}
+    start = 0
+    for kind, result in modal.items():
+        keys = result["keys"]
+        end_forces[kind] = {}
+        for mid in result["mids"]:
+            end_forces[kind][mid] = dict(zip(keys, combined[start : start + len(keys)]))
+            start += len(keys)
+    results["end_forces"] = end_forces
+    return results
+
+
+def _internal_forces(blocks, U, nt):
+    # Element-by-element evaluation of the internal forces K U: the global
+    # stiffness matrix is never formed.
+    f = zeros(nt)
+    for dofs, ks in blocks:
+        fe = einsum("eij,ej->ei", ks, U[dofs])
+        f += bincount(dofs.ravel(), weights=fe.ravel(), minlength=nt)
+    return f
+
+
+def critical_time_step(m, lumping="HRZ"):
+    r"""
+    Estimate the critical time step of the explicit central difference
+    integration.
+
+    The estimate is the smallest of the critical time steps of the
+    individual members with lumped masses (for linear elements the critical
+    time step of the structure is not smaller than the smallest critical time
+    step of its members):
+
+    - Axial waves (truss and beam members): :math:`h / c`, where :math:`c =
+      \sqrt{E/\rho}` is the speed of the longitudinal waves, and :math:`h` is
+      the length of the member.
+    - Bending (beam members, HRZ lumping): :math:`h^2 \sqrt{\rho A/(129 E I)}`.
+    - Torsion (3d beam members): :math:`\sqrt{2 h m_r / (G J)}`, where
+      :math:`m_r` is the rotational inertia lumped to the joint.
+    - Springs and rigid links: :math:`2 / \sqrt{\lambda_{\max} / m_{\min}}`,
+      where :math:`\lambda_{\max}` is the largest eigenvalue of the stiffness
+      matrix of the member, and :math:`m_{\min}` is the smallest lumped mass
+      of the joints of the member.
+
+    Parameters
+    ----------
+    m
+        The model.
+    lumping
+        Optional: the lumping of the mass matrix of the beams (refer to
+        :func:`pystran.beam.beam_2d_lumped_mass`). Default is ``"HRZ"``.
+
+    Returns
+    -------
+    float
+        The estimate of the critical time step.
+    """
+    _check_numbering(m)
+    nf, nt = m["nfreedof"], m["ntotaldof"]
+    dts = [inf]
+    if "truss_members" in m:
+        for member in m["truss_members"].values():
+            connectivity = member["connectivity"]
+            h = geometry.vlen(
+                m["joints"][connectivity[0]]["coordinates"],
+                m["joints"][connectivity[1]]["coordinates"],
+            )
+            sect = member["section"]
+            dts.append(h / (sect["E"] / sect["rho"]) ** 0.5)
+    if "beam_members" in m:
+        for member in m["beam_members"].values():
+            connectivity = member["connectivity"]
+            h = geometry.vlen(
+                m["joints"][connectivity[0]]["coordinates"],
+                m["joints"][connectivity[1]]["coordinates"],
+            )
+            sect = member["section"]
+            E, rho, A = sect["E"], sect["rho"], sect["A"]
+            dts.append(h / (E / rho) ** 0.5)
+            if lumping != "HRZ":
+                continue
+            if m["dim"] == 2:
+                dts.append(h**2 * (rho * A / (129 * E * sect["I"])) ** 0.5)
+            else:
+                I = max(sect["Iy"], sect["Iz"])
+                dts.append(h**2 * (rho * A / (129 * E * I)) ** 0.5)
+                mr = min(rho * sect["Ix"] * h / 2, rho * A * h**3 / 78)
+                dts.append((2 * h * mr / (sect["G"] * sect["J"])) ** 0.5)
+    if "spring_members" in m or "rigid_link_members" in m:
+        M = build_lumped_mass_vector(m, lumping)
+        for kind, module in [("spring_members", spring), ("rigid_link_members", rigid)]:
+            for member in m.get(kind, {}).values():
+                connectivity = member["connectivity"]
+                i, j = m["joints"][connectivity[0]], m["joints"][connectivity[1]]
+                collector = SparseAssembler((nt, nt))
+                module.assemble_stiffness(collector, member, i, j)
+                for dof, k in zip(collector.dofs, collector.blocks):
+                    free = dof < nf
+                    lmax = eigvalsh(k).max()
+                    if free.any() and lmax > 0.0:
+                        dts.append(2 / (lmax / M[dof[free]].min()) ** 0.5)
+    return min(dts)
+
+
+def solve_explicit(
+    m,
+    nsteps,
+    dt=None,
+    lumping="HRZ",
+    damping=0.0,
+    U0=None,
+    V0=None,
+    dofs=None,
+    every=1,
+    out=None,
+    filename=None,
+):
+    r"""
+    Solve the linear transient dynamics with the explicit central difference
+    method.
+
+    The equation of motion with a lumped (diagonal) mass matrix and
+    mass-proportional damping,
+
+    .. math::
+        M \cdot A + a_0 M \cdot V + K \cdot U = F(t),
+
+    is integrated with the central difference method. The mass matrix is
+    stored as a vector, and the internal forces :math:`K \cdot U` are
+    evaluated element by element, so that neither a global stiffness matrix
+    nor a factorization are needed. The method is only conditionally stable:
+    the time step must be smaller than the critical time step (refer to
+    :func:`critical_time_step`).
+
+    All the free degrees of freedom must have positive lumped masses. The
+    rigid links are usually much too stiff for explicit integration.
+
+    The loads are defined with :func:`add_load_history`, and they are
+    evaluated step by step. The supports are fixed. The displacements are
+    recorded at every ``every``-th time step into an array with one row per
+    recorded time step (including the initial condition) and one column per
+    recorded degree of freedom, which
+    may be supplied by the caller, or created as a memory-mapped ``.npy``
+    file. After the function returns, the recorded times are available as
+    ``m["times"]``, the recorded displacements as
+    ``m["displacement_history"]``, the recorded degrees of freedom as
+    ``m["history_dofs"]``, and the time step as ``m["time_step"]``.
+
+    Parameters
+    ----------
+    m
+        The model.
+    nsteps
+        Number of time steps.
+    dt
+        Optional: time step. Default is 0.9 of the estimate of the critical
+        time step.
+    lumping
+        Optional: the lumping of the mass matrix of the beams (refer to
+        :func:`pystran.beam.beam_2d_lumped_mass`). Default is ``"HRZ"``.
+    damping
+        Optional: the coefficient :math:`a_0` of the mass-proportional
+        damping. Default is no damping.
+    U0
+        Optional: the initial displacement of the free degrees of freedom.
+    V0
+        Optional: the initial velocity of the free degrees of freedom.
+    dofs
+        Optional: the global numbers of the degrees of freedom to record.
+        Default is all the free degrees of freedom.
+    every
+        Optional: record the displacements only at every ``every``-th step.
+        Default is 1 (record all the steps).
+    out
+        Optional: the array into which the displacements are recorded, of the
+        shape ``(nsteps // every + 1, len(dofs))``.
+    filename
+        Optional: if ``out`` is not supplied, the displacements are recorded
+        into a memory-mapped file of this name (in the ``.npy`` format).
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    :func:`critical_time_step`
+    :func:`solve_transient`
+    """
+    _check_numbering(m)
+    nf, nt = m["nfreedof"], m["ntotaldof"]
+    if dt is None:
+        dt = 0.9 * critical_time_step(m, lumping)
+    Mf = build_lumped_mass_vector(m, lumping)[0:nf]
+    if (Mf <= 0.0).any():
+        raise RuntimeError("Explicit integration requires all free degrees of freedom to have mass")
+    blocks = build_element_stiffness_blocks(m)
+
+    P, histories = _load_distribution(m)
+
+    if dofs is None:
+        dofs = arange(nf)
+    dofs = atleast_1d(asarray(dofs, dtype=int64))
+    record = dofs < nf
+    recorded = arange(0, nsteps + 1, every)
+    history = _output_array(out, filename, (len(recorded), len(dofs)))
+
+    U = zeros(nt)
+    if U0 is not None:
+        U[0:nf] = U0
+    V = zeros(nf) if V0 is None else array(V0, dtype=float64)
+    F = P @ _history_values(histories, 0.0)
+    A = (F - _internal_forces(blocks, U, nt)[0:nf]) / Mf - damping * V
+    # Velocity at the half step
+    V = V + dt / 2 * A
+
+    history[0, :] = 0.0
+    history[0, record] = U[dofs[record]]
+    for n in range(nsteps):
+        U[0:nf] += dt * V
+        F = P @ _history_values(histories, (n + 1) * dt)
+        A = (F - _internal_forces(blocks, U, nt)[0:nf]) / Mf - damping * V
+        V += dt * A
+        if (n + 1) % every == 0:
+            r = (n + 1) // every
+            history[r, :] = 0.0
+            history[r, record] = U[dofs[record]]
+
+    if hasattr(history, "flush"):
+        history.flush()
+    m["times"] = recorded * dt
+    m["displacement_history"] = history
+    m["history_dofs"] = dofs
+    m["time_step"] = dt
+    return None
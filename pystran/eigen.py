@@ -0,0 +1,528 @@
+r"""
+Define the algorithms for the free vibration eigenvalue problem
+
+.. math::
+    K \cdot V = \omega^2 M \cdot V
+
+The functions operate on the matrices of the free degrees of freedom. The mass
+matrix may be either a matrix, or a vector (the diagonal of a lumped mass
+matrix).
+"""
+
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from numpy import arange, array, asarray, atleast_1d, ones, zeros, outer, int64
+from numpy import linspace, concatenate, argsort, diag, float64, where
+from numpy.random import default_rng
+from numpy.linalg import eigvalsh, norm
+import scipy.sparse
+from scipy.sparse.linalg import splu, spilu, eigsh, lobpcg, LinearOperator
+from scipy.linalg import eigh, cho_factor, cho_solve, ldl
+from scipy.optimize import linear_sum_assignment
+
+
+def _is_lumped(M):
+    return M.ndim == 1
+
+
+def massless_dofs(M):
+    """
+    Find the degrees of freedom without mass.
+
+    Parameters
+    ----------
+    M
+        Mass matrix, or the vector of lumped masses.
+
+    Returns
+    -------
+    array
+        The numbers of the degrees of freedom (rows of ``M``) whose rows of
+        the mass matrix are identically zero.
+    """
+    M = asarray(M)
+    if _is_lumped(M):
+        return (M == 0.0).nonzero()[0]
+    return (abs(M).sum(axis=1) == 0.0).nonzero()[0]
+
+
+def generalized_eigh(K, M):
+    """
+    Solve the symmetric generalized eigenvalue problem.
+
+    Parameters
+    ----------
+    K
+        Stiffness matrix.
+    M
+        Mass matrix, or the vector of lumped masses (all positive). In the
+        latter case the problem is transformed to the standard form by scaling
+        with the inverse square root of the masses.
+
+    Returns
+    -------
+    tuple of eigvals, eigvecs
+        The eigenvalues in ascending order, and the mass-normalized
+        eigenvectors (in the columns).
+    """
+    if _is_lumped(M):
+        if (M <= 0.0).any():
+            raise RuntimeError(
+                "Lumped mass matrix is singular: some free degrees of freedom have no mass"
+            )
+        s = 1.0 / M**0.5
+        eigvals, eigvecs = eigh(K * outer(s, s))
+        eigvecs *= s[:, None]
+        return eigvals, eigvecs
+    return eigh(K, M)
+
+
+def guyan_reduction(K, M, slaves):
+    r"""
+    Condense degrees of freedom statically (Guyan reduction).
+
+    The degrees of freedom are split into the retained (master) degrees of
+    freedom, :math:`m`, and the condensed (slave) degrees of freedom,
+    :math:`s`. The slaves are assumed to follow the masters statically,
+
+    .. math::
+        V_s = -K_{ss}^{-1} K_{sm} V_m,
+
+    hence :math:`V = T \cdot V_m`, and the reduced matrices are :math:`K_r =
+    T^T K T = K_{mm} - K_{ms} K_{ss}^{-1} K_{sm}` and :math:`M_r = T^T M T`.
+    When the slaves carry no mass, the reduction does not change the
+    eigenvalues.
+
+    Parameters
+    ----------
+    K
+        Stiffness matrix.
+    M
+        Mass matrix, or the vector of lumped masses.
+    slaves
+        The numbers of the degrees of freedom to condense.
+
+    Returns
+    -------
+    tuple of Kr, Mr, T, masters
+        The reduced stiffness matrix, the reduced mass matrix (a vector if
+        ``M`` is a vector and the slaves carry no mass), the transformation
+        matrix (one row per degree of freedom, one column per master), and the
+        numbers of the master degrees of freedom.
+    """
+    n = K.shape[0]
+    slaves = atleast_1d(asarray(slaves, dtype=int64))
+    keep = ones(n, dtype=bool)
+    keep[slaves] = False
+    masters = arange(n)[keep]
+    Kss = K[slaves, :][:, slaves]
+    Ksm = K[slaves, :][:, masters]
+    X = -cho_solve(cho_factor(Kss), Ksm)
+    T = zeros((n, len(masters)))
+    T[masters, arange(len(masters))] = 1.0
+    T[slaves, :] = X
+    Kr = K[masters, :][:, masters] + K[masters, :][:, slaves] @ X
+    Kr = (Kr + Kr.T) / 2
+    if _is_lumped(M):
+        if (M[slaves] == 0.0).all():
+            Mr = M[masters]
+        else:
+            Mr = T.T @ (M[:, None] * T)
+    else:
+        Mr = T.T @ M @ T
+        Mr = (Mr + Mr.T) / 2
+    return Kr, Mr, T, masters
+
+
+def _negative_pivots(A):
+    # The number of negative eigenvalues of the sparse symmetric matrix A,
+    # from the signs of the pivots of its symmetric factorization (Sylvester's
+    # law of inertia). With diagonal pivoting only, the LU factors of the
+    # symmetrically permuted matrix are L D L^T.
+    lu = splu(
+        scipy.sparse.csc_matrix(A),
+        permc_spec="MMD_AT_PLUS_A",
+        diag_pivot_thresh=0.0,
+        options=dict(SymmetricMode=True),
+    )
+    return int((lu.U.diagonal() < 0.0).sum())
+
+
+def sturm_count(K, M, sigma):
+    r"""
+    Count the eigenvalues below a shift.
+
+    By Sylvester's law of inertia, the number of the eigenvalues of
+    :math:`K \cdot V = \lambda M \cdot V` smaller than :math:`\sigma` equals
+    the number of the negative eigenvalues of :math:`D` in the factorization
+    :math:`K - \sigma M = L D L^T`. Only a factorization is needed, no
+    eigenvalues are computed.
+
+    Parameters
+    ----------
+    K
+        Stiffness matrix (sparse or dense).
+    M
+        Mass matrix (sparse or dense), or the vector of lumped masses.
+    sigma
+        The shift (angular frequency squared).
+
+    Returns
+    -------
+    int
+        The number of the eigenvalues smaller than ``sigma``.
+    """
+    if scipy.sparse.issparse(K) or scipy.sparse.issparse(M):
+        return _negative_pivots(_shifted(scipy.sparse.csc_matrix(K), M, sigma))
+    A = K - sigma * (diag(M) if _is_lumped(M) else M)
+    _, D, _ = ldl(A)
+    # D is block diagonal with 1x1 and 2x2 blocks
+    count, k, n = 0, 0, D.shape[0]
+    while k < n:
+        if k + 1 < n and D[k + 1, k] != 0.0:
+            count += int((eigvalsh(D[k : k + 2, k : k + 2]) < 0.0).sum())
+            k += 2
+        else:
+            count += int(D[k, k] < 0.0)
+            k += 1
+    return count
+
+
+def bisect_eigenvalue(K, M, k, lower, upper, tol=1.0e-6):
+    r"""
+    Bracket an eigenvalue by bisection with Sturm sequence counts.
+
+    Parameters
+    ----------
+    K
+        Stiffness matrix (sparse or dense).
+    M
+        Mass matrix (sparse or dense), or the vector of lumped masses.
+    k
+        The index of the eigenvalue (0 is the smallest).
+    lower
+        The initial lower bound.
+    upper
+        The initial upper bound.
+    tol
+        Optional: the relative width of the final bracket. Default is
+        :math:`10^{-6}`.
+
+    Returns
+    -------
+    tuple of lower, upper
+        The bounds of the interval that contains the eigenvalue.
+    """
+    if not (sturm_count(K, M, lower) <= k < sturm_count(K, M, upper)):
+        raise ValueError("The eigenvalue is not in the initial interval")
+    while upper - lower > tol * max(abs(upper), abs(lower)):
+        middle = (lower + upper) / 2
+        if sturm_count(K, M, middle) <= k:
+            lower = middle
+        else:
+            upper = middle
+    return lower, upper
+
+
+def _shifted(K, M, sigma):
+    if _is_lumped(M):
+        return K - sigma * scipy.sparse.diags(M)
+    return K - sigma * M
+
+
+def _slice_eigenpairs(K, M, lower, upper, count):
+    # The eigenpairs with the eigenvalues in [lower, upper), of which there
+    # are count, computed with the shift-invert Lanczos method with the shift
+    # in the middle of the interval.
+    n = K.shape[0]
+    Mop = scipy.sparse.diags(M) if _is_lumped(M) else M
+    sigma = (lower + upper) / 2
+    k = count + max(2, count // 2)
+    while True:
+        if k >= n - 1:
+            eigvals, eigvecs = eigh(
+                scipy.sparse.csc_matrix(K).toarray(), scipy.sparse.csc_matrix(Mop).toarray()
+            )
+        else:
+            eigvals, eigvecs = eigsh(K, k=k, M=Mop, sigma=sigma, which="LM")
+        inside = (eigvals >= lower) & (eigvals < upper)
+        if inside.sum() >= count or k >= n - 1:
+            return eigvals[inside], eigvecs[:, inside]
+        k = min(2 * k, n - 1)
+
+
+def _slice_task(args):
+    return _slice_eigenpairs(*args)
+
+
+def solve_band(K, M, lower, upper, nslices=1, workers=1):
+    r"""
+    Compute all the eigenpairs with the eigenvalues in an interval.
+
+    The interval is split into slices of equal width. The number of the
+    eigenvalues in each slice is known beforehand from the Sturm sequence
+    counts at the ends of the slices (the numbers of the negative pivots of
+    the factorizations of :math:`K - \sigma M`). The eigenpairs of each
+    slice are computed by the shift-invert Lanczos method with the shift in
+    the middle of the slice, and the slices may be processed in parallel by
+    separate processes. Finally, the slices are merged, duplicates (the same
+    mode found in two neighboring slices) are removed, and the number of the
+    eigenvalues found is checked against the Sturm sequence count.
+
+    Parameters
+    ----------
+    K
+        Stiffness matrix (sparse or dense).
+    M
+        Mass matrix (sparse or dense), or the vector of lumped masses.
+    lower
+        Lower end of the interval of the eigenvalues (angular frequency
+        squared).
+    upper
+        Upper end of the interval.
+    nslices
+        Optional: the number of the slices. Default is 1.
+    workers
+        Optional: the number of the processes. Default is 1 (the slices are
+        processed one after the other in the current process).
+
+    Returns
+    -------
+    tuple of eigvals, eigvecs
+        The eigenvalues in the interval, in ascending order, and the
+        mass-normalized eigenvectors (in the columns).
+    """
+    K = scipy.sparse.csc_matrix(K)
+    if not _is_lumped(M):
+        M = scipy.sparse.csc_matrix(M)
+    bounds = linspace(lower, upper, nslices + 1)
+    counts = array([_negative_pivots(_shifted(K, M, s)) for s in bounds])
+    tasks = [
+        (K, M, bounds[k], bounds[k + 1], counts[k + 1] - counts[k])
+        for k in range(nslices)
+        if counts[k + 1] > counts[k]
+    ]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_slice_task, tasks))
+    else:
+        results = [_slice_task(task) for task in tasks]
+    n = K.shape[0]
+    if not results:
+        return zeros(0), zeros((n, 0))
+    eigvals = concatenate([r[0] for r in results])
+    eigvecs = concatenate([r[1] for r in results], axis=1)
+    order = argsort(eigvals, kind="stable")
+    eigvals, eigvecs = eigvals[order], eigvecs[:, order]
+    # Remove the duplicates: neighboring eigenvalues that are equal to
+    # roundoff, with mass-parallel eigenvectors
+    Mop = scipy.sparse.diags(M) if _is_lumped(M) else M
+    keep = ones(len(eigvals), dtype=bool)
+    tol = 1.0e-9 * max(abs(upper), abs(lower), 1.0)
+    for k in range(1, len(eigvals)):
+        if keep[k - 1] and eigvals[k] - eigvals[k - 1] <= tol:
+            if abs(eigvecs[:, k - 1] @ (Mop @ eigvecs[:, k])) > 0.99:
+                keep[k] = False
+    eigvals, eigvecs = eigvals[keep], eigvecs[:, keep]
+    expected = counts[-1] - counts[0]
+    if len(eigvals) != expected:
+        raise RuntimeError(
+            f"Expected {expected} eigenvalues in the interval, found {len(eigvals)}"
+        )
+    return eigvals, eigvecs
+
+
+def _ilu_preconditioner(K, drop_tol):
+    # The incomplete factorization of the stiffness matrix as the operator
+    # that approximates its inverse.
+    ilu = spilu(scipy.sparse.csc_matrix(K), drop_tol=drop_tol)
+
+    def apply(X):
+        return ilu.solve(asarray(X, dtype=float64))
+
+    return LinearOperator(K.shape, matvec=apply, matmat=apply, dtype=float64)
+
+
+def solve_lobpcg(K, M, X0, tol=1.0e-8, maxiter=200, drop_tol=1.0e-4):
+    r"""
+    Compute the lowest eigenpairs by the preconditioned block iterations.
+
+    The locally optimal block preconditioned conjugate gradient method
+    (LOBPCG) improves a block of approximate eigenvectors, ``X0``, until the
+    residuals of all the eigenpairs are below the tolerance. The preconditioner
+    is the incomplete LU factorization of the stiffness matrix. When ``X0``
+    holds the eigenvectors of a similar model (for instance of the previous
+    design in an optimization loop), only a few iterations are needed,
+    instead of a complete solution of the eigenvalue problem.
+
+    Parameters
+    ----------
+    K
+        Stiffness matrix (sparse or dense), nonsingular.
+    M
+        Mass matrix (sparse or dense), or the vector of lumped masses.
+    X0
+        The initial block: one column per eigenpair to compute.
+    tol
+        Optional: the tolerance of the residuals. Default is ``1.0e-8``.
+    maxiter
+        Optional: the maximum number of the iterations. Default is 200.
+    drop_tol
+        Optional: the drop tolerance of the incomplete factorization. Default
+        is ``1.0e-4``.
+
+    Returns
+    -------
+    tuple of eigvals, eigvecs, iterations
+        The eigenvalues in ascending order, the mass-normalized eigenvectors
+        (in the columns), and the number of the iterations that produced
+        them (zero when ``X0`` already satisfies the tolerance).
+
+    Raises
+    ------
+    RuntimeError
+        When the residuals are still above the tolerance after ``maxiter``
+        iterations.
+    """
+    K = scipy.sparse.csc_matrix(K)
+    Mop = scipy.sparse.diags(M) if _is_lumped(M) else scipy.sparse.csc_matrix(M)
+    X0 = array(X0, dtype=float64)
+    if X0.ndim != 2 or X0.shape[0] != K.shape[0]:
+        raise ValueError("The initial block must have one row per degree of freedom")
+    if 5 * X0.shape[1] >= K.shape[0]:
+        raise ValueError("Too many eigenpairs for the block iterations: solve directly")
+    # The tolerance applies to the residuals of the scaled matrices
+    kscale = abs(K.diagonal()).max()
+    mscale = abs(Mop.diagonal()).max()
+    P = _ilu_preconditioner(K / kscale, drop_tol)
+    with warnings.catch_warnings():
+        # The convergence is checked below
+        warnings.simplefilter("ignore", UserWarning)
+        eigvals, eigvecs, history = lobpcg(
+            K / kscale, X0, B=Mop / mscale, M=P, tol=tol, maxiter=maxiter, largest=False,
+            retResidualNormsHistory=True
+        )
+    # The history holds the residuals of the initial block and of each
+    # iterate up to the returned one, followed by the final check
+    iterations = len(history) - 2
+    residuals = ((K / kscale) @ eigvecs - ((Mop / mscale) @ eigvecs) * eigvals)
+    if (norm(residuals, axis=0) > tol).any():
+        raise RuntimeError(f"The block iterations did not converge in {maxiter} iterations")
+    eigvals *= kscale / mscale
+    order = argsort(eigvals, kind="stable")
+    eigvals, eigvecs = eigvals[order], eigvecs[:, order]
+    eigvecs /= ((Mop @ eigvecs) * eigvecs).sum(axis=0) ** 0.5
+    return eigvals, eigvecs, iterations
+
+
+def initial_block(n, nmodes, previous=None, seed=0):
+    """
+    Form the initial block for :func:`solve_lobpcg`.
+
+    Parameters
+    ----------
+    n
+        The number of the degrees of freedom.
+    nmodes
+        The number of the eigenpairs to compute.
+    previous
+        Optional: the eigenvectors from a previous solution (in the columns).
+        They are used as the leading columns of the block, provided they have
+        ``n`` rows; the remaining columns are random.
+    seed
+        Optional: the seed of the random columns. Default is 0.
+
+    Returns
+    -------
+    array
+        The block, ``n`` rows and ``nmodes`` columns.
+    """
+    X0 = default_rng(seed).random((n, nmodes)) - 0.5
+    if previous is not None:
+        previous = asarray(previous)
+        if previous.ndim == 2 and previous.shape[0] == n:
+            k = min(nmodes, previous.shape[1])
+            X0[:, :k] = previous[:, :k]
+    return X0
+
+
+def _mass_times(M, V):
+    if M is None:
+        return V
+    if _is_lumped(M):
+        return M[:, None] * V
+    return M @ V
+
+
+def modal_assurance(V1, V2, M=None):
+    r"""
+    Compute the modal assurance criterion (MAC) matrix.
+
+    .. math::
+        \mathrm{MAC}_{ij} = \frac{(v_{1i}^T M v_{2j})^2}
+        {(v_{1i}^T M v_{1i}) (v_{2j}^T M v_{2j})}
+
+    The entries are between zero (orthogonal mode shapes) and one (the same
+    mode shape, up to scaling). All the entries are obtained from one matrix
+    product.
+
+    Parameters
+    ----------
+    V1
+        The first set of the mode shapes (in the columns).
+    V2
+        The second set of the mode shapes (in the columns), with the same
+        number of rows.
+    M
+        Optional: mass matrix (sparse or dense), or the vector of lumped
+        masses, for the mass-weighted criterion. Default is ``None`` (no
+        weighting).
+
+    Returns
+    -------
+    array
+        The MAC matrix, one row per mode of ``V1``, one column per mode of
+        ``V2``.
+    """
+    V1, V2 = asarray(V1), asarray(V2)
+    MV2 = _mass_times(M, V2)
+    C = V1.T @ MV2
+    n1 = (V1 * _mass_times(M, V1)).sum(axis=0)
+    n2 = (V2 * MV2).sum(axis=0)
+    return C**2 / outer(n1, n2)
+
+
+def track_modes(V_reference, V, M=None):
+    """
+    Match the mode shapes to the reference mode shapes.
+
+    The modes are paired so that the sum of the MAC values of the pairs is
+    maximal (refer to :func:`modal_assurance`), which keeps the order of the
+    modes consistent when the modes cross (swap the order of the frequencies)
+    between two variants of a model.
+
+    Parameters
+    ----------
+    V_reference
+        The reference mode shapes (in the columns).
+    V
+        The mode shapes to match (in the columns), at least as many as the
+        reference mode shapes.
+    M
+        Optional: mass matrix, or the vector of lumped masses. Default is
+        ``None`` (no weighting).
+
+    Returns
+    -------
+    tuple of order, signs, mac
+        ``V[:, order] * signs`` are the mode shapes matched to the columns of
+        ``V_reference``, with the signs that make them point the same way,
+        and ``mac`` are the MAC values of the pairs.
+    """
+    V_reference = asarray(V_reference)
+    mac = modal_assurance(V_reference, V, M)
+    rows, order = linear_sum_assignment(mac, maximize=True)
+    # The signs of the products of the pairs
+    products = (V_reference[:, rows] * _mass_times(M, V[:, order])).sum(axis=0)
+    signs = where(products < 0.0, -1.0, 1.0)
+    return order, signs, mac[rows, order]
@@ -2,7 +2,7 @@
 Simple geometry utilities.
 """
 
-from numpy import array, dot
+from numpy import array, dot, asarray, float64, isnan, where, einsum, full, nan
 from numpy.linalg import norm, cross
 
 
@@ -289,3 +289,122 @@ def member_3d_geometry(i, j, xy_vector = None, xz_vector = None):
         e_z = e_z / norm(e_z)
         e_y = cross(e_z, e_x)
     return e_x, e_y, e_z, h
+
+
+def member_geometry(member, i, j, geom=None):
+    r"""
+    Retrieve the geometry of a member.
+
+    The geometry is computed from the coordinates of the joints, unless it is
+    supplied as ``geom`` (for instance, by the assembly functions of
+    :mod:`pystran.model`, which take it from the cached geometry of all the
+    members, refer to :func:`pystran.model.member_geometry_table`). The
+    orientation vectors are taken from the section of the member (3d beams);
+    other members use the heuristic orientation.
+
+    Parameters
+    ----------
+    member
+        Dictionary that defines the data of the member.
+    i
+        Dictionary holding data for first joint.
+    j
+        Dictionary holding data for second joint.
+    geom
+        Optional: the geometry of the member, which is returned as is.
+
+    Returns
+    -------
+    tuple
+        ``e_x, e_z, h`` in 2d (refer to :func:`member_2d_geometry`), and
+        ``e_x, e_y, e_z, h`` in 3d (refer to :func:`member_3d_geometry`).
+    """
+    if geom is not None:
+        return geom
+    if len(i["coordinates"]) == 2:
+        return member_2d_geometry(i, j)
+    sect = member["section"]
+    return member_3d_geometry(i, j, sect.get("xy_vector"), sect.get("xz_vector"))
+
+
+def members_2d_geometry(Xi, Xj):
+    r"""
+    Compute 2d member geometry for many members at once.
+
+    Refer to :func:`member_2d_geometry` for the definition of the local basis.
+
+    Parameters
+    ----------
+    Xi
+        Coordinates of the first joints of the members (one row per member).
+    Xj
+        Coordinates of the second joints of the members (one row per member).
+
+    Returns
+    -------
+    tuple of e_x, e_z, h
+        Arrays of the basis vectors (one row per member), and the array of the
+        lengths of the members.
+    """
+    e_x = asarray(Xj, dtype=float64) - asarray(Xi, dtype=float64)
+    h = norm(e_x, axis=1)
+    if (h <= 0.0).any():
+        raise ZeroDivisionError("Length of element must be positive")
+    e_x /= h[:, None]
+    e_z = array([e_x[:, 1], -e_x[:, 0]]).T
+    return e_x, e_z, h
+
+
+def members_3d_geometry(Xi, Xj, xy_vectors=None, xz_vectors=None):
+    r"""
+    Compute 3d member geometry for many members at once.
+
+    Refer to :func:`member_3d_geometry` for the definition of the local basis
+    and for the orientation heuristics.
+
+    Parameters
+    ----------
+    Xi
+        Coordinates of the first joints of the members (one row per member).
+    Xj
+        Coordinates of the second joints of the members (one row per member).
+    xy_vectors
+        Optional: the vectors that define the :math:`x-y` planes (one row per
+        member). Rows of ``nan`` stand for the vectors that are not supplied.
+    xz_vectors
+        Optional: the vectors that define the :math:`x-z` planes (one row per
+        member), with rows of ``nan`` for the vectors that are not supplied.
+        For each member at most one of the two vectors may be supplied.
+
+    Returns
+    -------
+    tuple of e_x, e_y, e_z, h
+        Arrays of the basis vectors (one row per member), and the array of the
+        lengths of the members.
+    """
+    e_x = asarray(Xj, dtype=float64) - asarray(Xi, dtype=float64)
+    n = e_x.shape[0]
+    h = norm(e_x, axis=1)
+    if (h <= 0.0).any():
+        raise ZeroDivisionError("Length of element must be positive")
+    e_x /= h[:, None]
+    xy = full((n, 3), nan) if xy_vectors is None else asarray(xy_vectors, dtype=float64)
+    xz = full((n, 3), nan) if xz_vectors is None else asarray(xz_vectors, dtype=float64)
+    use_xy = ~isnan(xy).any(axis=1) & isnan(xz).any(axis=1)
+    # The heuristic orientation, when neither vector is supplied
+    heuristic = isnan(xz).any(axis=1) & ~use_xy
+    gx = array([1.0, 0.0, 0.0])
+    gy = array([0.0, 1.0, 0.0])
+    xz = where(heuristic[:, None], gx, xz)
+    parallel = heuristic & (abs(e_x @ gx) > 0.99)
+    xz = where(parallel[:, None], gy, xz)
+    v = where(use_xy[:, None], xy, xz)
+    if (abs(einsum("ij,ij->i", e_x, v)) > 0.99 * norm(v, axis=1)).any():
+        raise ZeroDivisionError("Orientation vector must not be parallel to the beam axis")
+    # With the xz vector: e_y = xz x e_x, e_z = e_x x e_y; with the xy vector:
+    # e_z = e_x x xy, e_y = e_z x e_x
+    w = cross(e_x, v)
+    w /= norm(w, axis=1)[:, None]
+    e_y = where(use_xy[:, None], cross(w, e_x), -w)
+    e_z = where(use_xy[:, None], w, cross(e_x, -w))
+    return e_x, e_y, e_z, h
@@ -0,0 +1,189 @@
+"""
+Define connectivity queries on the model.
+
+The queries rely on the joint-to-member adjacency that is maintained in the
+model metadata by the functions that add members (refer to
+:func:`pystran.model.create`). Therefore, finding the members that meet at a
+joint does not require a scan of all the members.
+"""
+
+from numpy import array, ones, int8, int64
+import scipy.sparse
+import scipy.sparse.csgraph
+from pystran.model import MEMBER_KINDS, metadata
+
+
+def members_at_joint(m, jid, kinds=MEMBER_KINDS):
+    """
+    Find the members connected to a joint.
+
+    Parameters
+    ----------
+    m
+        The model.
+    jid
+        The joint identifier.
+    kinds
+        Optional: the kinds of members to consider (by default all of
+        ``"truss_members"``, ``"beam_members"``, ``"rigid_link_members"``,
+        ``"spring_members"``, ``"superelements"``).
+
+    Returns
+    -------
+    list
+        List of pairs ``(kind, mid)``, where ``kind`` is the key under which
+        the member is stored in the model, and ``mid`` is the member
+        identifier. For instance, ``m[kind][mid]`` is the member.
+    """
+    adjacency = metadata(m)["adjacency"]
+    if jid not in m["joints"]:
+        raise RuntimeError("Joint does not exist")
+    return [(kind, mid) for kind, mid in adjacency.get(jid, []) if kind in kinds]
+
+
+def adjacent_joints(m, jid):
+    """
+    Find the joints connected to a joint by members.
+
+    Parameters
+    ----------
+    m
+        The model.
+    jid
+        The joint identifier.
+
+    Returns
+    -------
+    list
+        List of the identifiers of the joints that share a member with the
+        joint ``jid`` (each listed once).
+    """
+    neighbors = {}
+    for kind, mid in members_at_joint(m, jid):
+        for other in m[kind][mid]["connectivity"]:
+            if other != jid:
+                neighbors[other] = None
+    return list(neighbors.keys())
+
+
+def joint_degrees(m):
+    """
+    Count the members connected to each joint.
+
+    Joints with few members attached are candidates for trouble: for instance,
+    a truss joint connected to only one bar (or to two collinear bars) is not
+    restrained in the transverse direction.
+
+    Parameters
+    ----------
+    m
+        The model.
+
+    Returns
+    -------
+    dict
+        Dictionary that maps the joint identifiers to the numbers of members
+        connected to the joints.
+    """
+    adjacency = metadata(m)["adjacency"]
+    return {jid: len(adjacency.get(jid, [])) for jid in m["joints"].keys()}
+
+
+def joint_graph(m, include_links=True):
+    """
+    Construct the graph of the joints of the model.
+
+    The vertices of the graph are the joints, in the order in which they were
+    added to the model. Two joints are connected by an edge when they are
+    connected by a member (truss, beam, rigid link, spring, or superelement), and optionally
+    when they are linked with :func:`pystran.model.add_dof_links`.
+
+    The graph is returned as a sparse symmetric adjacency matrix, which can be
+    passed to the graph algorithms of ``scipy.sparse.csgraph`` (for instance
+    reverse Cuthill-McKee reordering), or to graph partitioners.
+
+    Parameters
+    ----------
+    m
+        The model.
+    include_links
+        Optional: should joints linked by degree-of-freedom links be considered
+        connected? Default is ``True``.
+
+    Returns
+    -------
+    tuple of G, jids
+        ``G`` is the adjacency matrix in the CSR format (with unit entries),
+        ``jids`` is the list of joint identifiers corresponding to the rows and
+        columns of ``G``.
+
+    Examples
+    --------
+    >>> G, jids = graph.joint_graph(m)
+    >>> perm = scipy.sparse.csgraph.reverse_cuthill_mckee(G, symmetric_mode=True)
+    >>> ordered = [jids[k] for k in perm]
+    """
+    jids = list(m["joints"].keys())
+    index = {jid: k for k, jid in enumerate(jids)}
+    rows, cols = [], []
+    for kind in MEMBER_KINDS:
+        if kind in m:
+            for member in m[kind].values():
+                connectivity = member["connectivity"]
+                for a in connectivity:
+                    for b in connectivity:
+                        if a != b:
+                            rows.append(index[a])
+                            cols.append(index[b])
+    if include_links:
+        for jid, j in m["joints"].items():
+            if "links" in j:
+                for other in j["links"].keys():
+                    rows.append(index[jid])
+                    cols.append(index[other])
+                    rows.append(index[other])
+                    cols.append(index[jid])
+    n = len(jids)
+    G = scipy.sparse.coo_matrix(
+        (ones(len(rows), dtype=int8), (array(rows, dtype=int64), array(cols, dtype=int64))),
+        shape=(n, n),
+    ).tocsr()
+    # Duplicate edges (for instance parallel members) were summed
+    G.data[:] = 1
+    return G, jids
+
+
+def connected_components(m, include_links=True):
+    """
+    Find the connected parts of the structure.
+
+    A structure that consists of several disconnected parts is most likely
+    defined incorrectly (unless each of the parts is supported separately).
+    Isolated joints (joints that are not connected to any member) form
+    components of their own.
+
+    Parameters
+    ----------
+    m
+        The model.
+    include_links
+        Optional: should joints linked by degree-of-freedom links be considered
+        connected? Default is ``True``.
+
+    Returns
+    -------
+    list
+        List of the components, each a list of joint identifiers. The
+        components are sorted by size, the largest first.
+
+    See Also
+    --------
+    :func:`joint_graph`
+    """
+    G, jids = joint_graph(m, include_links)
+    ncomp, labels = scipy.sparse.csgraph.connected_components(G, directed=False)
+    components = [[] for c in range(ncomp)]
+    for jid, c in zip(jids, labels):
+        components[c].append(jid)
+    components.sort(key=len, reverse=True)
+    return components
@@ -0,0 +1,342 @@
+r"""
+Define influence lines and the analysis of moving loads.
+
+An influence line gives a response quantity (a displacement, a reaction, or
+an internal force at a fixed location) as a function of the position of a
+unit load moving along the structure. Each response quantity is a linear
+function of the displacements, :math:`r = c^T \cdot U` (plus a local term when
+the load is on the member in which the internal force is evaluated). With
+:math:`K \cdot U = F`, the response to the load :math:`F` is
+
+.. math::
+    r = c^T \cdot K^{-1} \cdot F = Z^T \cdot F, \quad K \cdot Z = c.
+
+Hence one (adjoint) solution :math:`Z` for each response quantity covers all
+the positions of the load: this is the principle of Müller-Breslau, the
+influence line is the deflected shape :math:`Z` interpolated at the positions
+of the load. The stiffness matrix of the free degrees of freedom is
+factorized once, and the equivalent joint loads of all the positions are
+computed with array operations (refer to :mod:`pystran.memberloads`).
+
+The loads move along a path, which is a chain of beam members. The positions
+on the path are given by the distance from the start of the path.
+"""
+
+from numpy import array, zeros, asarray, concatenate, cumsum, searchsorted
+from numpy import einsum, linspace, clip, float64, int64
+from scipy.sparse.linalg import splu
+from pystran import model
+from pystran import resultants
+from pystran import memberloads
+
+
+def _default_direction(m):
+    # The unit load points down: along the negative y (2d) or z (3d) axis.
+    direction = zeros(m["dim"])
+    direction[-1] = -1.0
+    return direction
+
+
+def adjoint_solutions(m, quantities):
+    """
+    Compute the adjoint solutions of the response quantities.
+
+    The stiffness matrix of the free degrees of freedom is assembled as a
+    sparse matrix and factorized once, and the adjoint solutions of all the
+    quantities are obtained by forward and backward substitutions.
+
+    :func:`pystran.model.number_dofs` must be called before this function. The
+    prescribed displacements are assumed to be zero.
+
+    Parameters
+    ----------
+    m
+        The model.
+    quantities
+        The list of the response quantities. Each is a tuple,
+        ``("displacement", jid, dof)`` or ``("reaction", jid, dof)`` for a
+        joint, or ``(name, mid, xi)`` for the internal force ``name`` (for
+        instance ``"My"``, refer to :func:`pystran.resultants.internal_forces`)
+        of the beam ``mid`` at the parametric location ``xi``.
+
+    Returns
+    -------
+    dict
+        Dictionary with the keys ``"quantities"``, and ``"Z"`` (the array of
+        the adjoint solutions, one row per degree of freedom, one column per
+        quantity).
+    """
+    if not ("nfreedof" in m) or m["nfreedof"] <= 0:
+        raise RuntimeError("No free degrees of freedom: nothing to compute")
+    nt, nf = m["ntotaldof"], m["nfreedof"]
+    K = model.build_stiffness_matrix(m, sparse=True).tocsc()
+    C = zeros((nt, len(quantities)))
+    table = resultants.member_table(m, "beam_members")
+    for k, quantity in enumerate(quantities):
+        kind = quantity[0]
+        if kind == "displacement":
+            jid, dof = quantity[1], quantity[2]
+            C[m["joints"][jid]["dof"][dof], k] = 1.0
+        elif kind == "reaction":
+            jid, dof = quantity[1], quantity[2]
+            d = m["joints"][jid]["dof"][dof]
+            if d < nf:
+                raise RuntimeError(f"Joint {jid} is not supported in the direction {dof}")
+            # The reaction is the row of K for the supported degree of freedom
+            C[0:nf, k] = K[0:nf, d].toarray().ravel()
+        else:
+            mid, xi = quantity[1], quantity[2]
+            e = table["mids"].index(mid)
+            rows = resultants.internal_force_rows(table, kind, xi)
+            C[table["dofs"][e], k] += rows[e]
+    Z = zeros((nt, len(quantities)))
+    if quantities:
+        Z[0:nf] = splu(K[0:nf, 0:nf]).solve(C[0:nf])
+    return dict(quantities=list(quantities), Z=Z)
+
+
+def _unit_loads(m, table, rows, xi, direction):
+    # The local fixed-end forces of unit loads along the given direction,
+    # one per position (the members in the rows of the table, at xi), and
+    # the point-load records that they come from.
+    directions = ("x", "z") if m["dim"] == 2 else ("x", "y", "z")
+    mids = [table["mids"][e] for e in rows]
+    records, f = [], 0.0
+    for d in directions:
+        P = table["e_" + d][rows] @ direction
+        record = dict(type="point", kind="beam_members", mids=mids, direction=d, P=P, xi=xi)
+        records.append(record)
+        f = f + memberloads.record_fixed_end_forces(m, table, rows, record)
+    return records, f
+
+
+def influence_values(m, adjoint, mids, xi, direction=None):
+    r"""
+    Evaluate the influence lines at given positions of the unit load.
+
+    Parameters
+    ----------
+    m
+        The model.
+    adjoint
+        The adjoint solutions (refer to :func:`adjoint_solutions`).
+    mids
+        The identifiers of the beam members on which the load is, one per
+        position.
+    xi
+        The parametric coordinates of the load on the members
+        (:math:`-1\le\xi\le+1`), one per position.
+    direction
+        Optional: the direction of the unit load (a unit vector in the global
+        Cartesian coordinates). Default is the negative :math:`y` axis in 2d
+        and the negative :math:`z` axis in 3d.
+
+    Returns
+    -------
+    array
+        Array of the values of the response quantities, one row per quantity,
+        one column per position.
+    """
+    if direction is None:
+        direction = _default_direction(m)
+    direction = asarray(direction, dtype=float64)
+    table = resultants.member_table(m, "beam_members")
+    index = {mid: k for k, mid in enumerate(table["mids"])}
+    rows = array([index[mid] for mid in model.id_list(mids)], dtype=int64)
+    xi = asarray(xi, dtype=float64).reshape(-1)
+    records, f = _unit_loads(m, table, rows, xi, direction)
+    F = memberloads.local_to_global(m, "beam_members", table, f, rows)
+    dofs = table["dofs"][rows]
+    values = einsum("pd,pdq->qp", F, adjoint["Z"][dofs])
+    for k, quantity in enumerate(adjoint["quantities"]):
+        kind = quantity[0]
+        if kind == "reaction":
+            # The loads applied directly to the support
+            d = m["joints"][quantity[1]]["dof"][quantity[2]]
+            values[k] -= (F * (dofs == d)).sum(axis=1)
+        elif kind != "displacement":
+            # The internal forces of the fixed-end state of the loaded member
+            on = rows == index[quantity[1]]
+            if not on.any():
+                continue
+            for record in records:
+                P, x = record["P"][on], record["xi"][on]
+                record = dict(record, mids=[quantity[1]] * len(P), P=P, xi=x)
+                span = memberloads.record_span_forces(m, table, rows[on], record, array([quantity[2]]))
+                values[k, on] += span[kind][:, 0]
+    return values
+
+
+def path(m, mids):
+    """
+    Define a path for the moving loads along a chain of beam members.
+
+    The members are traversed in the given order. Each member is traversed
+    from the joint it shares with the previous member (or, for the first
+    member, towards the joint it shares with the next member).
+
+    Parameters
+    ----------
+    m
+        The model.
+    mids
+        The identifiers of the beam members of the path, in order.
+
+    Returns
+    -------
+    dict
+        Dictionary with the keys ``"mids"``, ``"forward"`` (for each member,
+        is it traversed from its first joint to the second?), ``"h"`` (the
+        lengths of the members), ``"start"`` (the distances of the starts of
+        the members from the start of the path), and ``"length"`` (the length
+        of the path).
+    """
+    mids = model.id_list(mids)
+    members = m["beam_members"]
+    forward = []
+    for k, mid in enumerate(mids):
+        c = members[mid]["connectivity"]
+        if k == 0:
+            following = members[mids[1]]["connectivity"] if len(mids) > 1 else [c[1]]
+            forward.append(c[1] in following)
+        else:
+            previous = members[mids[k - 1]]["connectivity"]
+            end = previous[1] if forward[k - 1] else previous[0]
+            if end not in c:
+                raise RuntimeError(f"Member {mid} is not connected to member {mids[k - 1]}")
+            forward.append(c[0] == end)
+    table = resultants.member_table(m, "beam_members")
+    h = array([table["h"][table["mids"].index(mid)] for mid in mids])
+    start = concatenate([[0.0], cumsum(h)[:-1]])
+    return dict(mids=mids, forward=array(forward), start=start, length=h.sum(), h=h)
+
+
+def path_positions(p, s):
+    """
+    Find the members and the parametric coordinates of positions on a path.
+
+    Parameters
+    ----------
+    p
+        The path (refer to :func:`path`).
+    s
+        The distances from the start of the path (an array).
+
+    Returns
+    -------
+    tuple of mids, xi
+        The list of the members, and the array of the parametric coordinates,
+        one per position.
+    """
+    s = clip(asarray(s, dtype=float64).reshape(-1), 0.0, p["length"])
+    k = clip(searchsorted(p["start"], s, side="right") - 1, 0, len(p["mids"]) - 1)
+    t = (s - p["start"][k]) / p["h"][k]
+    xi = 2 * t - 1
+    xi[~p["forward"][k]] *= -1
+    return [p["mids"][j] for j in k], clip(xi, -1.0, 1.0)
+
+
+def influence_lines(m, quantities, p, npoints=101, direction=None):
+    """
+    Compute the influence lines of response quantities along a path.
+
+    Parameters
+    ----------
+    m
+        The model.
+    quantities
+        The list of the response quantities (refer to
+        :func:`adjoint_solutions`).
+    p
+        The path (refer to :func:`path`).
+    npoints
+        Optional: the number of the equally spaced positions of the unit load
+        along the path. Default is 101.
+    direction
+        Optional: the direction of the unit load (refer to
+        :func:`influence_values`).
+
+    Returns
+    -------
+    tuple of s, values
+        The array of the positions along the path, and the array of the
+        values of the influence lines, one row per quantity, one column per
+        position.
+
+    Examples
+    --------
+    >>> p = influence.path(m, [1, 2])
+    >>> s, lines = influence.influence_lines(m, [("reaction", 2, freedoms.U2), ("My", 1, 1.0)], p)
+    """
+    adjoint = adjoint_solutions(m, quantities)
+    s = linspace(0.0, p["length"], npoints)
+    mids, xi = path_positions(p, s)
+    return s, influence_values(m, adjoint, mids, xi, direction)
+
+
+def vehicle_envelope(m, quantities, p, offsets, loads, npoints=201, direction=None):
+    """
+    Compute the envelopes of response quantities due to a moving vehicle.
+
+    The vehicle is a set of concentrated loads (axles) at fixed distances
+    behind the front axle. The front axle moves along the path, from the
+    start of the path until the last axle leaves it. The axles that are off
+    the path do not load the structure. The responses to all the positions of
+    the vehicle are evaluated from the same adjoint solutions (refer to
+    :func:`adjoint_solutions`).
+
+    Parameters
+    ----------
+    m
+        The model.
+    quantities
+        The list of the response quantities (refer to
+        :func:`adjoint_solutions`).
+    p
+        The path (refer to :func:`path`).
+    offsets
+        The distances of the axles behind the front axle (the first is
+        usually zero).
+    loads
+        The magnitudes of the axle loads (acting along ``direction``).
+    npoints
+        Optional: the number of the equally spaced positions of the front
+        axle. Default is 201.
+    direction
+        Optional: the direction of the loads (refer to
+        :func:`influence_values`).
+
+    Returns
+    -------
+    dict
+        Dictionary with the keys ``"s"`` (the positions of the front axle),
+        ``"values"`` (the responses, one row per quantity, one column per
+        position of the vehicle), ``"max"`` and ``"min"`` (the extremes of
+        the responses, one per quantity), and ``"max_position"`` and
+        ``"min_position"`` (the positions of the front axle that produce the
+        extremes).
+    """
+    offsets = asarray(offsets, dtype=float64)
+    loads = asarray(loads, dtype=float64)
+    if offsets.shape != loads.shape:
+        raise ValueError("There must be one offset for each axle load")
+    adjoint = adjoint_solutions(m, quantities)
+    s = linspace(0.0, p["length"] + offsets.max(), npoints)
+    # All the axle positions at once: one row per axle
+    axles = s[None, :] - offsets[:, None]
+    on = (axles >= 0.0) & (axles <= p["length"])
+    mids, xi = path_positions(p, axles[on])
+    v = influence_values(m, adjoint, mids, xi, direction)
+    weights = (loads[:, None] * on)[on]
+    values = zeros((len(quantities), axles.size))
+    values[:, on.ravel()] = v * weights
+    values = values.reshape(len(quantities), len(offsets), len(s)).sum(axis=1)
+    kmax, kmin = values.argmax(axis=1), values.argmin(axis=1)
+    return dict(
+        s=s,
+        values=values,
+        max=values.max(axis=1),
+        min=values.min(axis=1),
+        max_position=s[kmax],
+        min_position=s[kmin],
+    )
@@ -0,0 +1,482 @@
+"""
+Define load cases, load combinations, and envelopes.
+
+A load case is a named set of loads, stored in the model under the key
+``"load_cases"``. All the load cases are solved together, against a single
+factorization of the stiffness matrix (refer to :func:`solve_load_cases`), and
+the results are stored as arrays with one column per load case.
+
+A load combination is a linear combination of the load cases, stored in the
+model under the key ``"load_combinations"``. The results of a combination are
+not computed by a solution: they are the results of the load cases multiplied
+by the matrix of the combination factors. The envelopes (the extreme values
+over all the combinations) are computed in chunks of combinations, so that the
+results of all the combinations never need to be stored at once, and the
+governing combination is reported for each extreme value.
+
+The load cases may also hold member loads (refer to :mod:`pystran.memberloads`,
+where the functions that add member loads accept the name of a load case).
+Their equivalent joint loads are included in the load vectors, and their
+fixed-end forces are added to the resultants of the envelopes. The load cases
+may also prescribe displacements of the supports (settlements), so that many
+patterns of settlement are solved against the same factorization.
+"""
+
+from numpy import zeros, full, inf, int64, tensordot, where
+from scipy.sparse.linalg import splu
+from pystran import model
+from pystran import resultants
+from pystran import memberloads
+
+
+def add_load_case(m, name):
+    """
+    Add a load case to the model.
+
+    Parameters
+    ----------
+    m
+        The model.
+    name
+        The name of the load case (anything that is a legal dictionary key).
+
+    Returns
+    -------
+    dict
+        The load case.
+    """
+    if "load_cases" not in m:
+        m["load_cases"] = {}
+    if name in m["load_cases"]:
+        raise RuntimeError(f"Load case {name} already exists")
+    m["load_cases"][name] = {"name": name, "loads": {}}
+    return m["load_cases"][name]
+
+
+def add_case_load(m, name, jid, dof, value):
+    """
+    Add a joint load to a load case.
+
+    Parameters
+    ----------
+    m
+        The model.
+    name
+        The name of the load case.
+    jid
+        The joint identifier.
+    dof
+        The degree of freedom (0, 1, ...). Refer to the model key
+        ``'freedoms'``.
+    value
+        The signed magnitude of the load.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    :func:`pystran.model.add_load`
+    """
+    case = _load_case(m, name)
+    if jid not in m["joints"]:
+        raise RuntimeError("Joint does not exist")
+    loads = case["loads"].setdefault(jid, {})
+    loads[dof] = loads.get(dof, 0.0) + value
+    return None
+
+
+def add_case_settlement(m, name, jid, dof, value):
+    """
+    Add a prescribed displacement of a support to a load case.
+
+    The displacements of the supports that are not given for a load case are
+    zero in that load case, whatever the values given to
+    :func:`pystran.model.add_support`.
+
+    Parameters
+    ----------
+    m
+        The model.
+    name
+        The name of the load case.
+    jid
+        The joint identifier.
+    dof
+        The degree of freedom (0, 1, ...), which must be supported. Refer to
+        the model key ``'freedoms'``.
+    value
+        The signed magnitude of the displacement.
+
+    Returns
+    -------
+    None
+
+    Examples
+    --------
+    >>> for jid in support_jids:
+    ...     loadcases.add_load_case(m, f"settle {jid}")
+    ...     loadcases.add_case_settlement(m, f"settle {jid}", jid, freedoms.U2, -0.01)
+    """
+    case = _load_case(m, name)
+    if jid not in m["joints"]:
+        raise RuntimeError("Joint does not exist")
+    if dof not in m["joints"][jid].get("supports", {}):
+        raise RuntimeError(f"Joint {jid} is not supported in the direction {dof}")
+    if "settlements" not in case:
+        case["settlements"] = {}
+    settlements = case["settlements"].setdefault(jid, {})
+    settlements[dof] = value
+    return None
+
+
+def add_gravity(m, g_vector, name="gravity", lumping=None):
+    """
+    Add a load case of the self weight of the members.
+
+    The weight is computed from the mass densities ``rho`` and the areas
+    ``A`` of the sections of all the truss and beam members (refer to
+    :func:`pystran.memberloads.add_gravity_load`). Being a load case of its
+    own, it is solved once and then reused in all the combinations.
+
+    Parameters
+    ----------
+    m
+        The model.
+    g_vector
+        The vector of the acceleration of gravity, for instance ``[0.0,
+        -9.81]`` in 2d.
+    name
+        Optional: the name of the load case. Default is ``"gravity"``.
+    lumping
+        Optional: ``None`` (default) for the consistent distribution of the
+        weight to the joints, ``"HRZ"`` or ``"row-sum"`` for the lumped
+        distribution.
+
+    Returns
+    -------
+    dict
+        The load case.
+
+    Examples
+    --------
+    >>> loadcases.add_gravity(m, [0.0, 0.0, -9.81])
+    >>> loadcases.add_combination(m, "1.35G+1.5Q", {"gravity": 1.35, "live": 1.5})
+    """
+    case = add_load_case(m, name)
+    memberloads.add_gravity_load(m, g_vector, lumping=lumping, case=name)
+    return case
+
+
+def _load_case(m, name):
+    if "load_cases" not in m or name not in m["load_cases"]:
+        raise RuntimeError(f"Load case {name} does not exist")
+    return m["load_cases"][name]
+
+
+def add_combination(m, name, factors):
+    """
+    Add a load combination to the model.
+
+    Parameters
+    ----------
+    m
+        The model.
+    name
+        The name of the combination.
+    factors
+        Dictionary that maps the names of the load cases to their factors in
+        the combination. The load cases that are not listed have zero factors.
+
+    Returns
+    -------
+    None
+    """
+    if "load_combinations" not in m:
+        m["load_combinations"] = {}
+    if name in m["load_combinations"]:
+        raise RuntimeError(f"Load combination {name} already exists")
+    for case in factors.keys():
+        _load_case(m, case)
+    m["load_combinations"][name] = {"name": name, "factors": dict(factors)}
+    return None
+
+
+def load_case_vectors(m):
+    """
+    Assemble the load vectors of all the load cases.
+
+    The load vectors include the equivalent joint loads of the member loads of
+    the load cases.
+
+    :func:`pystran.model.number_dofs` must be called before this function.
+
+    Parameters
+    ----------
+    m
+        The model.
+
+    Returns
+    -------
+    tuple of names, F
+        The names of the load cases, and the array of the loads, one row per
+        degree of freedom, one column per load case.
+    """
+    cases = m.get("load_cases", {})
+    names = list(cases.keys())
+    F = zeros((m["ntotaldof"], len(names)))
+    for c, case in enumerate(cases.values()):
+        for jid, loads in case["loads"].items():
+            dof = m["joints"][jid]["dof"]
+            for d, value in loads.items():
+                F[dof[d], c] += value
+        if case.get("member_loads"):
+            F[:, c] += memberloads.equivalent_loads(m, case["name"])
+    return names, F
+
+
+def settlement_vectors(m):
+    """
+    Collect the prescribed displacements of the supports of all the load cases.
+
+    :func:`pystran.model.number_dofs` must be called before this function.
+
+    Parameters
+    ----------
+    m
+        The model.
+
+    Returns
+    -------
+    tuple of names, D
+        The names of the load cases, and the array of the prescribed
+        displacements, one row per prescribed degree of freedom (starting with
+        the degree of freedom ``m["nfreedof"]``), one column per load case.
+    """
+    cases = m.get("load_cases", {})
+    names = list(cases.keys())
+    nf = m["nfreedof"]
+    D = zeros((m["ntotaldof"] - nf, len(names)))
+    for c, case in enumerate(cases.values()):
+        for jid, settlements in case.get("settlements", {}).items():
+            dof = m["joints"][jid]["dof"]
+            for d, value in settlements.items():
+                if dof[d] < nf:
+                    raise RuntimeError(f"Joint {jid} is not supported in the direction {d}")
+                D[dof[d] - nf, c] = value
+    return names, D
+
+
+def solve_load_cases(m):
+    r"""
+    Solve the static equilibrium for all the load cases.
+
+    The stiffness matrix is assembled as a sparse matrix, the matrix of the
+    free degrees of freedom is factorized once, and the displacements of all
+    the load cases are obtained by forward and backward substitutions with all
+    the load vectors at once,
+
+    .. math::
+        K_{ff} \cdot U_{f} = L_{f} - K_{fd} \cdot U_{d},
+
+    where the prescribed displacements :math:`U_d` of the load cases (refer to
+    :func:`add_case_settlement`) enter through the sparse coupling block
+    :math:`K_{fd}`. The reactions are computed only for the prescribed degrees
+    of freedom,
+
+    .. math::
+        R = K_{df} \cdot U_f + K_{dd} \cdot U_d - L_d.
+
+    The results are stored in the model under the key ``"load_case_results"``,
+    as a dictionary with the keys ``"names"`` (the names of the load cases),
+    ``"U"`` (the displacements, one column per load case), ``"F"`` (the loads),
+    and ``"R"`` (the reactions, one row per prescribed degree of freedom,
+    starting with the degree of freedom ``m["nfreedof"]``).
+
+    :func:`pystran.model.number_dofs` must be called before this function.
+
+    Parameters
+    ----------
+    m
+        The model.
+
+    Returns
+    -------
+    None
+    """
+    if not ("nfreedof" in m) or m["nfreedof"] <= 0:
+        raise RuntimeError("No free degrees of freedom: nothing to compute")
+    nf = m["nfreedof"]
+    names, F = load_case_vectors(m)
+    names, D = settlement_vectors(m)
+    K = model.build_stiffness_matrix(m, sparse=True).tocsr()
+    U = zeros(F.shape)
+    U[nf:] = D
+    if names:
+        U[0:nf] = splu(K[0:nf, 0:nf].tocsc()).solve(F[0:nf] - K[0:nf, nf:] @ D)
+    R = K[nf:, 0:nf] @ U[0:nf] + K[nf:, nf:] @ D - F[nf:]
+    m["load_case_results"] = dict(names=names, U=U, F=F, R=R)
+    return None
+
+
+def _results(m):
+    if "load_case_results" not in m:
+        raise RuntimeError("No results: the load cases need to be solved")
+    results = m["load_case_results"]
+    if results["names"] != list(m.get("load_cases", {}).keys()):
+        raise RuntimeError("The load cases changed: they need to be solved again")
+    return results
+
+
+def combination_matrix(m):
+    """
+    Form the matrix of the combination factors.
+
+    Parameters
+    ----------
+    m
+        The model.
+
+    Returns
+    -------
+    tuple of names, C
+        The names of the combinations, and the matrix of the factors, one row
+        per load case (in the order of ``m["load_cases"]``), one column per
+        combination.
+    """
+    cases = list(m.get("load_cases", {}).keys())
+    index = {name: k for k, name in enumerate(cases)}
+    combinations = m.get("load_combinations", {})
+    names = list(combinations.keys())
+    C = zeros((len(cases), len(names)))
+    for k, combination in enumerate(combinations.values()):
+        for case, factor in combination["factors"].items():
+            C[index[case], k] += factor
+    return names, C
+
+
+def apply_combination(m, name):
+    """
+    Set the displacements of the model to those of a load combination.
+
+    The displacements are stored as ``m["U"]`` and at the joints, so that all
+    the functions that post-process the solution (resultants, plots) may be
+    used for the combination. The factors of the combination are stored as
+    ``m["load_factors"]``, so that the resultants include the contributions of
+    the member loads of the load cases (refer to
+    :func:`pystran.memberloads.solution_cases`).
+
+    Parameters
+    ----------
+    m
+        The model.
+    name
+        The name of the combination.
+
+    Returns
+    -------
+    None
+    """
+    results = _results(m)
+    names, C = combination_matrix(m)
+    if name not in names:
+        raise RuntimeError(f"Load combination {name} does not exist")
+    U = results["U"] @ C[:, names.index(name)]
+    m["U"] = U
+    m["load_factors"] = dict(m["load_combinations"][name]["factors"])
+    for joint in m["joints"].values():
+        joint["displacements"] = U[joint["dof"]]
+    memberloads.set_fixed_end_state(m)
+    return None
+
+
+def _envelope(values, C, chunk):
+    # The extremes over the combinations of the values of the load cases
+    # (last dimension of values), and the indexes of the governing
+    # combinations, evaluated in chunks of combinations.
+    shape = values.shape[:-1]
+    vmax, vmin = full(shape, -inf), full(shape, inf)
+    cmax, cmin = zeros(shape, dtype=int64), zeros(shape, dtype=int64)
+    for start in range(0, C.shape[1], chunk):
+        stop = min(start + chunk, C.shape[1])
+        V = tensordot(values, C[:, start:stop], axes=1)
+        k = V.argmax(axis=-1)
+        v = V.max(axis=-1)
+        better = v > vmax
+        vmax, cmax = where(better, v, vmax), where(better, k + start, cmax)
+        k = V.argmin(axis=-1)
+        v = V.min(axis=-1)
+        better = v < vmin
+        vmin, cmin = where(better, v, vmin), where(better, k + start, cmin)
+    return dict(max=vmax, min=vmin, max_combination=cmax, min_combination=cmin)
+
+
+def envelope(m, quantity="displacements", xi=(-1.0, 0.0, 1.0), chunk=64):
+    """
+    Compute the envelope of a quantity over all the load combinations.
+
+    The quantity is evaluated once for each load case, and the values for
+    the combinations are formed as matrix products with the combination
+    factors, ``chunk`` combinations at a time.
+
+    :func:`solve_load_cases` must be called before this function.
+
+    Parameters
+    ----------
+    m
+        The model.
+    quantity
+        Optional: ``"displacements"`` (default; all the degrees of freedom),
+        ``"reactions"`` (the prescribed degrees of freedom, refer to
+        :func:`solve_load_cases`), ``"end_forces"`` (refer to
+        :func:`pystran.resultants.end_forces`), or ``"internal_forces"``
+        (internal forces of the beams at the locations ``xi``, refer to
+        :func:`pystran.resultants.internal_forces`).
+    xi
+        Optional: the parametric coordinates of the locations along the beam
+        members for the internal forces. Default is the ends and the middle.
+    chunk
+        Optional: the number of the combinations evaluated at a time. Default
+        is 64.
+
+    Returns
+    -------
+    dict
+        The key ``"combinations"`` holds the names of the combinations. For the
+        displacements and reactions, the keys ``"max"`` and ``"min"`` are the
+        arrays of the extreme values, and ``"max_combination"`` and
+        ``"min_combination"`` the arrays of the indexes (into the list of the
+        names) of the governing combinations. For the end forces, there is
+        such an envelope dictionary (with the additional keys ``"mids"`` and
+        ``"keys"``) for each kind of member, and for the internal forces one
+        for each internal force (for instance ``"My"``); the arrays have then
+        one row per member.
+
+    Examples
+    --------
+    >>> env = loadcases.envelope(m, "internal_forces")
+    >>> k = env["mids"].index(mid)
+    >>> print(env["My"]["max"][k], env["combinations"][env["My"]["max_combination"][k, 1]])
+    """
+    results = _results(m)
+    names, C = combination_matrix(m)
+    U = results["U"]
+    if quantity == "displacements":
+        result = _envelope(U, C, chunk)
+    elif quantity == "reactions":
+        result = _envelope(results["R"], C, chunk)
+    elif quantity == "end_forces":
+        result = {}
+        for kind, forces in resultants.end_forces(m, U, cases=results["names"]).items():
+            result[kind] = _envelope(forces["forces"], C, chunk)
+            result[kind].update(mids=forces["mids"], keys=forces["keys"])
+    elif quantity == "internal_forces":
+        forces = resultants.internal_forces(m, xi, U, cases=results["names"])
+        result = dict(mids=forces.pop("mids"), xi=forces.pop("xi"))
+        for q, values in forces.items():
+            result[q] = _envelope(values, C, chunk)
+    else:
+        raise RuntimeError(f"Unknown quantity {quantity}")
+    result["combinations"] = names
+    return result
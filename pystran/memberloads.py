@@ -0,0 +1,769 @@
+r"""
+Define loads applied along the members.
+
+The member loads are distributed loads (uniform or linearly varying),
+concentrated loads on the span, thermal loads (uniform change of temperature
+and temperature gradients across the section, using the coefficient of
+thermal expansion ``CTE`` of the section), and the self weight (using the mass
+density ``rho`` and the area ``A`` of the section). The loads enter the
+solution as equivalent joint loads, which are computed by the principle of
+virtual work with the same basis functions as the stiffness of the members.
+
+The equivalent joint loads of a member, expressed in the local basis of the
+member, are also its fixed-end forces: the forces by which the member acts on
+its joints when the joints do not move, with the same sign conventions as the
+end forces (refer to :func:`pystran.beam.beam_2d_end_forces`). The end forces
+of a loaded member are the end forces computed from the displacements plus the
+fixed-end forces, and the internal forces along the member follow from the end
+forces and the loads by statics. The functions in
+:mod:`pystran.resultants` add these contributions automatically.
+
+The loads are stored as records, one for each call of the functions that add
+loads, holding arrays with one entry per loaded member. The fixed-end forces
+of all the members listed in a record are computed with array operations, so
+that loading every member of a large model costs one call. The records are
+stored in the model under the key ``"member_loads"``, or in a load case
+(refer to :mod:`pystran.loadcases`).
+
+The directions of the loads are given in the local basis of the member:
+``"x"`` is along the member (from the first joint to the second), ``"y"``
+(3d only) and ``"z"`` are the directions of the local basis vectors
+:math:`e_y` and :math:`e_z` (refer to
+:func:`pystran.geometry.member_2d_geometry` and
+:func:`pystran.geometry.member_3d_geometry`).
+"""
+
+from numpy import array, zeros, asarray, broadcast_to, maximum, einsum, hstack
+from numpy import add, float64, int64
+from pystran import gauss
+from pystran import geometry
+from pystran import beam
+from pystran import model
+from pystran import resultants
+
+
+def _ids(mids):
+    # A single identifier, or a list (or array) of identifiers.
+    if isinstance(mids, (list, tuple)) or hasattr(mids, "tolist"):
+        return model.id_list(mids)
+    return [mids]
+
+
+def _values(value, n, what):
+    v = asarray(value, dtype=float64)
+    if v.ndim > 1 or (v.ndim == 1 and len(v) != n):
+        raise ValueError(f"{what} must be a number or an array with one entry per member")
+    return broadcast_to(v, (n,)).copy()
+
+
+def _stored(m, case):
+    # The records of the member loads of the model (case None) or of a load
+    # case, without creating the lists.
+    if case is None:
+        return m.get("member_loads", [])
+    if "load_cases" not in m or case not in m["load_cases"]:
+        raise RuntimeError(f"Load case {case} does not exist")
+    return m["load_cases"][case].get("member_loads", [])
+
+
+def _records(m, case):
+    if case is None:
+        if "member_loads" not in m:
+            m["member_loads"] = []
+        return m["member_loads"]
+    if "load_cases" not in m or case not in m["load_cases"]:
+        raise RuntimeError(f"Load case {case} does not exist")
+    cases = m["load_cases"][case]
+    if "member_loads" not in cases:
+        cases["member_loads"] = []
+    return cases["member_loads"]
+
+
+def _check_members(m, kind, mids):
+    members = m.get(kind, {})
+    for mid in mids:
+        if mid not in members:
+            raise RuntimeError(f"Member {mid} does not exist")
+
+
+def _check_direction(m, direction):
+    directions = ("x", "z") if m["dim"] == 2 else ("x", "y", "z")
+    if direction not in directions:
+        raise ValueError(f"Direction must be one of {directions}")
+
+
+def add_distributed_load(m, mids, direction, qi, qj=None, case=None):
+    """
+    Add a distributed load to beam members.
+
+    The load varies linearly along the member, from the intensity ``qi`` at
+    the first joint to ``qj`` at the second joint (the load is uniform if
+    ``qj`` is not given).
+
+    Parameters
+    ----------
+    m
+        The model.
+    mids
+        The identifier of the member, or a list (or an array) of the
+        identifiers of the members.
+    direction
+        The direction of the load in the local basis of the member: ``"x"``
+        (along the member), ``"y"`` (3d only), or ``"z"``.
+    qi
+        The intensity of the load (force per unit length) at the first joint,
+        either a number, or an array with one entry per member.
+    qj
+        Optional: the intensity of the load at the second joint. Default is
+        ``qi``.
+    case
+        Optional: the name of the load case to which the load belongs. By
+        default the load is applied in :func:`pystran.model.solve_statics`.
+
+    Returns
+    -------
+    None
+
+    Examples
+    --------
+    >>> memberloads.add_distributed_load(m, list(m["beam_members"].keys()), "z", q)
+    """
+    mids = _ids(mids)
+    _check_members(m, "beam_members", mids)
+    _check_direction(m, direction)
+    qi = _values(qi, len(mids), "qi")
+    qj = qi.copy() if qj is None else _values(qj, len(mids), "qj")
+    _records(m, case).append(
+        dict(type="distributed", kind="beam_members", mids=mids, direction=direction, qi=qi, qj=qj)
+    )
+    return None
+
+
+def add_point_load(m, mids, direction, P, xi=0.0, case=None):
+    r"""
+    Add a concentrated load on the span of beam members.
+
+    Parameters
+    ----------
+    m
+        The model.
+    mids
+        The identifier of the member, or a list (or an array) of the
+        identifiers of the members.
+    direction
+        The direction of the load in the local basis of the member: ``"x"``
+        (along the member), ``"y"`` (3d only), or ``"z"``.
+    P
+        The magnitude of the load, either a number, or an array with one entry
+        per member.
+    xi
+        Optional: the parametric coordinate of the location of the load
+        (:math:`-1\le\xi\le+1`), either a number, or an array with one entry
+        per member. Default is the middle of the member.
+    case
+        Optional: the name of the load case to which the load belongs.
+
+    Returns
+    -------
+    None
+    """
+    mids = _ids(mids)
+    _check_members(m, "beam_members", mids)
+    _check_direction(m, direction)
+    P = _values(P, len(mids), "P")
+    xi = _values(xi, len(mids), "xi")
+    if (abs(xi) > 1.0).any():
+        raise ValueError("The location of the load must be within the member")
+    _records(m, case).append(
+        dict(type="point", kind="beam_members", mids=mids, direction=direction, P=P, xi=xi)
+    )
+    return None
+
+
+def add_thermal_load(m, mids, dT=0.0, dTdz=0.0, dTdy=0.0, kind="beam_members", case=None):
+    r"""
+    Add a thermal load to members.
+
+    The change of the temperature is :math:`\Delta T + y\, dT/dy + z\, dT/dz`,
+    where :math:`y` and :math:`z` are the local coordinates in the cross
+    section. The uniform change :math:`\Delta T` makes the member expand, and
+    the gradients make it bend. The thermal strains are computed with the
+    coefficient of thermal expansion ``CTE`` of the section.
+
+    Parameters
+    ----------
+    m
+        The model.
+    mids
+        The identifier of the member, or a list (or an array) of the
+        identifiers of the members.
+    dT
+        Optional: the uniform change of the temperature.
+    dTdz
+        Optional: the gradient of the temperature along the local :math:`z`
+        axis (for instance, the difference of the temperatures of the top
+        and bottom surfaces divided by the depth of the section).
+    dTdy
+        Optional: the gradient of the temperature along the local :math:`y`
+        axis (3d only).
+    kind
+        Optional: ``"beam_members"`` (default) or ``"truss_members"`` (only
+        the uniform change of the temperature).
+    case
+        Optional: the name of the load case to which the load belongs.
+
+    Returns
+    -------
+    None
+
+    All the parameters except ``m``, ``kind``, and ``case`` may be either
+    numbers, or arrays with one entry per member.
+    """
+    if kind not in ("beam_members", "truss_members"):
+        raise RuntimeError(f"Thermal loads cannot be applied to {kind}")
+    mids = _ids(mids)
+    _check_members(m, kind, mids)
+    n = len(mids)
+    record = dict(type="thermal", kind=kind, mids=mids, dT=_values(dT, n, "dT"))
+    record["dTdz"] = _values(dTdz, n, "dTdz")
+    record["dTdy"] = _values(dTdy, n, "dTdy")
+    if kind == "truss_members" and (record["dTdz"].any() or record["dTdy"].any()):
+        raise ValueError("Temperature gradients cannot be applied to trusses")
+    if m["dim"] == 2 and record["dTdy"].any():
+        raise ValueError("Gradient dTdy is only defined in 3d")
+    _records(m, case).append(record)
+    return None
+
+
+def add_gravity_load(
+    m, g_vector, kinds=("truss_members", "beam_members"), lumping=None, case=None
+):
+    r"""
+    Add the self weight of all the truss and beam members.
+
+    The weight of a member per unit length is :math:`\rho A g`, where
+    :math:`g` is the vector of the acceleration of gravity. The weight is
+    distributed to the joints either consistently, as the product of the
+    consistent mass matrix of the member with the acceleration (for the beams
+    this is the uniform distributed load, so that the end moments and the
+    internal forces along the member include the weight), or it is lumped,
+    half of the weight of the member to each joint (the load then acts
+    directly on the joints). Both distributions are the same for the trusses.
+
+    The members are those present in the model when this function is called.
+    The concentrated masses at the joints are not included.
+
+    Parameters
+    ----------
+    m
+        The model.
+    g_vector
+        The vector of the acceleration of gravity, for instance ``[0.0,
+        -9.81]`` in 2d.
+    kinds
+        Optional: the kinds of the members (by default both
+        ``"truss_members"`` and ``"beam_members"``).
+    lumping
+        Optional: ``None`` (default) for the consistent distribution,
+        ``"HRZ"`` or ``"row-sum"`` for the lumped distribution (the lumping
+        schemes of the mass matrices differ only in the rotational inertia,
+        and give the same weights).
+    case
+        Optional: the name of the load case to which the load belongs.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    :func:`pystran.loadcases.add_gravity`
+    """
+    g = asarray(g_vector, dtype=float64)
+    if g.shape != (m["dim"],):
+        raise ValueError("The vector of gravity must have one entry per coordinate")
+    if lumping not in (None, "HRZ", "row-sum"):
+        raise ValueError(f"Unknown lumping {lumping}")
+    for kind in kinds:
+        if kind not in ("beam_members", "truss_members"):
+            raise RuntimeError(f"Gravity loads cannot be applied to {kind}")
+        if m.get(kind):
+            mids = list(m[kind].keys())
+            _records(m, case).append(
+                dict(type="gravity", kind=kind, mids=mids, g=g.copy(), lumped=lumping is not None)
+            )
+    return None
+
+
+def _weight(m, table, rows, record):
+    # The weight per unit length of the members of a record.
+    sects = [m[record["kind"]][mid]["section"] for mid in record["mids"]]
+    return array([s["rho"] for s in sects], dtype=float64) * table["A"][rows]
+
+
+def _primitives(m, table, rows, record):
+    # The records that load the members along the span: the consistent self
+    # weight of the beams is a uniform load along each local direction, the
+    # lumped self weight (and the weight of the trusses) acts on the joints.
+    if record["type"] != "gravity":
+        return [record]
+    if record["kind"] == "truss_members" or record["lumped"]:
+        return []
+    w = _weight(m, table, rows, record)
+    directions = ("x", "z") if m["dim"] == 2 else ("x", "y", "z")
+    result = []
+    for d in directions:
+        q = w * (table["e_" + d][rows] @ record["g"])
+        result.append(
+            dict(type="distributed", kind="beam_members", mids=record["mids"], direction=d, qi=q, qj=q)
+        )
+    return result
+
+
+def _joint_forces(m, table, rows, record):
+    # The forces that act directly on the joints (global components, the
+    # columns of table["dofs"]), or None.
+    if record["type"] != "gravity" or not (record["kind"] == "truss_members" or record["lumped"]):
+        return None
+    dim = m["dim"]
+    n = table["dofs"].shape[1] // 2
+    f = (_weight(m, table, rows, record) * table["h"][rows] / 2)[:, None] * record["g"]
+    forces = zeros((len(rows), 2 * n))
+    forces[:, 0:dim] = f
+    forces[:, n : n + dim] = f
+    return forces
+
+
+def _plane(dim, direction):
+    # The bending plane of a transverse load: the local slots of the
+    # translation and of the rotation, and the Hermite functions.
+    if dim == 2:
+        return 1, 2, geometry.herm_basis, geometry.herm_basis_xi2
+    if direction == "z":
+        return 2, 4, beam.beam_3d_xz_shape_fun, beam.beam_3d_xz_shape_fun_xi2
+    return 1, 5, beam.beam_3d_xy_shape_fun, beam.beam_3d_xy_shape_fun_xi2
+
+
+def _add_work(F, n, t, r, h, d, q):
+    # Add the virtual work of the loads q at the integration points (one row
+    # per member, weights included) on the Hermite functions d (evaluated at
+    # the same points).
+    F[:, t] += (q * d[0]).sum(axis=1)
+    F[:, r] += h / 2 * (q * d[1]).sum(axis=1)
+    F[:, n + t] += (q * d[2]).sum(axis=1)
+    F[:, n + r] += h / 2 * (q * d[3]).sum(axis=1)
+
+
+def record_fixed_end_forces(m, table, rows, record):
+    """
+    Compute the fixed-end forces of the members of one load record.
+
+    Parameters
+    ----------
+    m
+        The model.
+    table
+        The member table of the kind of the loaded members (refer to
+        :func:`pystran.resultants.member_table`).
+    rows
+        The rows of the table of the members listed in the record, in the
+        same order.
+    record
+        The load record: a dictionary with the keys ``"type"``
+        (``"distributed"``, ``"point"``, or ``"thermal"``), ``"kind"``,
+        ``"mids"``, and the arrays of the load, one entry per member (as
+        stored by :func:`add_distributed_load`, :func:`add_point_load`, and
+        :func:`add_thermal_load`).
+
+    Returns
+    -------
+    array
+        Array of the fixed-end forces in the local basis, one row per member
+        of the record (in the order of
+        :func:`pystran.resultants.end_force_operators`; for trusses, the
+        axial forces on the two joints).
+    """
+    dim = m["dim"]
+    h = table["h"][rows]
+    if record["kind"] == "truss_members":
+        n = 1
+    else:
+        n = 3 * (dim - 1)
+    F = zeros((len(rows), 2 * n))
+    if record["type"] == "thermal":
+        sects = [m[record["kind"]][mid]["section"] for mid in record["mids"]]
+        CTE = array([s["CTE"] for s in sects], dtype=float64)
+        E = table["E"][rows]
+        N_T = E * table["A"][rows] * CTE * record["dT"]
+        F[:, 0] -= N_T
+        F[:, n] += N_T
+        if record["kind"] == "truss_members":
+            return F
+        xq, W = gauss.rule(2)
+        s = (2 / h) ** 2 * (h / 2)
+        if dim == 2:
+            planes = [("z", table["I"], record["dTdz"])]
+        else:
+            planes = [("z", table["Iy"], record["dTdz"]), ("y", table["Iz"], record["dTdy"])]
+        for direction, I, gradient in planes:
+            t, r, _, N2 = _plane(dim, direction)
+            # Free thermal curvature of the Bernoulli beam is -CTE * gradient
+            q = (-E * I[rows] * CTE * gradient * s)[:, None] * W
+            _add_work(F, n, t, r, h, N2(xq), q)
+        return F
+    direction = record["direction"]
+    if record["type"] == "distributed":
+        xq, W = gauss.rule(3)
+        L = geometry.lin_basis(xq)
+        q = (record["qi"][:, None] * L[0] + record["qj"][:, None] * L[1]) * W
+        q *= (h / 2)[:, None]
+        if direction == "x":
+            F[:, 0] += (q * L[0]).sum(axis=1)
+            F[:, n] += (q * L[1]).sum(axis=1)
+        else:
+            t, r, N, _ = _plane(dim, direction)
+            _add_work(F, n, t, r, h, N(xq), q)
+    elif record["type"] == "point":
+        P, xi = record["P"], record["xi"]
+        if direction == "x":
+            L = geometry.lin_basis(xi)
+            F[:, 0] += P * L[0]
+            F[:, n] += P * L[1]
+        else:
+            t, r, N, _ = _plane(dim, direction)
+            _add_work(F, n, t, r, h, N(xi)[:, :, None], P[:, None])
+    return F
+
+
+def _rows(index, record):
+    # The rows of the member table of the members of a record.
+    for mid in record["mids"]:
+        if mid not in index:
+            raise RuntimeError(f"Member {mid} does not exist")
+    return array([index[mid] for mid in record["mids"]], dtype=int64)
+
+
+def _local_forces(m, kind, case):
+    # The member table and the fixed-end forces (local components, one row per
+    # member of the table), or None if no member of this kind is loaded.
+    table = resultants.member_table(m, kind)
+    records = [r for r in _stored(m, case) if r["kind"] == kind]
+    if not records:
+        return table, None
+    index = {mid: k for k, mid in enumerate(table["mids"])}
+    F = None
+    for record in records:
+        rows = _rows(index, record)
+        for primitive in _primitives(m, table, rows, record):
+            f = record_fixed_end_forces(m, table, rows, primitive)
+            if F is None:
+                F = zeros((len(table["mids"]), f.shape[1]))
+            add.at(F, rows, f)
+    return table, F
+
+
+def fixed_end_forces(m, kind, case=None):
+    """
+    Compute the fixed-end forces of all the members of one kind.
+
+    The fixed-end forces have the same meaning and sign conventions as the
+    end forces (refer to :func:`pystran.resultants.end_forces`): they are the
+    end forces of the loaded members when their joints do not move.
+
+    Parameters
+    ----------
+    m
+        The model.
+    kind
+        ``"truss_members"`` or ``"beam_members"``.
+    case
+        Optional: the name of the load case. By default the member loads
+        stored in the model (not in a load case) are used.
+
+    Returns
+    -------
+    array
+        Array with one row per member (in the order of
+        :func:`pystran.resultants.member_table`), and one column per end
+        force (in the order of :func:`pystran.resultants.end_force_operators`).
+    """
+    table, F = _local_forces(m, kind, case)
+    if kind == "beam_members":
+        nk = len(resultants.BEAM_2D_END_FORCES if m["dim"] == 2 else resultants.BEAM_3D_END_FORCES)
+    else:
+        nk = len(resultants.TRUSS_END_FORCES)
+    if F is None:
+        return zeros((len(table["mids"]), nk))
+    if kind == "truss_members":
+        # The axial force is the force on the first joint along the member
+        return F[:, 0:1]
+    return F
+
+
+def equivalent_loads(m, case=None):
+    """
+    Assemble the equivalent joint loads of the member loads.
+
+    The local fixed-end forces are rotated into the global Cartesian
+    coordinates and added into a vector of the size of the degrees of freedom,
+    together with the loads that act directly on the joints (the lumped self
+    weight).
+    :func:`pystran.model.number_dofs` must be called before this function.
+
+    Parameters
+    ----------
+    m
+        The model.
+    case
+        Optional: the name of the load case. By default the member loads
+        stored in the model (not in a load case) are used.
+
+    Returns
+    -------
+    array
+        Vector of the loads, one entry per degree of freedom.
+    """
+    F = zeros(m["ntotaldof"])
+    for kind in ("truss_members", "beam_members"):
+        table, f = _local_forces(m, kind, case)
+        index = {mid: k for k, mid in enumerate(table["mids"])}
+        for record in _stored(m, case):
+            if record["kind"] == kind:
+                rows = _rows(index, record)
+                forces = _joint_forces(m, table, rows, record)
+                if forces is not None:
+                    add.at(F, table["dofs"][rows], forces)
+        if f is not None:
+            add.at(F, table["dofs"], local_to_global(m, kind, table, f))
+    return F
+
+
+def local_to_global(m, kind, table, f, rows=slice(None)):
+    """
+    Rotate the fixed-end forces of members into the global basis.
+
+    Parameters
+    ----------
+    m
+        The model.
+    kind
+        ``"truss_members"`` or ``"beam_members"``.
+    table
+        The member table (refer to :func:`pystran.resultants.member_table`).
+    f
+        Array of the fixed-end forces in the local basis, one row per member
+        (refer to :func:`record_fixed_end_forces`).
+    rows
+        Optional: the rows of the table of the members of ``f``. Default is
+        all the members of the table.
+
+    Returns
+    -------
+    array
+        Array of the forces in the global basis, one row per member, with
+        the columns matching those of ``table["dofs"]``.
+    """
+    if kind == "truss_members":
+        e_x = table["e_x"][rows]
+        return hstack([f[:, 0:1] * e_x, f[:, 1:2] * e_x])
+    if m["dim"] == 2:
+        basis = array([table["e_x"][rows], table["e_z"][rows]]).transpose(1, 0, 2)
+        g = []
+        for o in (0, 3):
+            g.append(einsum("ek,ekd->ed", f[:, [o, o + 1]], basis))
+            g.append(f[:, o + 2 : o + 3])
+        return hstack(g)
+    basis = array([table["e_x"][rows], table["e_y"][rows], table["e_z"][rows]])
+    basis = basis.transpose(1, 0, 2)
+    return hstack([einsum("ek,ekd->ed", f[:, o : o + 3], basis) for o in (0, 3, 6, 9)])
+
+
+def span_forces(m, xi, case=None):
+    r"""
+    Compute the internal forces of the fixed-end state of all the beams.
+
+    These are the internal forces along the members when their joints do not
+    move. They are obtained by statics from the fixed-end forces at the first
+    joint and the loads on the span. The internal forces of a loaded member are
+    the internal forces computed from the displacements of the joints plus
+    these internal forces.
+
+    Parameters
+    ----------
+    m
+        The model.
+    xi
+        The parametric coordinates of the locations (:math:`-1\le\xi\le+1`),
+        a number or an array.
+    case
+        Optional: the name of the load case. By default the member loads
+        stored in the model (not in a load case) are used.
+
+    Returns
+    -------
+    dict
+        Dictionary of the internal forces (refer to
+        :func:`pystran.resultants.internal_forces`), each an array with one row
+        per beam member and one column per location.
+    """
+    dim = m["dim"]
+    xi = array(xi, dtype=float64).reshape(-1)
+    quantities = ["N", "Qz", "My"] if dim == 2 else ["N", "Qy", "Qz", "T", "My", "Mz"]
+    table = resultants.member_table(m, "beam_members")
+    ne = len(table["mids"])
+    result = {q: zeros((ne, len(xi))) for q in quantities}
+    index = {mid: k for k, mid in enumerate(table["mids"])}
+    for record in _stored(m, case):
+        if record["kind"] != "beam_members":
+            continue
+        rows = _rows(index, record)
+        for primitive in _primitives(m, table, rows, record):
+            values = record_span_forces(m, table, rows, primitive, xi)
+            for q in quantities:
+                add.at(result[q], rows, values[q])
+    return result
+
+
+def record_span_forces(m, table, rows, record, xi):
+    r"""
+    Compute the internal forces of the fixed-end state of one load record.
+
+    The internal forces are obtained by statics from the fixed-end forces at
+    the first joint (refer to :func:`record_fixed_end_forces`) and the load on
+    the span.
+
+    Parameters
+    ----------
+    m
+        The model.
+    table
+        The member table of the beams (refer to
+        :func:`pystran.resultants.member_table`).
+    rows
+        The rows of the table of the members listed in the record, in the
+        same order.
+    record
+        The load record (refer to :func:`record_fixed_end_forces`).
+    xi
+        Array of the parametric coordinates of the locations
+        (:math:`-1\le\xi\le+1`).
+
+    Returns
+    -------
+    dict
+        Dictionary of the internal forces (refer to
+        :func:`pystran.resultants.internal_forces`), each an array with one
+        row per member of the record and one column per location.
+    """
+    dim = m["dim"]
+    F = record_fixed_end_forces(m, table, rows, record)
+    h = table["h"][rows][:, None]
+    x = h * (1 + xi) / 2
+    # The resultant of the load on [0, x], and its moment about x
+    P, Mq = zeros(x.shape), zeros(x.shape)
+    if record["type"] == "distributed":
+        qi, qj = record["qi"][:, None], record["qj"][:, None]
+        P = qi * x + (qj - qi) * x**2 / (2 * h)
+        Mq = qi * x**2 / 2 + (qj - qi) * x**3 / (6 * h)
+    elif record["type"] == "point":
+        a = h * (1 + record["xi"][:, None]) / 2
+        P = record["P"][:, None] * (x >= a)
+        Mq = record["P"][:, None] * maximum(x - a, 0.0)
+    direction = record.get("direction")
+    Px, Mx = (P, Mq) if direction == "x" else (0.0, 0.0)
+    Py, My = (P, Mq) if direction == "y" else (0.0, 0.0)
+    Pz, Mz = (P, Mq) if direction == "z" else (0.0, 0.0)
+    values = {}
+    values["N"] = F[:, 0:1] - Px
+    if dim == 2:
+        values["Qz"] = F[:, 1:2] - Pz
+        values["My"] = F[:, 2:3] + F[:, 1:2] * x - Mz
+    else:
+        values["Qy"] = F[:, 1:2] - Py
+        values["Qz"] = F[:, 2:3] - Pz
+        values["T"] = F[:, 3:4]
+        values["My"] = F[:, 4:5] + F[:, 2:3] * x - Mz
+        values["Mz"] = F[:, 5:6] - F[:, 1:2] * x + My
+    return {q: broadcast_to(v, x.shape) for q, v in values.items()}
+
+
+def solution_cases(m):
+    """
+    Find the member loads that go with the current solution.
+
+    The displacements ``m["U"]`` are either the solution of
+    :func:`pystran.model.solve_statics` (with the member loads stored in the
+    model), or those of a load combination set by
+    :func:`pystran.loadcases.apply_combination`.
+
+    Parameters
+    ----------
+    m
+        The model.
+
+    Returns
+    -------
+    dict
+        Dictionary that maps the load cases to their factors; the key ``None``
+        stands for the member loads stored in the model.
+    """
+    factors = m.get("load_factors", None)
+    if factors is None:
+        return {None: 1.0}
+    return dict(factors)
+
+
+def set_fixed_end_state(m):
+    """
+    Store the fixed-end state of the loaded members in the members.
+
+    The functions that compute the resultants of a single member from the
+    displacements stored at its joints (for instance
+    :func:`pystran.beam.beam_2d_moment` or
+    :func:`pystran.truss.truss_axial_force`) have no access to the member
+    loads of the model. For each member loaded by the member loads that go
+    with the current solution (refer to :func:`solution_cases`), the
+    fixed-end forces (local components, summed over the load cases with their
+    factors) and the loads on the span are therefore stored in the member
+    under the key ``"fixed_end"``; the key is removed from the members that
+    are not loaded. :func:`pystran.model.solve_statics` and
+    :func:`pystran.loadcases.apply_combination` call this function.
+
+    Parameters
+    ----------
+    m
+        The model.
+
+    Returns
+    -------
+    None
+    """
+    cases = solution_cases(m)
+    for kind in ("truss_members", "beam_members"):
+        for member in m.get(kind, {}).values():
+            member.pop("fixed_end", None)
+        loaded = [(c, r) for c in cases for r in _stored(m, c) if r["kind"] == kind]
+        if not loaded:
+            continue
+        table = resultants.member_table(m, kind)
+        index = {mid: k for k, mid in enumerate(table["mids"])}
+        for case, record in loaded:
+            factor = cases[case]
+            rows = _rows(index, record)
+            for primitive in _primitives(m, table, rows, record):
+                F = factor * record_fixed_end_forces(m, table, rows, primitive)
+                for k, mid in enumerate(primitive["mids"]):
+                    state = m[kind][mid].setdefault("fixed_end", dict(forces=zeros(F.shape[1]), loads=[]))
+                    state["forces"] += F[k]
+                    # The thermal loads have no loads on the span
+                    if primitive["type"] == "distributed":
+                        qi, qj = factor * primitive["qi"][k], factor * primitive["qj"][k]
+                        state["loads"].append(
+                            dict(type="distributed", direction=primitive["direction"], qi=qi, qj=qj)
+                        )
+                    elif primitive["type"] == "point":
+                        P, xi = factor * primitive["P"][k], primitive["xi"][k]
+                        state["loads"].append(
+                            dict(type="point", direction=primitive["direction"], P=P, xi=xi)
+                        )
+    return None
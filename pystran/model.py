@@ -3,11 +3,15 @@ Define the functions for defining and manipulating a model.
 """
 
 from math import sqrt, pi
-from numpy import array, zeros, dot, mean, concatenate, float64, int32, inf
+from numpy import array, zeros, dot, mean, concatenate, float64, int32, inf, nan, diag
+from numpy import empty, ones, full, arange, where, cumsum, minimum, int8, int64, ndarray
 import scipy
+import scipy.sparse
+import scipy.sparse.csgraph
 from scipy.linalg import solve, eigh
 from collections import namedtuple
-from pystran import truss, beam, spring, rigid
+from pystran import truss, beam, spring, rigid, assemble, eigen, geometry
+from pystran import memberloads
 from numbers import Integral
 
 def create(dim=2):
@@ -34,6 +38,20 @@ def create(dim=2):
         `m['freedoms'].U2`, `m['freedoms'].U3`) and three rotations (`m['freedoms'].UR1`, 
         `m['freedoms'].UR2`, `m['freedoms'].UR3`).
 
+        The key ``metadata`` holds facts about the model that are maintained
+        incrementally by the ``add_...`` functions, so that they do not need
+        to be derived by scanning the joints and members: the number of
+        members of each kind (``m['metadata']['counts']``, keyed by the
+        names in :data:`MEMBER_KINDS`), and the joint-to-member adjacency
+        (``m['metadata']['adjacency']``, which maps a joint identifier to a
+        list of ``(kind, mid)`` pairs), and the number of the supported
+        rotations (``m['metadata']['rotation_supports']``, refer to
+        :func:`add_support`). It also caches the geometry of the members
+        (``m['metadata']['geometry']``, which is discarded when the joints or
+        the members change, refer to :func:`member_geometry_table`). The
+        metadata are part of the model dictionary, and hence they appear when
+        the model is printed.
+
     See Also
     --------
     :func:`add_joint`
@@ -67,9 +85,103 @@ def create(dim=2):
                                  TRANSLATION_DOFS=(0, 1, 2),
                                  ROTATION_DOFS=(3, 4, 5), 
                                  ALL_DOFS=(0, 1, 2, 3, 4, 5))
+    m["metadata"] = _empty_metadata()
     return m
 
 
+MEMBER_KINDS = (
+    "truss_members",
+    "beam_members",
+    "rigid_link_members",
+    "spring_members",
+    "superelements",
+)
+"""
+Keys under which the members of the various kinds are stored in the model.
+"""
+
+
+class _Joint(dict):
+    # A joint is a dictionary that also refers to the metadata of its model,
+    # so that add_support, which receives only the joint, can keep the
+    # metadata up to date. The reference is an attribute, not a key: it does
+    # not appear when the joint (or the model) is printed.
+    def __init__(self, meta, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.meta = meta
+
+
+def _rotation_supports(j):
+    # The number of rotations supported at a joint
+    dim = len(j["coordinates"])
+    return sum(1 for d in j.get("supports", {}).keys() if d >= dim)
+
+
+def _empty_metadata():
+    return {
+        "counts": {kind: 0 for kind in MEMBER_KINDS},
+        "adjacency": {},
+        "rotation_supports": 0,
+        "spatial_index": None,
+        "geometry": None,
+    }
+
+
+def metadata(m):
+    """
+    Retrieve the metadata of the model.
+
+    The metadata are described in the documentation of :func:`create`. Models
+    that were not created with the current version of :func:`create` (for
+    instance, loaded from a pickle) get their metadata rebuilt by a scan of
+    the joints and the members; their joints are replaced by copies that
+    refer to the metadata (refer to :func:`add_support`).
+
+    Parameters
+    ----------
+    m
+        The model.
+
+    Returns
+    -------
+    dict
+        The dictionary ``m['metadata']``.
+    """
+    if "metadata" not in m:
+        meta = _empty_metadata()
+        m["metadata"] = meta
+        joints = m.get("joints", {})
+        for jid, j in joints.items():
+            joints[jid] = _Joint(meta, j)
+            meta["adjacency"][jid] = []
+            meta["rotation_supports"] += _rotation_supports(j)
+        for kind in MEMBER_KINDS:
+            for mid, member in m.get(kind, {}).items():
+                _register_member(m, kind, mid, member["connectivity"])
+    return m["metadata"]
+
+
+def _register_member(m, kind, mid, connectivity):
+    meta = metadata(m)
+    meta["counts"][kind] += 1
+    meta["geometry"] = None
+    adjacency = meta["adjacency"]
+    for jid in connectivity:
+        if jid not in adjacency:
+            adjacency[jid] = []
+        adjacency[jid].append((kind, mid))
+
+
+def _unregister_member(m, kind, mid, connectivity):
+    meta = metadata(m)
+    meta["counts"][kind] -= 1
+    meta["geometry"] = None
+    adjacency = meta["adjacency"]
+    for jid in connectivity:
+        if jid in adjacency and (kind, mid) in adjacency[jid]:
+            adjacency[jid].remove((kind, mid))
+
+
 def add_joint(m, jid, coordinates, dof=None):
     """
     Add a joint to the model.
@@ -99,7 +211,12 @@ def add_joint(m, jid, coordinates, dof=None):
     coordinates = array(coordinates, dtype=float64)
     if coordinates.shape != (m["dim"],):
         raise RuntimeError("Coordinate dimension mismatch")
-    m["joints"][jid] = {"jid": jid, "coordinates": coordinates}
+    meta = metadata(m)
+    m["joints"][jid] = _Joint(meta, jid=jid, coordinates=coordinates)
+    if jid not in meta["adjacency"]:
+        meta["adjacency"][jid] = []
+    meta["spatial_index"] = None
+    meta["geometry"] = None
     if dof is not None:
         m["joints"][jid]["dof"] = array(dof, dtype=int32)
     return None
@@ -129,6 +246,7 @@ def add_truss_member(m, mid, connectivity, sect):
         m["truss_members"] = {}
     if mid in m["truss_members"]:
         raise RuntimeError("Truss member already exists")
+    _register_member(m, "truss_members", mid, connectivity)
     m["truss_members"][mid] = {
         "mid": mid,
         "connectivity": connectivity,
@@ -166,6 +284,7 @@ def add_beam_member(m, mid, connectivity, sect):
         m["beam_members"] = {}
     if mid in m["beam_members"]:
         raise RuntimeError("Beam member already exists")
+    _register_member(m, "beam_members", mid, connectivity)
     m["beam_members"][mid] = {
         "mid": mid,
         "connectivity": connectivity,
@@ -205,6 +324,7 @@ def add_rigid_link_member(m, mid, connectivity, sect):
         m["rigid_link_members"] = {}
     if mid in m["rigid_link_members"]:
         raise RuntimeError("Rigid link member already exists")
+    _register_member(m, "rigid_link_members", mid, connectivity)
     m["rigid_link_members"][mid] = {
         "mid": mid,
         "connectivity": connectivity,
@@ -245,6 +365,7 @@ def add_spring_member(m, mid, connectivity, sect):
         dof = m["freedoms"].TRANSLATION_DOFS
     else:  # torsion
         dof = m["freedoms"].ROTATION_DOFS
+    _register_member(m, "spring_members", mid, connectivity)
     m["spring_members"][mid] = {
         "mid": mid,
         "connectivity": connectivity,
@@ -253,6 +374,86 @@ def add_spring_member(m, mid, connectivity, sect):
     }
     return None
 
+
+def add_superelement(m, sid, connectivity, se):
+    """
+    Add a superelement to the model.
+
+    The superelement (refer to :func:`pystran.superelement.craig_bampton`)
+    connects to the joints of the model like a member: the boundary joints of
+    the superelement are identified with the joints listed in
+    ``connectivity``, in the same order. The superelement is not moved or
+    rotated, hence the joints should be at the locations of the boundary
+    joints of the sub-model from which the superelement was reduced.
+
+    In addition to the degrees of freedom at the joints, the superelement
+    brings its own (modal) degrees of freedom, which are numbered by
+    :func:`number_dofs` after the free degrees of freedom of the joints.
+    They can be retrieved as ``m["superelements"][sid]["dof"]``.
+
+    Parameters
+    ----------
+    m
+        Model.
+    sid
+        The superelement identifier, which must be unique, but can be anything
+        that is a legal dictionary key (integer, string, ...),
+    connectivity
+        The list (or a tuple) of the joint identifiers.
+    se
+        The superelement.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    :func:`pystran.superelement.craig_bampton`
+    """
+    if "superelements" not in m:
+        m["superelements"] = {}
+    if sid in m["superelements"]:
+        raise RuntimeError("Superelement already exists")
+    if se["dim"] != m["dim"]:
+        raise RuntimeError("Superelement must have the same dimension as the model")
+    if len(connectivity) != len(se["joints"]):
+        raise RuntimeError(f"Superelement needs {len(se['joints'])} joints")
+    _register_member(m, "superelements", sid, connectivity)
+    m["superelements"][sid] = {
+        "sid": sid,
+        "connectivity": connectivity,
+        "superelement": se,
+    }
+    return None
+
+
+def superelement_dofs(m, s):
+    """
+    Collect the degrees of freedom of a superelement in the model.
+
+    :func:`number_dofs` must be called before this function.
+
+    Parameters
+    ----------
+    m
+        The model.
+    s
+        Dictionary that defines the data of the superelement (refer to
+        :func:`add_superelement`).
+
+    Returns
+    -------
+    array
+        The boundary degrees of freedom at the joints, followed by the modal
+        degrees of freedom.
+    """
+    se = s["superelement"]
+    joints = [m["joints"][jid] for jid in s["connectivity"]]
+    boundary = [joints[k]["dof"][d] for k, d in se["boundary"]]
+    return concatenate([array(boundary, dtype=int64), s["dof"]])
+
+
 def _dof_is_int(dof):
     return isinstance(dof, Integral)
 
@@ -260,6 +461,9 @@ def add_support(j, dof, value=0.0):
     """
     Add a support to a joint.
 
+    The supported rotations are counted in the metadata of the model (refer
+    to :func:`ndof_per_joint`).
+
     Parameters
     ----------
     j
@@ -276,11 +480,13 @@ def add_support(j, dof, value=0.0):
     if "supports" not in j:
         j["supports"] = {}
     dim = len(j["coordinates"])
-    if not _dof_is_int(dof):
-        for d in dof:
-            j["supports"][d] = value
-    else:
-        j["supports"][dof] = value
+    dofs = [dof] if _dof_is_int(dof) else dof
+    meta = getattr(j, "meta", None)
+    for d in dofs:
+        if meta is not None and d >= dim and d not in j["supports"]:
+            # Count the supported rotations (refer to ndof_per_joint)
+            meta["rotation_supports"] += 1
+        j["supports"][d] = value
     return None
 
 
@@ -332,6 +538,196 @@ def add_mass(j, dof, value):
     return None
 
 
+def id_list(ids):
+    """
+    Convert identifiers to a list of plain Python objects.
+
+    The identifiers of joints and members given as arrays are converted, so
+    that numpy integers become Python integers (and hash and compare as the
+    identifiers stored in the model).
+
+    Parameters
+    ----------
+    ids
+        The identifiers (list, tuple, or array).
+
+    Returns
+    -------
+    list
+        The list of the identifiers.
+    """
+    if hasattr(ids, "tolist"):
+        return ids.tolist()
+    return list(ids)
+
+
+def _check_new_ids(ids, existing, what):
+    if len(set(ids)) != len(ids):
+        raise RuntimeError(f"{what} identifiers must be unique")
+    if not existing.keys().isdisjoint(ids):
+        raise RuntimeError(f"{what} already exists")
+
+
+def add_joints(m, jids, coordinates):
+    """
+    Add many joints to the model at once.
+
+    This is equivalent to calling :func:`add_joint` for each joint, but the
+    input is validated for all joints at once, and the coordinates of the
+    joints are stored as rows (views) of a single array.
+
+    Parameters
+    ----------
+    m
+        Model.
+    jids
+        The joint identifiers (list or array), which must be unique.
+    coordinates
+        Array of the coordinates, one row per joint.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    :func:`add_joint`
+    """
+    if "joints" not in m:
+        m["joints"] = {}
+    jids = id_list(jids)
+    X = array(coordinates, dtype=float64)
+    if X.shape != (len(jids), m["dim"]):
+        raise RuntimeError("Coordinate dimension mismatch")
+    _check_new_ids(jids, m["joints"], "Joint")
+    joints = m["joints"]
+    meta = metadata(m)
+    for jid, c in zip(jids, X):
+        joints[jid] = _Joint(meta, jid=jid, coordinates=c)
+    adjacency = meta["adjacency"]
+    for jid in jids:
+        if jid not in adjacency:
+            adjacency[jid] = []
+    meta["spatial_index"] = None
+    meta["geometry"] = None
+    return None
+
+
+def _add_members(m, kind, what, mids, connectivity, sections, section_index):
+    if kind not in m:
+        m[kind] = {}
+    mids = id_list(mids)
+    n = len(mids)
+    if isinstance(connectivity, ndarray):
+        conn = connectivity
+    else:
+        conn = array(connectivity, dtype=object)
+    if conn.shape != (n, 2):
+        raise RuntimeError("Connectivity must have one row of two joints per member")
+    _check_new_ids(mids, m[kind], what)
+    if (conn[:, 0] == conn[:, 1]).any():
+        raise RuntimeError("Member must connect two different joints")
+    conn = conn.tolist()
+    if "joints" not in m or not m["joints"].keys() >= set(c for row in conn for c in row):
+        raise RuntimeError("Joint does not exist")
+    if isinstance(sections, dict):
+        sections = [sections]
+        section_index = zeros(n, dtype=int64)
+    elif section_index is None:
+        if len(sections) != n:
+            raise RuntimeError("Supply one section per member, or the section indexes")
+        section_index = arange(n)
+    section_index = array(section_index, dtype=int64)
+    if section_index.shape != (n,):
+        raise RuntimeError("Supply one section index per member")
+    if n > 0 and (section_index.min() < 0 or section_index.max() >= len(sections)):
+        raise RuntimeError("Section index out of range")
+    members = m[kind]
+    meta = metadata(m)
+    adjacency = meta["adjacency"]
+    for mid, c, k in zip(mids, conn, section_index.tolist()):
+        members[mid] = {"mid": mid, "connectivity": c, "section": sections[k]}
+        adjacency[c[0]].append((kind, mid))
+        adjacency[c[1]].append((kind, mid))
+    meta["counts"][kind] += n
+    meta["geometry"] = None
+    return None
+
+
+def add_truss_members(m, mids, connectivity, sections, section_index=None):
+    """
+    Add many truss members to the model at once.
+
+    This is equivalent to calling :func:`add_truss_member` for each member,
+    but the input is validated for all members at once.
+
+    Parameters
+    ----------
+    m
+        Model.
+    mids
+        The member identifiers (list or array), which must be unique.
+    connectivity
+        Array of the joint identifiers, one row of two joints per member.
+        The joints must exist.
+    sections
+        Either a single section (used for all the members), or a list of
+        sections.
+    section_index
+        Optional: array of indexes into the list ``sections``, one per member.
+        If it is not supplied, and ``sections`` is a list, it must hold one
+        section per member.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    :func:`add_truss_member`
+    """
+    return _add_members(
+        m, "truss_members", "Truss member", mids, connectivity, sections, section_index
+    )
+
+
+def add_beam_members(m, mids, connectivity, sections, section_index=None):
+    """
+    Add many beam members to the model at once.
+
+    This is equivalent to calling :func:`add_beam_member` for each member,
+    but the input is validated for all members at once.
+
+    Parameters
+    ----------
+    m
+        Model.
+    mids
+        The member identifiers (list or array), which must be unique.
+    connectivity
+        Array of the joint identifiers, one row of two joints per member.
+        The joints must exist.
+    sections
+        Either a single section (used for all the members), or a list of
+        sections (2d or 3d beam sections).
+    section_index
+        Optional: array of indexes into the list ``sections``, one per member.
+        If it is not supplied, and ``sections`` is a list, it must hold one
+        section per member.
+
+    Returns
+    -------
+    None
+
+    See Also
+    --------
+    :func:`add_beam_member`
+    """
+    return _add_members(
+        m, "beam_members", "Beam member", mids, connectivity, sections, section_index
+    )
+
+
 def add_dof_links(m, jids, dof):
     """
     Add degree-of-freedom links between all joints in the list ``jids`` in the
@@ -417,27 +813,43 @@ def characteristic_dimension(m):
     return mean(array(dl))
 
 
-def _copy_dof_num_to_linked(m, j, d, n):
-    if "links" in j:
-        for k in j["links"].keys():
-            o = m["joints"][k]
-            if d in o["links"][j["jid"]]:
-                o["dof"][d] = n
+def _linked_representatives(joints, linked, ndpn):
+    # For each joint and each degree of freedom, find the index of the joint
+    # whose number is to be shared (the first joint of the group of linked
+    # joints, in the order in which the joints were defined).
+    nj = len(joints)
+    reps = empty((nj, ndpn), dtype=int64)
+    reps[:, :] = arange(nj).reshape(nj, 1)
+    if not linked:
+        return reps
+    index = {j["jid"]: k for k, j in enumerate(joints)}
+    pairs = [[] for d in range(ndpn)]
+    for k1 in linked:
+        for jid2, dofs in joints[k1]["links"].items():
+            for d in dofs:
+                pairs[d].append((k1, index[jid2]))
+    for d in range(ndpn):
+        if not pairs[d]:
+            continue
+        p = array(pairs[d], dtype=int64)
+        g = scipy.sparse.coo_matrix(
+            (ones(len(p), dtype=int8), (p[:, 0], p[:, 1])), shape=(nj, nj)
+        )
+        ncomp, labels = scipy.sparse.csgraph.connected_components(g, directed=False)
+        first = full(ncomp, nj, dtype=int64)
+        minimum.at(first, labels, arange(nj))
+        reps[:, d] = first[labels]
+    return reps
 
 
 def _have_rotations(m):
-    with_rotations = "beam_members" in m and m["beam_members"]
-    if with_rotations:
+    meta = metadata(m)
+    if meta["counts"]["beam_members"] > 0:
         return True
-    f = m['freedoms']
-    for j in m["joints"].values():
-        if "supports" in j and j["supports"]:
-            for dof in j["supports"].keys():
-                if (m['dim'] == 2) and dof == f.UR3:
-                    return True
-                if (m['dim'] == 3) and (dof == f.UR1 or dof == f.UR2 or dof == f.UR3 or dof == f.UR3):
-                    return True
-    return False
+    if meta["counts"]["superelements"] > 0:
+        if any(s["superelement"]["rotations"] for s in m["superelements"].values()):
+            return True
+    return meta["rotation_supports"] > 0
 
 
 def ndof_per_joint(m):
@@ -454,6 +866,14 @@ def ndof_per_joint(m):
     int
         How many degrees of freedom are there per joint? Depends on the space
         dimension of the model and the presence or absence of beams.
+
+    Notes
+    -----
+    The answer is taken from the model metadata (key ``"metadata"``), which is
+    maintained by the ``add_...`` functions, so that the query is usually
+    :math:`O(1)`. The supported rotations are counted by :func:`add_support`
+    and :func:`remove_supports`; supports added by modifying the dictionary
+    ``j["supports"]`` directly are not counted.
     """
     ndpn = m["dim"]
     with_rotations = _have_rotations(m)
@@ -479,6 +899,14 @@ def number_dofs(m):
     The degrees of freedom are numbered in the order of free and then
     prescribed.
 
+    The numbering is vectorized: a boolean mask of the prescribed degrees of
+    freedom (one row per joint, one column per freedom) is built from the
+    supports, and the free and the prescribed degrees of freedom are numbered
+    with cumulative sums over this mask. Joints linked with
+    :func:`add_dof_links` form groups (per freedom); each group is numbered at
+    its first joint, and the other joints of the group share that number. The
+    ``"dof"`` arrays of the joints are rows of a single array.
+
     Parameters
     ----------
     m
@@ -490,58 +918,285 @@ def number_dofs(m):
     """
     if "joints" not in m:
         raise RuntimeError("No joints in the model")
+    # The geometry is computed again from the final coordinates of the joints
+    _invalidate_geometry(m)
     # Determine the number of degrees of freedom per joint
     ndpn = ndof_per_joint(m)
-    # Generate arrays for storing the degrees of freedom
-    for j in m["joints"].values():
-        if "dof" not in j:
-            j["dof"] = zeros((ndpn,), dtype=int32)
-        j["dof"][:] = -1  # -1 means not yet numbered
+    joints = list(m["joints"].values())
+    nj = len(joints)
+    # Find the joints with supports and the joints with links in one pass
+    supported, linked = [], []
+    for k, j in enumerate(joints):
+        if "supports" in j and j["supports"]:
+            supported.append(k)
+        if "links" in j and j["links"]:
+            linked.append(k)
     # For each linked pair of joints, make sure they share the same supports
-    for j in m["joints"].values():
-        if "links" in j and "supports" in j:
-            for k in j["links"].keys():
-                o = m["joints"][k]
+    for k in linked:
+        j = joints[k]
+        if "supports" in j:
+            for jid in j["links"].keys():
+                o = m["joints"][jid]
                 if not "supports" in o:
                     o["supports"] = j["supports"].copy()
+                    metadata(m)["rotation_supports"] += _rotation_supports(o)
                 if o["supports"] != j["supports"]:
                     raise RuntimeError("Linked joints must have the same supports")
+    # Supports may have been copied to linked joints
+    supported += [k for k in linked if "supports" in joints[k] and joints[k]["supports"]]
+    # Mark the prescribed degrees of freedom
+    rows, cols = [], []
+    for k in supported:
+        for d in joints[k]["supports"].keys():
+            rows.append(k)
+            cols.append(d)
+    prescribed = zeros((nj, ndpn), dtype=bool)
+    prescribed[rows, cols] = True
+    # Linked degrees of freedom are numbered only at the representative joint
+    # of each group, the other joints in the group receive a copy
+    reps = _linked_representatives(joints, linked, ndpn)
+    own = reps == arange(nj).reshape(nj, 1)
+    # Number the free degrees of freedom first, then the prescribed ones, in
+    # the order of the joints and, within each joint, of the freedoms
+    free = (~prescribed & own).ravel()
+    supp = (prescribed & own).ravel()
+    nf = int(free.sum())
+    # The modal degrees of freedom of the superelements follow the free
+    # degrees of freedom of the joints
+    nmodal = 0
+    for s in m.get("superelements", {}).values():
+        n = s["superelement"]["nmodes"]
+        s["dof"] = arange(nf + nmodal, nf + nmodal + n, dtype=int32)
+        nmodal += n
+    dofs = where(free, cumsum(free) - 1, nf + nmodal + cumsum(supp) - 1)
+    dofs = dofs.reshape(nj, ndpn)
+    dofs = dofs[reps, arange(ndpn)].astype(int32)
+    for k, j in enumerate(joints):
+        j["dof"] = dofs[k]
+    m["nfreedof"] = nf + nmodal
+    m["ntotaldof"] = nf + nmodal + int(supp.sum())
+    return None
 
-    # Number the free degrees of freedom first
-    n = 0
-    for j in m["joints"].values():
-        for d in range(ndpn):
-            if ("supports" not in j) or (d not in j["supports"]):
-                if j["dof"][d] < 0:
-                    j["dof"][d] = n
-                    _copy_dof_num_to_linked(m, j, d, n)
-                    n += 1
-    m["nfreedof"] = n
-    # Number all prescribed degrees of freedom
-    for j in m["joints"].values():
-        for d in range(ndpn):
-            if "supports" in j and d in j["supports"]:
-                if j["dof"][d] < 0:
-                    j["dof"][d] = n
-                    _copy_dof_num_to_linked(m, j, d, n)
-                    n += 1
-    m["ntotaldof"] = n
+
+GEOMETRY_KINDS = ("truss_members", "beam_members")
+"""
+Kinds of the members whose geometry is cached (refer to
+:func:`member_geometry_table`).
+"""
+
+
+def _invalidate_geometry(m):
+    # Discard the cached geometry: it is computed again when it is needed
+    metadata(m)["geometry"] = None
+
+
+def _geometry_table(m, kind):
+    members = m.get(kind, {})
+    mids = list(members.keys())
+    if not mids:
+        return dict(mids=mids, h=zeros(0))
+    joints = m["joints"]
+    Xi = array([joints[mb["connectivity"][0]]["coordinates"] for mb in members.values()], dtype=float64)
+    Xj = array([joints[mb["connectivity"][1]]["coordinates"] for mb in members.values()], dtype=float64)
+    if m["dim"] == 2:
+        e_x, e_z, h = geometry.members_2d_geometry(Xi, Xj)
+        return dict(mids=mids, e_x=e_x, e_z=e_z, h=h)
+    # The orientation vectors of the sections (NaN where a vector is not given)
+    xy, xz = full((len(mids), 3), nan), full((len(mids), 3), nan)
+    for k, mb in enumerate(members.values()):
+        sect = mb["section"]
+        if sect.get("xy_vector") is not None:
+            xy[k] = sect["xy_vector"]
+        if sect.get("xz_vector") is not None:
+            xz[k] = sect["xz_vector"]
+    e_x, e_y, e_z, h = geometry.members_3d_geometry(Xi, Xj, xy, xz)
+    return dict(mids=mids, e_x=e_x, e_y=e_y, e_z=e_z, h=h)
+
+
+def member_geometry_table(m, kind, rebuild=False):
+    """
+    Retrieve the geometry of all the members of one kind.
+
+    The basis vectors and the lengths of the members are computed for all the
+    members at once, and they are cached in the model metadata, so that the
+    assembly of the matrices, the resultants, and the volume do not compute
+    them member by member.
+
+    The cache is discarded when a joint or a member is added, when the joints
+    are moved with :func:`move_joint`, when the orientation of a section is
+    changed with :func:`set_section_orientation`, when the joints are merged
+    or the members are refined, and when the degrees of freedom are numbered
+    (:func:`number_dofs`). If the coordinates of the joints or the
+    orientation vectors of the sections are modified directly instead, the
+    cache must be rebuilt (``rebuild=True``) or the degrees of freedom
+    numbered again.
+
+    Parameters
+    ----------
+    m
+        The model.
+    kind
+        ``"truss_members"`` or ``"beam_members"``.
+    rebuild
+        Optional: discard the cached geometry of all the members, and compute
+        it again. Default is ``False``.
+
+    Returns
+    -------
+    dict
+        Dictionary with the keys ``"mids"`` (the member identifiers, in the
+        order of the rows), ``"e_x"``, ``"e_y"`` (3d only), ``"e_z"`` (arrays
+        of the basis vectors, one row per member), and ``"h"`` (array of the
+        lengths).
+    """
+    if kind not in GEOMETRY_KINDS:
+        raise RuntimeError(f"The geometry of {kind} is not cached")
+    meta = metadata(m)
+    if rebuild or meta.get("geometry") is None:
+        meta["geometry"] = {}
+    cache = meta["geometry"]
+    if kind not in cache:
+        cache[kind] = _geometry_table(m, kind)
+    return cache[kind]
+
+
+def _geometry_rows(m, kind):
+    # The cached geometry of the members of one kind, as the tuples returned
+    # by pystran.geometry.member_geometry, keyed by the member identifiers.
+    table = member_geometry_table(m, kind)
+    if not table["mids"]:
+        return {}
+    keys = ("e_x", "e_z", "h") if m["dim"] == 2 else ("e_x", "e_y", "e_z", "h")
+    return dict(zip(table["mids"], zip(*[table[k] for k in keys])))
+
+
+def move_joint(m, jid, coordinates):
+    """
+    Move a joint to new coordinates.
+
+    The cached geometry of the members and the spatial index of the joints
+    are discarded (refer to :func:`member_geometry_table`).
+
+    Parameters
+    ----------
+    m
+        Model.
+    jid
+        The joint identifier.
+    coordinates
+        The list (or a tuple) of the new coordinates of the joint.
+
+    Returns
+    -------
+    None
+    """
+    if jid not in m.get("joints", {}):
+        raise RuntimeError(f"Joint {jid} does not exist")
+    coordinates = array(coordinates, dtype=float64)
+    if coordinates.shape != (m["dim"],):
+        raise RuntimeError("Coordinate dimension mismatch")
+    m["joints"][jid]["coordinates"] = coordinates
+    meta = metadata(m)
+    meta["spatial_index"] = None
+    meta["geometry"] = None
+    return None
+
+
+def set_section_orientation(m, sect, xy_vector=None, xz_vector=None):
+    """
+    Change the orientation vector of a 3d beam section.
+
+    The cached geometry of the members is discarded (refer to
+    :func:`member_geometry_table`), so that all the members with this section
+    take the new orientation.
+
+    Parameters
+    ----------
+    m
+        Model.
+    sect
+        The section (refer to :func:`pystran.section.beam_3d_section`).
+    xy_vector
+        Optional: vector that lies in the local :math:`x-y` coordinate plane.
+    xz_vector
+        Optional: vector that lies in the local :math:`x-z` coordinate plane.
+        Only one of the two vectors can be supplied.
+
+    Returns
+    -------
+    None
+    """
+    if xy_vector is not None and xz_vector is not None:
+        raise ValueError("Only one of xy_vector and xz_vector can be supplied.")
+    sect["xy_vector"] = None if xy_vector is None else array(xy_vector, dtype=float64)
+    sect["xz_vector"] = None if xz_vector is None else array(xz_vector, dtype=float64)
+    _invalidate_geometry(m)
     return None
 
-def _build_stiffness_matrix(m):
+
+def build_stiffness_matrix(m, sparse=False):
+    """
+    Assemble the stiffness matrix of the model.
+
+    The matrix includes all the degrees of freedom, the free ones first,
+    followed by the prescribed ones. :func:`number_dofs` must be called before
+    this function.
+
+    Parameters
+    ----------
+    m
+        The model.
+    sparse
+        Optional: assemble a sparse matrix (CSC format)? Default is
+        ``False``, which gives a dense array.
+
+    Returns
+    -------
+    array or sparse matrix
+        The stiffness matrix.
+    """
     nt = m["ntotaldof"]
-    # Assemble global stiffness matrix and mass matrix
-    K = zeros((nt, nt))
+    K = assemble.SparseAssembler((nt, nt)) if sparse else zeros((nt, nt))
+    K = _assemble_stiffness(m, K)
+    return K.tocsc() if sparse else K
+
+
+def build_element_stiffness_blocks(m):
+    """
+    Collect the stiffness matrices of the members of the model.
+
+    :func:`number_dofs` must be called before this function.
+
+    Parameters
+    ----------
+    m
+        The model.
+
+    Returns
+    -------
+    list
+        The blocks of the local matrices, grouped by their size (refer to
+        :meth:`pystran.assemble.SparseAssembler.element_blocks`).
+    """
+    nt = m["ntotaldof"]
+    K = _assemble_stiffness(m, assemble.SparseAssembler((nt, nt)))
+    return K.element_blocks()
+
+
+def _assemble_stiffness(m, K):
+    # Assemble global stiffness matrix
     if "truss_members" in m:
-        for member in m["truss_members"].values():
+        rows = _geometry_rows(m, "truss_members")
+        for mid, member in m["truss_members"].items():
             connectivity = member["connectivity"]
             i, j = m["joints"][connectivity[0]], m["joints"][connectivity[1]]
-            truss.assemble_stiffness(K, member, i, j)
+            truss.assemble_stiffness(K, member, i, j, rows[mid])
     if "beam_members" in m:
-        for member in m["beam_members"].values():
+        rows = _geometry_rows(m, "beam_members")
+        for mid, member in m["beam_members"].items():
             connectivity = member["connectivity"]
             i, j = m["joints"][connectivity[0]], m["joints"][connectivity[1]]
-            beam.assemble_stiffness(K, member, i, j)
+            beam.assemble_stiffness(K, member, i, j, rows[mid])
     if "rigid_link_members" in m:
         for member in m["rigid_link_members"].values():
             connectivity = member["connectivity"]
@@ -552,33 +1207,110 @@ def _build_stiffness_matrix(m):
             connectivity = member["connectivity"]
             i, j = m["joints"][connectivity[0]], m["joints"][connectivity[1]]
             spring.assemble_stiffness(K, member, i, j)
+    if "superelements" in m:
+        for s in m["superelements"].values():
+            assemble.assemble(K, superelement_dofs(m, s), s["superelement"]["K"])
 
     return K
 
 
-def _build_mass_matrix(m):
+def build_mass_matrix(m, sparse=False):
+    """
+    Assemble the consistent mass matrix of the model.
+
+    The matrix includes the masses of the members, of the superelements, and
+    the masses attached to the joints (refer to :func:`add_mass`), for all the
+    degrees of freedom. :func:`number_dofs` must be called before this
+    function.
+
+    Parameters
+    ----------
+    m
+        The model.
+    sparse
+        Optional: assemble a sparse matrix (CSC format)? Default is
+        ``False``, which gives a dense array.
+
+    Returns
+    -------
+    array or sparse matrix
+        The mass matrix.
+    """
     nt = m["ntotaldof"]
-    M = zeros((nt, nt))
+    M = assemble.SparseAssembler((nt, nt)) if sparse else zeros((nt, nt))
     if "truss_members" in m:
-        for member in m["truss_members"].values():
+        rows = _geometry_rows(m, "truss_members")
+        for mid, member in m["truss_members"].items():
             connectivity = member["connectivity"]
             i, j = m["joints"][connectivity[0]], m["joints"][connectivity[1]]
-            truss.assemble_mass(M, member, i, j)
+            truss.assemble_mass(M, member, i, j, rows[mid])
     if "beam_members" in m:
-        for member in m["beam_members"].values():
+        rows = _geometry_rows(m, "beam_members")
+        for mid, member in m["beam_members"].items():
             connectivity = member["connectivity"]
             i, j = m["joints"][connectivity[0]], m["joints"][connectivity[1]]
-            beam.assemble_mass(M, member, i, j)
+            beam.assemble_mass(M, member, i, j, rows[mid])
+    if "superelements" in m:
+        for s in m["superelements"].values():
+            assemble.assemble(M, superelement_dofs(m, s), s["superelement"]["M"])
     for j in m["joints"].values():
         if "masses" in j:
             for dof, value in j["masses"].items():
                 if _dof_is_int(dof):
                     gr = j["dof"][dof]
-                    M[gr, gr] += value
+                    assemble.assemble(M, [gr], array([[value]]))
                 else:
                     for d in dof:
                         gr = j["dof"][d]
-                        M[gr, gr] += value
+                        assemble.assemble(M, [gr], array([[value]]))
+    return M.tocsc() if sparse else M
+
+
+def build_lumped_mass_vector(m, lumping="HRZ"):
+    """
+    Assemble the lumped (diagonal) mass matrix of the model.
+
+    :func:`number_dofs` must be called before this function. Superelements
+    have no lumped mass matrix.
+
+    Parameters
+    ----------
+    m
+        The model.
+    lumping
+        Optional: the lumping of the beams, ``"HRZ"`` (default) or
+        ``"row-sum"`` (refer to :func:`pystran.beam.beam_2d_lumped_mass`).
+
+    Returns
+    -------
+    array
+        The diagonal of the mass matrix (a vector), one entry per degree of
+        freedom.
+    """
+    if "superelements" in m and m["superelements"]:
+        raise RuntimeError("Superelements have no lumped mass matrix")
+    nt = m["ntotaldof"]
+    M = zeros(nt)
+    if "truss_members" in m:
+        rows = _geometry_rows(m, "truss_members")
+        for mid, member in m["truss_members"].items():
+            connectivity = member["connectivity"]
+            i, j = m["joints"][connectivity[0]], m["joints"][connectivity[1]]
+            truss.assemble_lumped_mass(M, member, i, j, rows[mid])
+    if "beam_members" in m:
+        rows = _geometry_rows(m, "beam_members")
+        for mid, member in m["beam_members"].items():
+            connectivity = member["connectivity"]
+            i, j = m["joints"][connectivity[0]], m["joints"][connectivity[1]]
+            beam.assemble_lumped_mass(M, member, i, j, lumping, rows[mid])
+    for j in m["joints"].values():
+        if "masses" in j:
+            for dof, value in j["masses"].items():
+                if _dof_is_int(dof):
+                    M[j["dof"][dof]] += value
+                else:
+                    for d in dof:
+                        M[j["dof"][d]] += value
     return M
 
 
@@ -613,7 +1345,9 @@ def solve_statics(m):
     Here :math:`L_f` is the vector of active loads applied to the free degrees
     of freedom, and :math:`L_d`  is the vector of active loads applied to the
     data degrees of freedom. The reactions :math:`R` due to supports act on the
-    prescribed (data) degrees of freedom.
+    prescribed (data) degrees of freedom. The active loads include the
+    equivalent joint loads of the member loads stored in the model (refer to
+    :func:`pystran.memberloads.equivalent_loads`).
 
     The system of equations is solved for the free degrees of freedom as
 
@@ -647,7 +1381,7 @@ def solve_statics(m):
     nt, nf = m["ntotaldof"], m["nfreedof"]
 
     # Assemble global stiffness matrix
-    K = _build_stiffness_matrix(m)
+    K = build_stiffness_matrix(m)
 
     m["K"] = K
 
@@ -658,6 +1392,7 @@ def solve_statics(m):
             for dof, value in joint["loads"].items():
                 gr = joint["dof"][dof]
                 F[gr] += value
+    F += memberloads.equivalent_loads(m)
 
     m["F"] = F
 
@@ -670,13 +1405,19 @@ def solve_statics(m):
                     gr = joint["dof"][dof]
                     U[gr] = value
     # # Solve for displacements
-    U[0:nf] = solve(K[0:nf, 0:nf], F[0:nf] - dot(K[0:nf, nf:nt], U[nf:nt]))
+    if U[nf:nt].any():
+        U[0:nf] = solve(K[0:nf, 0:nf], F[0:nf] - dot(K[0:nf, nf:nt], U[nf:nt]))
+    else:
+        U[0:nf] = solve(K[0:nf, 0:nf], F[0:nf])
 
     m["U"] = U
+    # The solution goes with the member loads of the model, not a combination
+    m.pop("load_factors", None)
 
     # # Assign displacements back to joints
     for joint in m["joints"].values():
         joint["displacements"] = U[joint["dof"]]
+    memberloads.set_fixed_end_state(m)
     return None
     
 def statics_reactions(m):
@@ -737,10 +1478,12 @@ def statics_reactions(m):
     # Compute reactions from the partitioned stiffness matrix and the
     # partitioned displacement vector
     # R = dot(K[nf:nt, 0:nf], U[0:nf]) + dot(K[nf:nt, nf:nt], U[nf:nt]) - F[nf:nt]
-    # For convenience when working
-    # with degrees of freedom, we compute this product and only use the rows
-    # corresponding to fixed the degrees of freedom.
-    R = dot(K, U) - F
+    # Only the rows of the prescribed degrees of freedom are computed. For
+    # convenience when working with degrees of freedom, the reactions are
+    # stored in a vector of the full size.
+    nt, nf = m["ntotaldof"], m["nfreedof"]
+    R = zeros(nt)
+    R[nf:nt] = dot(K[nf:nt, :], U) - F[nf:nt]
 
     for joint in m["joints"].values():
         if "supports" in joint:
@@ -751,7 +1494,17 @@ def statics_reactions(m):
             joint["reactions"] = reactions
     return None
 
-def solve_free_vibration(m, freqshift=0.0):
+def solve_free_vibration(
+    m,
+    freqshift=0.0,
+    lumping=None,
+    condensation=None,
+    band=None,
+    nslices=1,
+    workers=1,
+    nmodes=None,
+    warm_start=False,
+):
     r"""
     Solve the free vibration of the discrete model.
 
@@ -760,6 +1513,12 @@ def solve_free_vibration(m, freqshift=0.0):
     frequencies are computed from the eigenvalues (can be retrieved as
     ``m["frequencies"]``).
 
+    By default the mass matrix is consistent. Optionally, a lumped (diagonal)
+    mass matrix may be used instead: it is then stored as a vector (the
+    diagonal), ``m["M"]``, and the eigenvalue problem is reduced to the
+    standard form by scaling with the inverse square root of the masses,
+    which avoids forming and factorizing the mass matrix.
+
     The equation of free vibration is
 
     .. math::
@@ -782,6 +1541,51 @@ def solve_free_vibration(m, freqshift=0.0):
         .. math::
             (K + \bar\omega^2 M) \cdot V = (\omega^2 - \bar\omega^2) M \cdot V
 
+        The shift applies to all the methods of solution, except for the
+        frequency band (``band``), which must not be combined with it.
+    lumping
+        Optional: ``None`` (default) for the consistent mass matrix, or
+        ``"HRZ"`` or ``"row-sum"`` for a lumped mass matrix (refer to
+        :func:`pystran.beam.beam_2d_lumped_mass`). All the free degrees of
+        freedom must have positive lumped masses, unless the massless degrees
+        of freedom are condensed.
+    condensation
+        Optional: the free degrees of freedom to eliminate by static (Guyan)
+        condensation before the eigenvalue problem is solved, either
+        ``"auto"`` to condense the degrees of freedom without mass, or a list
+        of the global numbers of the degrees of freedom. The mode shapes are
+        expanded back to all the free degrees of freedom. Condensing the
+        degrees of freedom that carry no mass (for instance, the rotations
+        with the row-sum lumped mass) does not change the frequencies, and
+        the eigenvalue problem becomes smaller. It cannot be combined with
+        ``band`` or ``nmodes``. Default is no condensation.
+    band
+        Optional: the interval of the frequencies ``(fmin, fmax)`` (in Hertz).
+        If it is given, only the modes with the frequencies in the interval are
+        computed, with sparse matrices (which are then stored as ``m["K"]``
+        and ``m["M"]``), and the interval is split into ``nslices`` slices,
+        which are solved by shift-invert iterations, possibly in parallel
+        processes (refer to :func:`pystran.eigen.solve_band`). The Sturm
+        sequence check guarantees that no mode in the interval is missed.
+    nslices
+        Optional: the number of the slices of the frequency band. Default is 1.
+    workers
+        Optional: the number of the processes for the frequency band. Default
+        is 1.
+    nmodes
+        Optional: the number of the lowest modes to compute. If it is given,
+        the modes are computed with sparse matrices by the preconditioned
+        block iterations (refer to :func:`pystran.eigen.solve_lobpcg`), and
+        the number of the iterations is stored as ``m["eigen_iterations"]``.
+        A ``RuntimeError`` is raised if the iterations do not converge.
+    warm_start
+        Optional: should the eigenvectors of the previous solution,
+        ``m["eigvecs"]``, be used as the initial block of the block
+        iterations? When the model changed only a little (for instance
+        between the iterations of a design optimization), a few iterations
+        suffice. If ``nmodes`` is not given, it is the number of the previous
+        eigenvectors. Default is ``False``.
+
     Returns
     -------
     None
@@ -797,10 +1601,20 @@ def solve_free_vibration(m, freqshift=0.0):
     if not ("nfreedof" in m) or m["nfreedof"] <= 0:
         raise RuntimeError("No free degrees of freedom: nothing to compute")
     nt, nf = m["ntotaldof"], m["nfreedof"]
+    previous = m.get("eigvecs") if warm_start else None
+    if warm_start and nmodes is None:
+        if previous is None:
+            raise RuntimeError("No previous eigenvectors to start from")
+        nmodes = previous.shape[1]
+    iterative = nmodes is not None
 
     # Assemble global stiffness matrix and mass matrix
-    K = _build_stiffness_matrix(m)
-    M = _build_mass_matrix(m)
+    sparse = band is not None or iterative
+    K = build_stiffness_matrix(m, sparse=sparse)
+    if lumping is None:
+        M = build_mass_matrix(m, sparse=sparse)
+    else:
+        M = build_lumped_mass_vector(m, lumping)
 
     m["K"] = K
     m["M"] = M
@@ -815,19 +1629,136 @@ def solve_free_vibration(m, freqshift=0.0):
 
     # Solve the eigenvalue problem. Potentially with shifting for better convergence around a certain frequency.
     Kff = K[0:nf, 0:nf]
-    Mff = M[0:nf, 0:nf]
+    Mff = M[0:nf] if lumping is not None else M[0:nf, 0:nf]
+    baromega2 = (2 * pi * freqshift) ** 2
+    if condensation is not None and (band is not None or iterative):
+        raise ValueError("The condensation cannot be combined with the frequency band or nmodes")
     if freqshift != 0.0:
-        baromega = (2 * pi * freqshift) 
-        eigvals, eigvecs = eigh(Kff + baromega**2 * Mff, Mff)
-        eigvals -= baromega**2
+        if band is not None:
+            raise ValueError("The frequency shift cannot be combined with the frequency band")
+        if lumping is None:
+            Kff = Kff + baromega2 * Mff
+        elif sparse:
+            Kff = Kff + baromega2 * scipy.sparse.diags(Mff)
+        else:
+            Kff = Kff + baromega2 * diag(Mff)
+    if band is not None:
+        # Spectrum slicing
+        lower, upper = [(2 * pi * f) ** 2 for f in band]
+        eigvals, eigvecs = eigen.solve_band(Kff, Mff, lower, upper, nslices, workers)
+    elif iterative:
+        # Block iterations, possibly starting from the previous mode shapes
+        X0 = eigen.initial_block(nf, nmodes, previous)
+        eigvals, eigvecs, iterations = eigen.solve_lobpcg(Kff, Mff, X0)
+        m["eigen_iterations"] = iterations
+    elif condensation is not None:
+        # Solve the reduced problem, and expand the mode shapes
+        if isinstance(condensation, str) and condensation == "auto":
+            slaves = eigen.massless_dofs(Mff)
+        else:
+            slaves = array(condensation, dtype=int64)
+            if (slaves >= nf).any():
+                raise RuntimeError("Only free degrees of freedom can be condensed")
+        Kr, Mr, T, _ = eigen.guyan_reduction(Kff, Mff, slaves)
+        eigvals, eigvecs = eigen.generalized_eigh(Kr, Mr)
+        eigvecs = T @ eigvecs
+    elif lumping is not None:
+        # Standard eigenvalue problem with the matrix M^-1/2 K M^-1/2
+        eigvals, eigvecs = eigen.generalized_eigh(Kff, Mff)
     else:
         eigvals, eigvecs = eigh(Kff, Mff)
+    if freqshift != 0.0:
+        eigvals = eigvals - baromega2
 
     m["eigvals"] = eigvals
     m["frequencies"] = [sqrt(abs(ev)) / 2 / pi for ev in eigvals]
     m["eigvecs"] = eigvecs
     return None
 
+
+def count_frequencies_below(m, frequency, lumping=None):
+    """
+    Count the natural frequencies of the model below a given frequency.
+
+    The count is obtained from the Sturm sequence of the factorization of the
+    shifted stiffness matrix (refer to :func:`pystran.eigen.sturm_count`),
+    without solving the eigenvalue problem. For instance, the first natural
+    frequency is above ``frequency`` if the count is zero.
+
+    :func:`number_dofs` must be called before this function.
+
+    Parameters
+    ----------
+    m
+        The model.
+    frequency
+        The frequency (in Hertz).
+    lumping
+        Optional: ``None`` (default) for the consistent mass matrix, or
+        ``"HRZ"`` or ``"row-sum"`` for a lumped mass matrix.
+
+    Returns
+    -------
+    int
+        The number of the natural frequencies below ``frequency``.
+    """
+    if not ("nfreedof" in m) or m["nfreedof"] <= 0:
+        raise RuntimeError("No free degrees of freedom: nothing to compute")
+    nf = m["nfreedof"]
+    K = build_stiffness_matrix(m, sparse=True)[0:nf, 0:nf]
+    if lumping is None:
+        M = build_mass_matrix(m, sparse=True)[0:nf, 0:nf]
+    else:
+        M = build_lumped_mass_vector(m, lumping)[0:nf]
+    return eigen.sturm_count(K, M, (2 * pi * frequency) ** 2)
+
+
+def track_modes(m, reference):
+    """
+    Reorder the modes of the model to follow the reference mode shapes.
+
+    When the sections or the geometry change, the order of the frequencies of
+    the modes may swap. The modes computed by :func:`solve_free_vibration` are
+    matched to the reference mode shapes (for instance, the eigenvectors of
+    the previous design) by the mass-weighted modal assurance criterion (refer
+    to :func:`pystran.eigen.track_modes`), and ``m["eigvals"]``,
+    ``m["eigvecs"]``, and ``m["frequencies"]`` are reordered so that the mode
+    ``k`` corresponds to the ``k``-th reference mode; the modes that match no
+    reference mode follow in their original order. The matched eigenvectors
+    are also flipped to point the same way as the reference. The MAC values
+    of the pairs are stored as ``m["mac"]``.
+
+    Parameters
+    ----------
+    m
+        The model.
+    reference
+        The reference mode shapes (in the columns), with one row per free
+        degree of freedom, no more than the modes of the model.
+
+    Returns
+    -------
+    array
+        The order of the original modes: the mode ``k`` is the original mode
+        ``order[k]``.
+    """
+    if not ("eigvecs" in m):
+        raise RuntimeError("No modes: the free vibration needs to be solved")
+    nf = m["nfreedof"]
+    M = m["M"][0:nf] if m["M"].ndim == 1 else m["M"][0:nf, 0:nf]
+    matched, signs, mac = eigen.track_modes(reference, m["eigvecs"], M)
+    # The unmatched modes follow, in their original order
+    rest = ones(len(m["eigvals"]), dtype=bool)
+    rest[matched] = False
+    order = concatenate([matched, rest.nonzero()[0]])
+    signs = concatenate([signs, ones(rest.sum())])
+    m["eigvals"] = m["eigvals"][order]
+    m["eigvecs"] = m["eigvecs"][:, order] * signs
+    m["frequencies"] = [m["frequencies"][k] for k in order]
+    m["mac"] = mac
+    return order
+
+
 def set_solution(m, V):
     """
     Set the displacement solution from a vector.
@@ -1032,7 +1963,9 @@ def refine_member(m, mid, n):
     # Remember the provenance of the new members
     member["descendants"] = descendants
     # Remove the old member
+    _unregister_member(m, "beam_members", mid, connectivity)
     del m["beam_members"][mid]
+    _invalidate_geometry(m)
     return None
     
 
@@ -1062,6 +1995,7 @@ def remove_supports(m):
     for joint in m["joints"].values():
         if "supports" in joint:
             joint["supports"] = {}
+    metadata(m)["rotation_supports"] = 0
     return None
 
 
@@ -1079,14 +2013,9 @@ def volume(m):
         Total volume of the members in the model.
     """
     total_volume = 0.0
-    if "truss_members" in m:
-        for member in m["truss_members"].values():
-            connectivity = member["connectivity"]
-            i, j = m["joints"][connectivity[0]], m["joints"][connectivity[1]]
-            total_volume += truss.truss_volume(member, i, j)
-    if "beam_members" in m:
-        for member in m["beam_members"].values():
-            connectivity = member["connectivity"]
-            i, j = m["joints"][connectivity[0]], m["joints"][connectivity[1]]
-            total_volume += beam.beam_volume(member, i, j)
+    for kind in GEOMETRY_KINDS:
+        if kind in m and m[kind]:
+            table = member_geometry_table(m, kind)
+            A = array([m[kind][mid]["section"]["A"] for mid in table["mids"]])
+            total_volume += float(dot(A, table["h"]))
     return total_volume
@@ -32,8 +32,7 @@ from pystran.beam import (
     beam_3d_axial_force,
 )
 from pystran.geometry import (
-    member_2d_geometry,
-    member_3d_geometry,
+    member_geometry,
     herm_basis,
     interpolate,
 )
@@ -302,10 +301,10 @@ def _plot_truss_or_rigid_link_deflection(ax, i, j, scale):
         )
 
 
-def _plot_2d_beam_deflection(ax, i, j, scale):
+def _plot_2d_beam_deflection(ax, member, i, j, scale):
     di, dj = i["displacements"], j["displacements"]
     ci, cj = i["coordinates"], j["coordinates"]
-    e_x, e_z, h = member_2d_geometry(i, j)
+    e_x, e_z, h = member_geometry(member, i, j)
     ui = dot(di[0:2], e_x)
     uj = dot(dj[0:2], e_x)
     wi = dot(di[0:2], e_z)
@@ -333,7 +332,7 @@ def _plot_3d_beam_deflection(ax, member, i, j, scale):
     sect = member["section"]
     di, dj = i["displacements"], j["displacements"]
     ci, cj = i["coordinates"], j["coordinates"]
-    e_x, e_y, e_z, h = member_3d_geometry(i, j, sect["xy_vector"], sect["xz_vector"])
+    e_x, e_y, e_z, h = member_geometry(member, i, j)
     ui = dot(di[0:3], e_x)
     uj = dot(dj[0:3], e_x)
     wi = dot(di[0:3], e_z)
@@ -419,7 +418,7 @@ def plot_deformations(m, scale=0.0):
             if m["dim"] == 3:
                 _plot_3d_beam_deflection(ax, member, i, j, scale)
             else:
-                _plot_2d_beam_deflection(ax, i, j, scale)
+                _plot_2d_beam_deflection(ax, member, i, j, scale)
     return ax
 
 
@@ -561,7 +560,8 @@ def _largest_mag_on_beam_members(m, fun):
         for member in m["beam_members"].values():
             connectivity = member["connectivity"]
             i, j = m["joints"][connectivity[0]], m["joints"][connectivity[1]]
-            for xi in linspace(-1, +1, 2):
+            # The member loads make the resultants vary along the span
+            for xi in linspace(-1, +1, 13):
                 mmag = abs(fun(member, i, j, xi))
                 maxmag = max(maxmag, mmag)
     return maxmag
@@ -579,7 +579,7 @@ def _largest_mag_on_truss_members(m, fun):
 
 
 def _plot_2d_beam_moments(ax, member, i, j, scale, nearly_zero = 1000 * _myeps):
-    _, e_z, _ = member_2d_geometry(i, j)
+    _, e_z, _ = member_geometry(member, i, j)
     ci, cj = i["coordinates"], j["coordinates"]
     n = 13
     for _, xi in enumerate(linspace(-1, +1, n)):
@@ -603,7 +603,7 @@ def _plot_2d_beam_moments(ax, member, i, j, scale, nearly_zero = 1000 * _myeps):
 
 def _plot_3d_beam_moments(ax, member, i, j, axis, scale, nearly_zero = 1000 * _myeps):
     sect = member["section"]
-    _, e_y, e_z, _ = member_3d_geometry(i, j, sect["xy_vector"], sect["xz_vector"])
+    _, e_y, e_z, _ = member_geometry(member, i, j)
     ci, cj = i["coordinates"], j["coordinates"]
     n = 13
     # The moments are plotted so that they are adjacent to fibers in tension.
@@ -681,11 +681,11 @@ def plot_bending_moments(m, axis="y", scale=0.0):
 
 
 def _plot_2d_beam_shear_forces(ax, member, i, j, scale, nearly_zero = 1000 * _myeps):
-    _, e_z, _ = member_2d_geometry(i, j)
+    _, e_z, _ = member_geometry(member, i, j)
     ci, cj = i["coordinates"], j["coordinates"]
     n = 13
     for _, xi in enumerate(linspace(-1, +1, n)):
-        Q = beam_2d_shear_force(member, i, j, 0.0)
+        Q = beam_2d_shear_force(member, i, j, xi)
         x = interpolate(xi, ci, cj)
         xs = zeros(2)
         ys = zeros(2)
@@ -702,7 +702,7 @@ def _plot_2d_beam_shear_forces(ax, member, i, j, scale, nearly_zero = 1000 * _my
 
 def _plot_3d_beam_shear_forces(ax, member, i, j, axis, scale, nearly_zero = 1000 * _myeps):
     sect = member["section"]
-    _, e_y, e_z, _ = member_3d_geometry(i, j, sect["xy_vector"], sect["xz_vector"])
+    _, e_y, e_z, _ = member_geometry(member, i, j)
     ci, cj = i["coordinates"], j["coordinates"]
     n = 13
     dirv = e_z
@@ -748,11 +748,11 @@ def plot_shear_forces(m, axis="z", scale=0.0):
     if not ('fig' in m):
         raise RuntimeError('Please first call plots.setup(m)')
 
-    def fun(member, i, j, _):
+    def fun(member, i, j, xi):
         if m["dim"] == 3:
-            return beam_3d_shear_force(member, i, j, axis, 0.0)
+            return beam_3d_shear_force(member, i, j, axis, xi)
         else:
-            return beam_2d_shear_force(member, i, j, 0.0)
+            return beam_2d_shear_force(member, i, j, xi)
 
     if scale == 0.0:
         cd = characteristic_dimension(m)
@@ -778,11 +778,11 @@ def plot_shear_forces(m, axis="z", scale=0.0):
 
 
 def _plot_2d_beam_axial_forces(ax, member, i, j, scale):
-    _, e_z, _ = member_2d_geometry(i, j)
+    _, e_z, _ = member_geometry(member, i, j)
     ci, cj = i["coordinates"], j["coordinates"]
     n = 13
     for _, xi in enumerate(linspace(-1, +1, n)):
-        N = beam_2d_axial_force(member, i, j, 0.0)
+        N = beam_2d_axial_force(member, i, j, xi)
         x = interpolate(xi, ci, cj)
         xs = zeros(2)
         ys = zeros(2)
@@ -798,7 +798,7 @@ def _plot_2d_beam_axial_forces(ax, member, i, j, scale):
 
 
 def _plot_2d_truss_axial_forces(ax, member, i, j, scale):
-    _, e_z, _ = member_2d_geometry(i, j)
+    _, e_z, _ = member_geometry(member, i, j)
     ci, cj = i["coordinates"], j["coordinates"]
     N = truss_axial_force(member, i, j, 0.0)
     n = 13
@@ -819,12 +819,12 @@ def _plot_2d_truss_axial_forces(ax, member, i, j, scale):
 
 def _plot_3d_truss_beam_axial_forces(ax, member, i, j, scale):
     sect = member["section"]
-    _, _, e_z, _ = member_3d_geometry(i, j, sect["xy_vector"], sect["xz_vector"])
+    _, _, e_z, _ = member_geometry(member, i, j)
     ci, cj = i["coordinates"], j["coordinates"]
     n = 13
     dirv = e_z
     for _, xi in enumerate(linspace(-1, +1, n)):
-        N = beam_3d_axial_force(member, i, j, 0.0)
+        N = beam_3d_axial_force(member, i, j, xi)
         x = interpolate(xi, ci, cj)
         xs = zeros(2)
         ys = zeros(2)
@@ -858,11 +858,11 @@ def plot_axial_forces(m, scale=0.0):
     if not ('fig' in m):
         raise RuntimeError('Please first call plots.setup(m)')
 
-    def funb(member, i, j, _):
+    def funb(member, i, j, xi):
         if m["dim"] == 3:
-            return beam_3d_axial_force(member, i, j, 0.0)
+            return beam_3d_axial_force(member, i, j, xi)
         else:
-            return beam_2d_axial_force(member, i, j, 0.0)
+            return beam_2d_axial_force(member, i, j, xi)
 
     def funt(member, i, j):
         return truss_axial_force(member, i, j, 0.0)
@@ -905,7 +905,7 @@ def plot_axial_forces(m, scale=0.0):
 
 def _plot_3d_beam_torsion_moments(ax, member, i, j, scale):
     sect = member["section"]
-    _, _, e_z, _ = member_3d_geometry(i, j, sect["xy_vector"], sect["xz_vector"])
+    _, _, e_z, _ = member_geometry(member, i, j)
     ci, cj = i["coordinates"], j["coordinates"]
     n = 13
     dirv = e_z
@@ -1001,7 +1001,7 @@ def plot_member_orientation(m, scale=0.0):
             ci, cj = i["coordinates"], j["coordinates"]
             xm = (ci + cj) / 2.0
             if m["dim"] == 3:
-                e_x, e_y, e_z, _ = member_3d_geometry(i, j, xy_vector=sect["xy_vector"], xz_vector=sect["xz_vector"])
+                e_x, e_y, e_z, _ = member_geometry(member, i, j)
                 xs = zeros(2)
                 ys = zeros(2)
                 zs = zeros(2)
@@ -1033,7 +1033,7 @@ def plot_member_orientation(m, scale=0.0):
                 zs[1] = zs[0] + scale * e_z[2]
                 ax.plot(xs, ys, zs, "b-", lw=3)
             else:
-                e_x, e_z, _ = member_2d_geometry(i, j)
+                e_x, e_z, _ = member_geometry(member, i, j)
                 xs = zeros(2)
                 ys = zeros(2)
                 xs[0] = xm[0]
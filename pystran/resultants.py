@@ -0,0 +1,419 @@
+r"""
+Define the post-processing of the member resultants for all the members at
+once.
+
+The end forces of a member are linear functions of the displacements of its
+joints, :math:`F = G \cdot U`. The operators :math:`G` of all the members of
+one kind are computed together, as a stack of matrices (one per member), from
+the arrays of the geometry and of the section properties, and they are applied
+to the displacements of all the members with a single tensor contraction. The
+displacements may have several columns (for instance, several load cases or
+mode shapes).
+
+The end forces are defined as in :func:`pystran.beam.beam_2d_end_forces` and
+:func:`pystran.beam.beam_3d_end_forces` for beams, and as the axial force of
+:func:`pystran.truss.truss_axial_force` for trusses.
+
+The contributions of the member loads (the fixed-end forces, and the internal
+forces of the fixed-end state along the members, refer to
+:mod:`pystran.memberloads`) are added to the resultants computed from the
+displacements.
+"""
+
+from numpy import array, zeros, ones, einsum, stack, float64, int64
+from pystran import geometry
+from pystran import model
+from pystran import beam
+from pystran import memberloads
+
+
+BEAM_2D_END_FORCES = ["Ni", "Qzi", "Myi", "Nj", "Qzj", "Myj"]
+BEAM_3D_END_FORCES = [
+    "Ni",
+    "Qyi",
+    "Qzi",
+    "Ti",
+    "Myi",
+    "Mzi",
+    "Nj",
+    "Qyj",
+    "Qzj",
+    "Tj",
+    "Myj",
+    "Mzj",
+]
+TRUSS_END_FORCES = ["N"]
+
+
+def member_table(m, kind):
+    """
+    Collect the data of the members of one kind into arrays.
+
+    :func:`pystran.model.number_dofs` must be called before this function.
+
+    Parameters
+    ----------
+    m
+        The model.
+    kind
+        ``"truss_members"`` or ``"beam_members"``.
+
+    Returns
+    -------
+    dict
+        Dictionary with the keys ``"mids"`` (list of the member identifiers,
+        in the order of the rows of the arrays), ``"dofs"`` (array of the
+        numbers of the degrees of freedom of the joints of the members, one
+        row per member), ``"e_x"``, ``"e_y"`` (3d only), ``"e_z"``, ``"h"``
+        (the geometry, retrieved from the cache, refer to
+        :func:`pystran.model.member_geometry_table`), and the arrays of the
+        section properties (for instance ``"E"``, ``"A"``).
+    """
+    dim = m["dim"]
+    members = m.get(kind, {})
+    mids = list(members.keys())
+    joints = m["joints"]
+    pairs = [member["connectivity"] for member in members.values()]
+    sects = [member["section"] for member in members.values()]
+    n = 3 * (dim - 1) if kind == "beam_members" else dim
+    if not mids:
+        return dict(mids=mids, dofs=zeros((0, 2 * n), dtype=int64))
+    dofs = array(
+        [list(joints[c[0]]["dof"][0:n]) + list(joints[c[1]]["dof"][0:n]) for c in pairs],
+        dtype=int64,
+    )
+    table = dict(mids=mids, dofs=dofs)
+    cached = model.member_geometry_table(m, kind)
+    for key in ("e_x", "e_y", "e_z", "h"):
+        if key in cached:
+            table[key] = cached[key]
+    if kind == "beam_members":
+        props = ["E", "A", "I"] if dim == 2 else ["E", "A", "Iy", "Iz", "G", "J"]
+    else:
+        props = ["E", "A"]
+    for p in props:
+        table[p] = array([s[p] for s in sects], dtype=float64)
+    return table
+
+
+def _hermite_rows(e_t, e_r, h, d, p):
+    # The rows of the matrices that give the p-th derivative of the deflection
+    # (with respect to the physical coordinate along the member) of many
+    # members: e_t is the direction of the deflection (translations), e_r the
+    # direction of the rotations (None in 2d), d are the p-th derivatives of
+    # the Hermite basis functions with respect to the parametric coordinate.
+    s = (2 / h) ** p
+    n, dim = e_t.shape
+    nr = 1 if e_r is None else dim
+    B = zeros((n, 2 * (dim + nr)))
+    for k, offset in enumerate([0, dim + nr]):
+        B[:, offset : offset + dim] = (d[2 * k] * s)[:, None] * e_t
+        r = (h / 2) * d[2 * k + 1] * s
+        if e_r is None:
+            B[:, offset + dim] = r
+        else:
+            B[:, offset + dim : offset + dim + nr] = r[:, None] * e_r
+    return B
+
+
+def _stretch_rows(t, stiffness, offsets):
+    # Axial force (offsets of the translations) or torsion moment (offsets of
+    # the rotations) of many members.
+    e_x, h = t["e_x"], t["h"]
+    dim = e_x.shape[1]
+    B = zeros((len(h), 2 * offsets[1]))
+    B[:, offsets[0] : offsets[0] + dim] = -(stiffness / h)[:, None] * e_x
+    B[:, offsets[1] + offsets[0] : offsets[1] + offsets[0] + dim] = (
+        stiffness / h
+    )[:, None] * e_x
+    return B
+
+
+def internal_force_rows(t, quantity, xi=0.0):
+    r"""
+    Compute the rows that map the displacements to an internal force.
+
+    Each row maps the displacements of the joints of one beam (ordered as the
+    columns of ``t["dofs"]``) to the internal force at the parametric
+    location ``xi``, with the sign conventions of the functions in
+    :mod:`pystran.beam`.
+
+    Parameters
+    ----------
+    t
+        The member table of the beams (refer to :func:`member_table`).
+    quantity
+        The name of the internal force: ``"N"``, ``"Qz"``, ``"My"`` in 2d, and
+        also ``"Qy"``, ``"T"``, ``"Mz"`` in 3d.
+    xi
+        Optional: the parametric coordinate of the location
+        (:math:`-1\le\xi\le+1`). Default is the middle of the members.
+
+    Returns
+    -------
+    array
+        Array with one row per beam.
+    """
+    h = t["h"]
+    if "e_y" not in t:
+        EI = t["E"] * t["I"]
+        if quantity == "N":
+            return _stretch_rows(t, t["E"] * t["A"], (0, 3))
+        if quantity == "Qz":
+            return -EI[:, None] * _hermite_rows(t["e_z"], None, h, geometry.herm_basis_xi3(xi), 3)
+        if quantity == "My":
+            return -EI[:, None] * _hermite_rows(t["e_z"], None, h, geometry.herm_basis_xi2(xi), 2)
+    else:
+        e_y, e_z = t["e_y"], t["e_z"]
+        EIy, EIz = t["E"] * t["Iy"], t["E"] * t["Iz"]
+        if quantity == "N":
+            return _stretch_rows(t, t["E"] * t["A"], (0, 6))
+        if quantity == "T":
+            return _stretch_rows(t, t["G"] * t["J"], (3, 6))
+        if quantity == "Qy":
+            d = beam.beam_3d_xy_shape_fun_xi3(xi)
+            return -EIz[:, None] * _hermite_rows(e_y, e_z, h, d, 3)
+        if quantity == "Qz":
+            d = beam.beam_3d_xz_shape_fun_xi3(xi)
+            return -EIy[:, None] * _hermite_rows(e_z, e_y, h, d, 3)
+        if quantity == "My":
+            d = beam.beam_3d_xz_shape_fun_xi2(xi)
+            return -EIy[:, None] * _hermite_rows(e_z, e_y, h, d, 2)
+        if quantity == "Mz":
+            d = beam.beam_3d_xy_shape_fun_xi2(xi)
+            return EIz[:, None] * _hermite_rows(e_y, e_z, h, d, 2)
+    raise RuntimeError(f"Unknown internal force {quantity}")
+
+
+def _beam_2d_operators(t):
+    G = zeros((len(t["h"]), 6, 6))
+    G[:, 0, :] = internal_force_rows(t, "N")
+    G[:, 1, :] = internal_force_rows(t, "Qz")
+    G[:, 2, :] = internal_force_rows(t, "My", -1.0)
+    G[:, 3, :] = -G[:, 0, :]
+    G[:, 4, :] = -G[:, 1, :]
+    G[:, 5, :] = -internal_force_rows(t, "My", +1.0)
+    return G
+
+
+def _beam_3d_operators(t):
+    G = zeros((len(t["h"]), 12, 12))
+    G[:, 0, :] = internal_force_rows(t, "N")
+    G[:, 1, :] = internal_force_rows(t, "Qy")
+    G[:, 2, :] = internal_force_rows(t, "Qz")
+    G[:, 3, :] = internal_force_rows(t, "T")
+    G[:, 4, :] = internal_force_rows(t, "My", -1.0)
+    G[:, 5, :] = internal_force_rows(t, "Mz", -1.0)
+    G[:, 6:10, :] = -G[:, 0:4, :]
+    G[:, 10, :] = -internal_force_rows(t, "My", +1.0)
+    G[:, 11, :] = -internal_force_rows(t, "Mz", +1.0)
+    return G
+
+
+def _truss_operators(t):
+    dim = t["e_x"].shape[1]
+    return _stretch_rows(t, t["E"] * t["A"], (0, dim))[:, None, :]
+
+
+def end_force_operators(m, kind):
+    """
+    Compute the operators that map the joint displacements to the end forces
+    of all the members of one kind.
+
+    Parameters
+    ----------
+    m
+        The model.
+    kind
+        ``"truss_members"`` or ``"beam_members"``.
+
+    Returns
+    -------
+    tuple of table, keys, G
+        ``table`` is the member table (refer to :func:`member_table`),
+        ``keys`` are the names of the end forces, and ``G`` is the array of
+        the operators, one matrix per member, with one row per end force and
+        one column per degree of freedom in ``table["dofs"]``. For instance,
+        the end forces of the member ``table["mids"][k]`` are ``G[k] @
+        U[table["dofs"][k]]``.
+    """
+    table = member_table(m, kind)
+    dim = m["dim"]
+    if kind == "beam_members":
+        keys = BEAM_2D_END_FORCES if dim == 2 else BEAM_3D_END_FORCES
+    else:
+        keys = TRUSS_END_FORCES
+    nd = table["dofs"].shape[1]
+    if not table["mids"]:
+        return table, keys, zeros((0, len(keys), nd))
+    if kind == "beam_members":
+        G = _beam_2d_operators(table) if dim == 2 else _beam_3d_operators(table)
+    else:
+        G = _truss_operators(table)
+    return table, keys, G
+
+
+def _member_load_term(cases, values):
+    # The contribution of the member loads: values(case) gives the values of
+    # one load case. Either the load cases are combined with factors (cases is
+    # a dictionary), or there is one load case per column of the displacements
+    # (cases is a list).
+    if cases is None:
+        return 0.0
+    if isinstance(cases, dict):
+        total = 0.0
+        for case, factor in cases.items():
+            total = total + factor * values(case)
+        return total
+    return stack([values(case) for case in cases], axis=-1)
+
+
+def end_forces(m, U=None, kinds=("truss_members", "beam_members"), cases=None):
+    """
+    Compute the end forces of all the members.
+
+    The end forces of all the members of one kind are computed in one
+    vectorized pass, which is much faster for large models than calling
+    :func:`pystran.beam.beam_3d_end_forces` (or the other functions that
+    compute one resultant of one member) in a loop.
+
+    Parameters
+    ----------
+    m
+        The model.
+    U
+        Optional: the displacements of all the degrees of freedom, either a
+        vector, or an array with one column per load case (or mode shape).
+        Default is ``m["U"]``.
+    kinds
+        Optional: the kinds of the members to process. Default is both
+        ``"truss_members"`` and ``"beam_members"``.
+    cases
+        Optional: the member loads whose fixed-end forces are added (refer to
+        :func:`pystran.memberloads.fixed_end_forces`). Either a dictionary
+        that maps load cases to factors (the key ``None`` stands for the
+        member loads stored in the model), or a list of load cases, one for
+        each column of ``U``. If ``U`` is not given, the default are the
+        member loads of the current solution (refer to
+        :func:`pystran.memberloads.solution_cases`), otherwise no member loads
+        are added.
+
+    Returns
+    -------
+    dict
+        Dictionary keyed by the kind of the members (only the kinds present in
+        the model). Each value is a dictionary with the keys ``"mids"`` (the
+        member identifiers, in the order of the rows), ``"keys"`` (the names of
+        the end forces, in the order of the columns), and ``"forces"`` (array
+        with one row per member and one column per end force, and a third
+        dimension if ``U`` has several columns).
+
+    Examples
+    --------
+    >>> result = resultants.end_forces(m)["beam_members"]
+    >>> k = result["mids"].index(mid)
+    >>> Myi = result["forces"][k, result["keys"].index("Myi")]
+    """
+    if U is None:
+        U = m["U"]
+        if cases is None:
+            cases = memberloads.solution_cases(m)
+    result = {}
+    for kind in kinds:
+        if kind in m:
+            table, keys, G = end_force_operators(m, kind)
+            forces = einsum("ekd,ed...->ek...", G, U[table["dofs"]])
+            forces = forces + _member_load_term(
+                cases, lambda case: memberloads.fixed_end_forces(m, kind, case)
+            )
+            result[kind] = dict(mids=table["mids"], keys=keys, forces=forces)
+    return result
+
+
+def internal_forces(m, xi, U=None, cases=None):
+    r"""
+    Compute the internal forces along all the beam members.
+
+    The internal forces are sampled at the same parametric locations ``xi``
+    along all the beam members. The moments vary linearly along a member (the
+    curvature of the cubic deflection is linear), hence they are interpolated
+    exactly from the values given by the curvature-displacement matrices at
+    the ends of the member. The axial force, the shear forces, and the torsion
+    moment are constant along a member. The internal forces due to the member
+    loads on the span are added to these (refer to
+    :func:`pystran.memberloads.span_forces`). All the members are processed at once,
+    so that for instance the extreme values of the moments in a large frame
+    are found with array operations.
+
+    The sign conventions are those of :func:`pystran.beam.beam_2d_moment`,
+    :func:`pystran.beam.beam_2d_shear_force`,
+    :func:`pystran.beam.beam_2d_axial_force` (2d), and
+    :func:`pystran.beam.beam_3d_moment`,
+    :func:`pystran.beam.beam_3d_shear_force`,
+    :func:`pystran.beam.beam_3d_axial_force`,
+    :func:`pystran.beam.beam_3d_torsion_moment` (3d).
+
+    Parameters
+    ----------
+    m
+        The model.
+    xi
+        The parametric coordinates of the locations (:math:`-1\le\xi\le+1`),
+        a number or an array.
+    U
+        Optional: the displacements of all the degrees of freedom, either a
+        vector, or an array with one column per load case. Default is
+        ``m["U"]``.
+    cases
+        Optional: the member loads whose internal forces are added, as in
+        :func:`end_forces`.
+
+    Returns
+    -------
+    dict
+        Dictionary with the keys ``"mids"`` (the identifiers of the beam
+        members, in the order of the rows), ``"xi"`` (the array of the
+        locations), and the internal forces, ``"N"``, ``"Qz"``, ``"My"`` in
+        2d, and ``"N"``, ``"Qy"``, ``"Qz"``, ``"T"``, ``"My"``, ``"Mz"`` in
+        3d. Each internal force is an array with one row per member and one
+        column per location (and a third dimension if ``U`` has several
+        columns).
+
+    Examples
+    --------
+    >>> d = resultants.internal_forces(m, numpy.linspace(-1.0, 1.0, 21))
+    >>> k, l = numpy.unravel_index(abs(d["My"]).argmax(), d["My"].shape)
+    >>> print(d["mids"][k], d["xi"][l], d["My"][k, l])
+    """
+    if U is None:
+        U = m["U"]
+        if cases is None:
+            cases = memberloads.solution_cases(m)
+    xi = array(xi, dtype=float64).reshape(-1)
+    table = member_table(m, "beam_members")
+    result = dict(mids=table["mids"], xi=xi)
+    if m["dim"] == 2:
+        constant, linear = ["N", "Qz"], ["My"]
+    else:
+        constant, linear = ["N", "Qy", "Qz", "T"], ["My", "Mz"]
+    if not table["mids"]:
+        for q in constant + linear:
+            result[q] = zeros((0, len(xi)) + U.shape[1:])
+        return result
+    u = U[table["dofs"]]
+    shape = (1, len(xi)) + (1,) * (u.ndim - 2)
+    wi, wj = ((1 - xi) / 2).reshape(shape), ((1 + xi) / 2).reshape(shape)
+    for q in constant:
+        value = einsum("ed,ed...->e...", internal_force_rows(table, q), u)
+        result[q] = value[:, None, ...] * ones(shape)
+    for q in linear:
+        vi = einsum("ed,ed...->e...", internal_force_rows(table, q, -1.0), u)
+        vj = einsum("ed,ed...->e...", internal_force_rows(table, q, +1.0), u)
+        result[q] = vi[:, None, ...] * wi + vj[:, None, ...] * wj
+    if cases is not None:
+        span = {}
+        for case in cases:
+            span[case] = memberloads.span_forces(m, xi, case)
+        for q in constant + linear:
+            result[q] = result[q] + _member_load_term(cases, lambda case: span[case][q])
+    return result
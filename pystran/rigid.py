@@ -118,9 +118,9 @@ def assemble_stiffness(Kg, member, i, j):
     Gamma = sect["Gamma"]
     dim = len(i["coordinates"])
     if dim == 2:
-        e_x, _, h = geometry.member_2d_geometry(i, j)
+        e_x, _, h = geometry.member_geometry(member, i, j)
     else:
-        e_x, _, _, h = geometry.member_3d_geometry(i, j, None, None)
+        e_x, _, _, h = geometry.member_geometry(member, i, j)
     k = rigid_link_stiffness(e_x, h, Gamma)
     dof = concatenate([i["dof"], j["dof"]])
     return assemble.assemble(Kg, dof, k)
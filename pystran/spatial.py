@@ -0,0 +1,276 @@
+"""
+Define queries on the locations of the joints.
+
+A k-d tree of the joint coordinates is built on demand and kept in the model
+metadata, so that repeated queries do not need to scan all the joints. The
+tree is discarded whenever joints are added or merged. If the coordinates of
+the joints are modified directly, call :func:`spatial_index` with
+``rebuild=True``.
+"""
+
+from numpy import array, empty, float64
+from scipy.spatial import cKDTree
+from pystran.model import metadata
+
+
+def _joint_coordinates(m):
+    jids = list(m["joints"].keys())
+    X = empty((len(jids), m["dim"]), dtype=float64)
+    for k, j in enumerate(m["joints"].values()):
+        X[k, :] = j["coordinates"]
+    return jids, X
+
+
+def spatial_index(m, rebuild=False):
+    """
+    Retrieve the spatial index of the joints.
+
+    Parameters
+    ----------
+    m
+        The model.
+    rebuild
+        Optional: force the index to be rebuilt (for instance after the
+        coordinates of the joints were changed). Default is ``False``.
+
+    Returns
+    -------
+    tuple of tree, jids, X
+        ``tree`` is a ``scipy.spatial.cKDTree``, ``jids`` is the list of
+        joint identifiers in the order of the points of the tree, and ``X`` is
+        the array of the coordinates (one row per joint).
+    """
+    meta = metadata(m)
+    if rebuild or meta.get("spatial_index") is None:
+        jids, X = _joint_coordinates(m)
+        meta["spatial_index"] = (cKDTree(X), jids, X)
+    return meta["spatial_index"]
+
+
+def find_joint_near(m, point, tol):
+    """
+    Find the joint nearest to a given location.
+
+    Parameters
+    ----------
+    m
+        The model.
+    point
+        Location (list, tuple, or array of coordinates).
+    tol
+        Only joints at most at this distance from ``point`` are considered.
+
+    Returns
+    -------
+    joint identifier or None
+        The identifier of the nearest joint, or ``None`` if there is no joint
+        within the distance ``tol``.
+    """
+    tree, jids, _ = spatial_index(m)
+    if not jids:
+        return None
+    d, k = tree.query(array(point, dtype=float64), k=1, distance_upper_bound=tol)
+    if k >= len(jids):
+        return None
+    return jids[k]
+
+
+def joints_within(m, point, radius):
+    """
+    Find the joints within a sphere (circle in 2D).
+
+    Parameters
+    ----------
+    m
+        The model.
+    point
+        Location of the center (list, tuple, or array of coordinates).
+    radius
+        Radius of the sphere.
+
+    Returns
+    -------
+    list
+        List of the identifiers of the joints, sorted by the distance from
+        ``point``.
+    """
+    tree, jids, X = spatial_index(m)
+    if not jids:
+        return []
+    point = array(point, dtype=float64)
+    ks = tree.query_ball_point(point, radius)
+    ks.sort(key=lambda k: ((X[k] - point) ** 2).sum())
+    return [jids[k] for k in ks]
+
+
+def joints_in_box(m, lower, upper):
+    """
+    Find the joints within an axis-aligned box.
+
+    Parameters
+    ----------
+    m
+        The model.
+    lower
+        Lower corner of the box (minimum coordinates).
+    upper
+        Upper corner of the box (maximum coordinates).
+
+    Returns
+    -------
+    list
+        List of the identifiers of the joints inside the box (boundary
+        included), in the order in which the joints were added to the model.
+    """
+    _, jids, X = spatial_index(m)
+    inside = ((X >= array(lower, dtype=float64)) & (X <= array(upper, dtype=float64))).all(axis=1)
+    return [jids[k] for k in inside.nonzero()[0]]
+
+
+def _check_supports(m, merged):
+    # The supports of each group of merged joints must agree
+    combined = {}
+    for gone, keep in merged.items():
+        supports = combined.setdefault(keep, dict(m["joints"][keep].get("supports", {})))
+        for dof, value in m["joints"][gone].get("supports", {}).items():
+            if dof in supports and supports[dof] != value:
+                raise RuntimeError(f"Conflicting supports of joints {keep} and {gone}")
+            supports[dof] = value
+
+
+def _merge_joint_data(m, keep, gone):
+    if "supports" in gone:
+        supports = keep.setdefault("supports", {})
+        # The rotations supported at both joints are counted only once now
+        dim = len(keep["coordinates"])
+        shared = [d for d in gone["supports"].keys() if d >= dim and d in supports]
+        metadata(m)["rotation_supports"] -= len(shared)
+        supports.update(gone["supports"])
+    for key in ("loads", "masses"):
+        if key in gone:
+            values = keep.setdefault(key, {})
+            for dof, value in gone[key].items():
+                values[dof] = values.get(dof, 0.0) + value
+    if "links" in gone:
+        links = keep.setdefault("links", {})
+        for other, dofs in gone["links"].items():
+            links[other] = links.get(other, []) + dofs
+
+
+def _remap_links(m, merged):
+    # The links refer to the retained joints (a removed joint may be linked
+    # to a joint that is itself removed)
+    for j in m["joints"].values():
+        if "links" in j:
+            links = {}
+            for other, dofs in j["links"].items():
+                other = merged.get(other, other)
+                links[other] = links.get(other, []) + dofs
+            j["links"] = links
+
+
+def _neighbors(m, adjacency, jid):
+    # The joints connected to the joint by a member or by a link
+    neighbors = set()
+    for kind, mid in adjacency.get(jid, []):
+        neighbors.update(m[kind][mid]["connectivity"])
+    neighbors.update(m["joints"][jid].get("links", {}).keys())
+    neighbors.discard(jid)
+    return neighbors
+
+
+def _merge_groups(m, adjacency, jids, pairs):
+    # Group the pairs of coincident joints, but never put two joints that are
+    # connected to each other into the same group, not even through a third
+    # joint close to both
+    root = list(range(len(jids)))
+    members = {}
+    neighbors = {}
+
+    def find(k):
+        while root[k] != k:
+            root[k] = root[root[k]]
+            k = root[k]
+        return k
+
+    for a, b in sorted((min(p), max(p)) for p in pairs):
+        ra, rb = find(a), find(b)
+        if ra == rb:
+            continue
+        for r in (ra, rb):
+            if r not in members:
+                members[r] = {jids[r]}
+                neighbors[r] = _neighbors(m, adjacency, jids[r])
+        if members[ra] & neighbors[rb] or members[rb] & neighbors[ra]:
+            continue
+        # Each group is merged into the joint that was added first
+        ra, rb = min(ra, rb), max(ra, rb)
+        root[rb] = ra
+        members[ra] |= members.pop(rb)
+        neighbors[ra] |= neighbors.pop(rb)
+    return {jids[k]: jids[find(k)] for k in range(len(jids)) if find(k) != k}
+
+
+def merge_coincident_joints(m, tol):
+    """
+    Merge joints that are at the same location.
+
+    Joints closer than ``tol`` to each other are merged into the joint that was
+    added to the model first. The connectivity of the members is rewritten to
+    refer to the retained joints. Supports of merged joints are combined (they
+    must not conflict), loads and masses are added up.
+
+    Joints that are connected to each other by a member (for instance, a
+    spring or a rigid link between two joints at the same location) or linked
+    with :func:`pystran.model.add_dof_links` are intentionally coincident, and
+    are never merged into the same joint, not even when a third joint lies
+    close to both of them.
+
+    The numbering of the degrees of freedom becomes invalid: call
+    :func:`pystran.model.number_dofs` afterwards.
+
+    Parameters
+    ----------
+    m
+        The model.
+    tol
+        Distance tolerance.
+
+    Returns
+    -------
+    dict
+        Dictionary that maps the identifiers of the removed joints to the
+        identifiers of the joints into which they were merged.
+    """
+    tree, jids, X = spatial_index(m, rebuild=True)
+    pairs = tree.query_pairs(tol, output_type="ndarray")
+    if len(pairs) == 0:
+        return {}
+    # Intentionally coincident joints must not be merged
+    adjacency = metadata(m)["adjacency"]
+    merged = _merge_groups(m, adjacency, jids, pairs)
+    if not merged:
+        return {}
+    # Check everything before the model is modified, so that an error leaves
+    # the model as it was
+    _check_supports(m, merged)
+    rewritten = {}
+    for gone in merged.keys():
+        for kind, mid in adjacency.get(gone, []):
+            connectivity = [merged.get(jid, jid) for jid in m[kind][mid]["connectivity"]]
+            # Superelements connect more than two joints
+            if len(connectivity) == 2 and connectivity[0] == connectivity[1]:
+                raise RuntimeError(f"Merging joints would collapse member {mid}")
+            rewritten[(kind, mid)] = connectivity
+    # Rewrite the connectivity of the members attached to the removed joints
+    for (kind, mid), connectivity in rewritten.items():
+        m[kind][mid]["connectivity"] = connectivity
+    _remap_links(m, merged)
+    for gone, keep in merged.items():
+        _merge_joint_data(m, m["joints"][keep], m["joints"][gone])
+        adjacency[keep] = adjacency.get(keep, []) + adjacency.pop(gone, [])
+        del m["joints"][gone]
+    meta = metadata(m)
+    meta["spatial_index"] = None
+    meta["geometry"] = None
+    return merged
@@ -0,0 +1,243 @@
+r"""
+Define superelements obtained by the Craig-Bampton reduction.
+
+A sub-model (a model of a component of the structure) is reduced to the
+degrees of freedom of its boundary joints, plus the amplitudes of a number of
+the fixed-interface modes. The displacements of the free degrees of freedom
+of the sub-model are approximated as
+
+.. math::
+    \left[ \begin{array}{c} U_b \\ U_i \end{array}\right] =
+    \left[ \begin{array}{cc} I & 0 \\ \Psi & \Phi \end{array}\right] \cdot
+    \left[ \begin{array}{c} U_b \\ q \end{array}\right]
+
+where :math:`U_b` are the boundary degrees of freedom, :math:`U_i` are the
+interior degrees of freedom, :math:`\Psi = -K_{ii}^{-1} K_{ib}` are the
+constraint modes (static response of the interior to the motion of the
+boundary), and :math:`\Phi` are the lowest modes of the sub-model with the
+boundary fixed, normalized with respect to the mass matrix.
+
+The reduced matrices can be saved to a file and loaded again, so that the
+components that did not change need not be reduced again. The superelement
+is added to a model with :func:`pystran.model.add_superelement`.
+"""
+
+import os
+import hashlib
+from math import pi
+from numpy import array, asarray, zeros, ones, arange, int64, savez, load
+from scipy.linalg import eigh, cho_factor, cho_solve
+from pystran.model import build_stiffness_matrix, build_mass_matrix, ndof_per_joint
+from pystran.model import superelement_dofs
+
+
+def _fingerprint(Kff, Mff, boundary, nmodes):
+    h = hashlib.sha1()
+    for a in (Kff, Mff, asarray(boundary, dtype=int64)):
+        h.update(a.tobytes())
+    h.update(str(nmodes).encode())
+    return h.hexdigest()
+
+
+def save_superelement(se, filename):
+    """
+    Save a superelement to a file.
+
+    The file is in the ``.npz`` format of numpy. The joint identifiers must be
+    either all numbers, or all strings.
+
+    Parameters
+    ----------
+    se
+        The superelement.
+    filename
+        Name of the file.
+
+    Returns
+    -------
+    None
+    """
+    savez(
+        filename,
+        joints=array(se["joints"]),
+        boundary=se["boundary"],
+        K=se["K"],
+        M=se["M"],
+        T=se["T"],
+        frequencies=se["frequencies"],
+        dim=se["dim"],
+        rotations=se["rotations"],
+        fingerprint=se["fingerprint"],
+    )
+    return None
+
+
+def load_superelement(filename):
+    """
+    Load a superelement from a file.
+
+    Parameters
+    ----------
+    filename
+        Name of the file written by :func:`save_superelement`.
+
+    Returns
+    -------
+    dict
+        The superelement.
+    """
+    with load(filename, allow_pickle=False) as data:
+        se = dict(
+            joints=data["joints"].tolist(),
+            boundary=data["boundary"],
+            K=data["K"],
+            M=data["M"],
+            T=data["T"],
+            frequencies=data["frequencies"],
+            dim=int(data["dim"]),
+            rotations=bool(data["rotations"]),
+            fingerprint=str(data["fingerprint"]),
+        )
+    se["nmodes"] = len(se["frequencies"])
+    return se
+
+
+def craig_bampton(sub, boundary_joints, nmodes, filename=None):
+    """
+    Reduce a sub-model to a superelement (Craig-Bampton method).
+
+    :func:`pystran.model.number_dofs` must be called for the sub-model before
+    this function. All the free degrees of freedom of the boundary joints are
+    retained as the boundary degrees of freedom of the superelement. The
+    sub-model may have supports of its own.
+
+    When ``filename`` is given and the file exists, the superelement is loaded
+    from the file, provided it was computed from the same stiffness and mass
+    matrices, the same boundary and the same number of modes; otherwise the
+    reduction is computed and saved to the file.
+
+    Parameters
+    ----------
+    sub
+        The sub-model.
+    boundary_joints
+        The list of the identifiers of the boundary joints of the sub-model.
+    nmodes
+        The number of the fixed-interface modes to retain.
+    filename
+        Optional: the name of the cache file (``.npz``).
+
+    Returns
+    -------
+    dict
+        The superelement, with the keys ``"joints"`` (the boundary joints),
+        ``"boundary"`` (array of the pairs of the position of the joint in
+        ``"joints"`` and the degree of freedom at the joint), ``"K"``,
+        ``"M"`` (the reduced matrices, boundary degrees of freedom first),
+        ``"T"`` (the transformation from the reduced degrees of freedom to
+        the free degrees of freedom of the sub-model), ``"frequencies"``
+        (of the fixed-interface modes), ``"nmodes"``, ``"dim"``,
+        ``"rotations"`` (are there rotational degrees of freedom at the
+        joints?), and ``"fingerprint"``.
+
+    See Also
+    --------
+    :func:`pystran.model.add_superelement`
+    :func:`expand_superelement`
+    """
+    if not ("nfreedof" in sub) or sub["nfreedof"] <= 0:
+        raise RuntimeError("No free degrees of freedom: the sub-model needs to be numbered")
+    nf = sub["nfreedof"]
+    boundary = []
+    for k, jid in enumerate(boundary_joints):
+        for d, gr in enumerate(sub["joints"][jid]["dof"]):
+            if gr < nf:
+                boundary.append((k, d))
+    boundary = array(boundary, dtype=int64).reshape(-1, 2)
+    b = array([sub["joints"][boundary_joints[k]]["dof"][d] for k, d in boundary], dtype=int64)
+
+    K = build_stiffness_matrix(sub)[0:nf, 0:nf]
+    M = build_mass_matrix(sub)[0:nf, 0:nf]
+    fingerprint = _fingerprint(K, M, b, nmodes)
+    if filename is not None and os.path.exists(filename):
+        se = load_superelement(filename)
+        if se["fingerprint"] == fingerprint:
+            return se
+
+    interior = ones(nf, dtype=bool)
+    interior[b] = False
+    i = arange(nf)[interior]
+    if nmodes > len(i):
+        raise ValueError(f"At most {len(i)} fixed-interface modes are available")
+    Kii = K[i, :][:, i]
+    Kib = K[i, :][:, b]
+    # Constraint modes
+    Psi = -cho_solve(cho_factor(Kii), Kib)
+    # Fixed-interface modes
+    if nmodes > 0:
+        eigvals, Phi = eigh(Kii, M[i, :][:, i], subset_by_index=[0, nmodes - 1])
+    else:
+        eigvals, Phi = zeros(0), zeros((len(i), 0))
+    nb = len(b)
+    T = zeros((nf, nb + nmodes))
+    T[b, arange(nb)] = 1.0
+    T[i, 0:nb] = Psi
+    T[i, nb:] = Phi
+    Kr = T.T @ K @ T
+    Mr = T.T @ M @ T
+    se = dict(
+        joints=list(boundary_joints),
+        boundary=boundary,
+        K=(Kr + Kr.T) / 2,
+        M=(Mr + Mr.T) / 2,
+        T=T,
+        frequencies=eigvals.clip(0.0) ** 0.5 / (2 * pi),
+        nmodes=nmodes,
+        dim=sub["dim"],
+        rotations=ndof_per_joint(sub) > sub["dim"],
+        fingerprint=fingerprint,
+    )
+    if filename is not None:
+        save_superelement(se, filename)
+    return se
+
+
+def expand_superelement(m, sid, sub, V=None):
+    """
+    Recover the displacements of the sub-model from the solution of the
+    model into which the superelement was assembled.
+
+    The displacements of the free degrees of freedom of the sub-model are
+    computed from the boundary and modal degrees of freedom of the
+    superelement, and they are stored in the joints of the sub-model (as
+    ``j["displacements"]``).
+
+    Parameters
+    ----------
+    m
+        The model with the superelement.
+    sid
+        The identifier of the superelement.
+    sub
+        The sub-model from which the superelement was reduced (its numbering
+        of the degrees of freedom must be unchanged).
+    V
+        Optional: a vector of all the degrees of freedom of the model (for
+        instance, a mode shape padded with zeros for the prescribed degrees
+        of freedom). Default is the displacement vector ``m["U"]``.
+
+    Returns
+    -------
+    array
+        The vector of all the degrees of freedom of the sub-model.
+    """
+    s = m["superelements"][sid]
+    se = s["superelement"]
+    if V is None:
+        V = m["U"]
+    nfs = se["T"].shape[0]
+    U = zeros(sub["ntotaldof"])
+    U[0:nfs] = se["T"] @ asarray(V)[superelement_dofs(m, s)]
+    for joint in sub["joints"].values():
+        joint["displacements"] = U[joint["dof"]]
+    return U
@@ -2,7 +2,7 @@
 Define truss mechanical quantities.
 """
 
-from numpy import reshape, outer, concatenate, zeros, dot, array
+from numpy import reshape, outer, concatenate, zeros, dot, array, full
 from pystran import geometry
 from pystran import assemble
 from pystran import gauss
@@ -163,7 +163,7 @@ def truss_strain_displacement(e_x, h):
     return reshape(concatenate((-e_x / h, e_x / h)), (1, 2 * len(e_x)))
 
 
-def assemble_stiffness(Kg, member, i, j):
+def assemble_stiffness(Kg, member, i, j, geom=None):
     """
     Assemble truss stiffness matrix.
 
@@ -177,6 +177,9 @@ def assemble_stiffness(Kg, member, i, j):
         Dictionary that defines the data of the first joint of the member.
     j
         Dictionary that defines the data of the second joint of the member.
+    geom
+        Optional: the geometry of the member (refer to
+        :func:`pystran.geometry.member_geometry`).
 
     Returns
     -------
@@ -195,15 +198,15 @@ def assemble_stiffness(Kg, member, i, j):
         raise ValueError("Area must be positive")
     dim = len(i["coordinates"])
     if dim == 2:
-        e_x, _, h = geometry.member_2d_geometry(i, j)
+        e_x, _, h = geometry.member_geometry(member, i, j, geom)
     else:
-        e_x, _, _, h = geometry.member_3d_geometry(i, j, None, None)
+        e_x, _, _, h = geometry.member_geometry(member, i, j, geom)
     k = truss_stiffness(e_x, h, E, A)
     dof = concatenate([i["dof"][0:dim], j["dof"][0:dim]])
     return assemble.assemble(Kg, dof, k)
 
 
-def assemble_mass(Mg, member, i, j):
+def assemble_mass(Mg, member, i, j, geom=None):
     """
     Assemble truss mass matrix.
 
@@ -217,6 +220,9 @@ def assemble_mass(Mg, member, i, j):
         Dictionary that defines the data of the first joint of the member.
     j
         Dictionary that defines the data of the second joint of the member.
+    geom
+        Optional: the geometry of the member (refer to
+        :func:`pystran.geometry.member_geometry`).
 
     Returns
     -------
@@ -235,16 +241,87 @@ def assemble_mass(Mg, member, i, j):
         raise ValueError("Area must be positive")
     dim = len(i["coordinates"])
     if dim == 2:
-        e_x, e_z, h = geometry.member_2d_geometry(i, j)
+        e_x, e_z, h = geometry.member_geometry(member, i, j, geom)
         m = truss_2d_mass(e_x, e_z, h, rho, A)
     else:
-        e_x, e_y, e_z, h = geometry.member_3d_geometry(i, j, None, None)
+        e_x, e_y, e_z, h = geometry.member_geometry(member, i, j, geom)
         m = truss_3d_mass(e_x, e_y, e_z, h, rho, A)
     dim = len(e_x)
     dof = concatenate([i["dof"][0:dim], j["dof"][0:dim]])
     return assemble.assemble(Mg, dof, m)
 
 
+def truss_lumped_mass(e_x, h, rho, A):
+    r"""
+    Compute truss lumped (diagonal) mass matrix.
+
+    Half of the mass of the member, :math:`\rho A h`, is assigned to each
+    joint, in each direction. The row-sum lumping and the HRZ lumping give the
+    same diagonal for a truss member.
+
+    Parameters
+    ----------
+    e_x
+        Unit vector of the local cartesian coordinate system in the direction
+        of the axis of the beam.
+    h
+        Length of the beam.
+    rho
+        Mass density of the material.
+    A
+        Area of the cross section.
+
+    Returns
+    -------
+    array
+        Diagonal of the member mass matrix (a vector).
+    """
+    return full(2 * len(e_x), rho * A * h / 2)
+
+
+def assemble_lumped_mass(mg, member, i, j, geom=None):
+    """
+    Assemble truss lumped mass matrix.
+
+    Parameters
+    ----------
+    mg
+        Diagonal of the global structural mass matrix (a vector).
+    member
+        Dictionary that defines the data of the member.
+    i
+        Dictionary that defines the data of the first joint of the member.
+    j
+        Dictionary that defines the data of the second joint of the member.
+    geom
+        Optional: the geometry of the member (refer to
+        :func:`pystran.geometry.member_geometry`).
+
+    Returns
+    -------
+    array
+        Updated global vector is returned.
+
+    See Also
+    --------
+    :func:`truss_lumped_mass`
+    """
+    sect = member["section"]
+    rho, A = sect["rho"], sect["A"]
+    if rho <= 0.0:
+        raise ValueError("Mass density must be positive")
+    if A <= 0.0:
+        raise ValueError("Area must be positive")
+    dim = len(i["coordinates"])
+    if dim == 2:
+        e_x, _, h = geometry.member_geometry(member, i, j, geom)
+    else:
+        e_x, _, _, h = geometry.member_geometry(member, i, j, geom)
+    dof = concatenate([i["dof"][0:dim], j["dof"][0:dim]])
+    mg[dof] += truss_lumped_mass(e_x, h, rho, A)
+    return mg
+
+
 def truss_axial_force(member, i, j, xi):
     r"""
     Compute truss axial force based on the displacements stored at the joints.
@@ -252,7 +329,9 @@ def truss_axial_force(member, i, j, xi):
     The force is computed as :math:`N = EA B U`, where :math:`B` is the
     strain-displacement matrix (computed by :func:`truss_strain_displacement`),
     :math:`U` is the displacement vector (so that :math:`\varepsilon  = BU` is
-    the axial strain), and :math:`EA` is the axial stiffness.
+    the axial strain), and :math:`EA` is the axial stiffness. The force of the
+    fixed-end state of the thermal load is added (refer to
+    :func:`pystran.memberloads.set_fixed_end_state`).
 
     Parameters
     ----------
@@ -275,14 +354,17 @@ def truss_axial_force(member, i, j, xi):
     E, A = sect["E"], sect["A"]
     dim = len(i["coordinates"])
     if dim == 2:
-        e_x, _, h = geometry.member_2d_geometry(i, j)
+        e_x, _, h = geometry.member_geometry(member, i, j)
         ui, uj = i["displacements"][0:2], j["displacements"][0:2]
     else:
-        e_x, _, _, h = geometry.member_3d_geometry(i, j, None, None)
+        e_x, _, _, h = geometry.member_geometry(member, i, j)
         ui, uj = i["displacements"][0:3], j["displacements"][0:3]
     u = concatenate([ui, uj])
     B = truss_strain_displacement(e_x, h)
     N = (E * A * dot(B, u))[0]
+    if "fixed_end" in member:
+        # The thermal load (refer to pystran.memberloads.set_fixed_end_state)
+        N += member["fixed_end"]["forces"][0]
     return N
 
 
@@ -307,8 +389,8 @@ def truss_volume(member, i, j):
     truss_is_2d = len(i["coordinates"]) == len(j["coordinates"]) == 2
     A = member["section"]["A"]
     if truss_is_2d:
-        _, _, h = geometry.member_2d_geometry(i, j)
+        _, _, h = geometry.member_geometry(member, i, j)
         return A * h
     else:
-        _, _, _, h = geometry.member_3d_geometry(i, j, None, None)
+        _, _, _, h = geometry.member_geometry(member, i, j)
         return A * h
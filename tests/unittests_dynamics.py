@@ -0,0 +1,368 @@
+"""
+pystran unit tests
+"""
+
+import unittest
+
+import context
+import os
+import tempfile
+import numpy
+from math import sqrt, pi, cos, sin
+from numpy import array, dot, outer, concatenate, arange
+from numpy.linalg import norm
+from pystran import model
+from pystran import section
+from pystran import dynamics
+from pystran import resultants
+
+
+def _oscillator(k, mass):
+    # A single-degree-of-freedom oscillator: a mass on an extension spring.
+    m = model.create(2)
+    freedoms = m["freedoms"]
+    model.add_joint(m, 1, [0.0, 0.0])
+    model.add_joint(m, 2, [1.0, 0.0])
+    model.add_support(m["joints"][1], freedoms.TRANSLATION_DOFS)
+    model.add_support(m["joints"][2], freedoms.U2)
+    s = section.spring_section("s", "extension", [1.0, 0.0], k)
+    model.add_spring_member(m, 1, [1, 2], s)
+    model.add_mass(m["joints"][2], freedoms.U1, mass)
+    return m
+
+
+def _chain(n, k, mass):
+    # A chain of n masses connected by extension springs, fixed at one end.
+    m = model.create(2)
+    freedoms = m["freedoms"]
+    for jid in range(1, n + 2):
+        model.add_joint(m, jid, [float(jid - 1), 0.0])
+        model.add_support(m["joints"][jid], freedoms.U2)
+    model.add_support(m["joints"][1], freedoms.U1)
+    s = section.spring_section("s", "extension", [1.0, 0.0], k)
+    for jid in range(1, n + 1):
+        model.add_spring_member(m, jid, [jid, jid + 1], s)
+        model.add_mass(m["joints"][jid + 1], freedoms.U1, mass)
+    return m
+
+
+class UnitTestsDynamics(unittest.TestCase):
+
+    def test_newmark_step_load_oscillator(self):
+        """
+        A step load applied to an undamped oscillator: the displacement is
+        :math:`u(t) = F/k (1 - \\cos \\omega t)`.
+        """
+        k, mass, F = 100.0, 2.0, 3.0
+        omega = sqrt(k / mass)
+        m = _oscillator(k, mass)
+        freedoms = m["freedoms"]
+        dynamics.add_load_history(m["joints"][2], freedoms.U1, lambda t: F)
+        model.number_dofs(m)
+        T = 2 * pi / omega
+        dt = T / 400
+        nsteps = 800
+        dynamics.solve_transient(m, dt, nsteps)
+        u = m["displacement_history"][:, 0]
+        for n in [0, 100, 200, 300, 800]:
+            t = m["times"][n]
+            exact = F / k * (1 - cos(omega * t))
+            if abs(u[n] - exact) > 1.0e-3 * F / k:
+                raise ValueError("Incorrect displacement")
+
+        # Numerical dissipation and damping reduce the response: the peak is
+        # below the undamped one.
+        dynamics.solve_transient(m, dt, nsteps, alpha=-0.1, damping=(0.5, 0.0))
+        u = m["displacement_history"][:, 0]
+        if not (F / k < u.max() < 2 * F / k):
+            raise ValueError("Incorrect damped response")
+
+    def test_newmark_massless_dof(self):
+        """
+        A mass on two springs in series: the joint between the springs has no
+        mass, so the mass matrix is singular.
+        """
+        k1, k2, mass, F = 300.0, 150.0, 2.0, 3.0
+        k = k1 * k2 / (k1 + k2)
+        omega = sqrt(k / mass)
+        m = model.create(2)
+        freedoms = m["freedoms"]
+        for jid in range(1, 4):
+            model.add_joint(m, jid, [float(jid - 1), 0.0])
+            model.add_support(m["joints"][jid], freedoms.U2)
+        model.add_support(m["joints"][1], freedoms.U1)
+        s1 = section.spring_section("s1", "extension", [1.0, 0.0], k1)
+        s2 = section.spring_section("s2", "extension", [1.0, 0.0], k2)
+        model.add_spring_member(m, 1, [1, 2], s1)
+        model.add_spring_member(m, 2, [2, 3], s2)
+        model.add_mass(m["joints"][3], freedoms.U1, mass)
+        dynamics.add_load_history(m["joints"][3], freedoms.U1, lambda t: F)
+        model.number_dofs(m)
+        T = 2 * pi / omega
+        dynamics.solve_transient(m, T / 400, 400, dofs=[m["joints"][3]["dof"][freedoms.U1]])
+        u = m["displacement_history"][:, 0]
+        for n in [100, 200, 400]:
+            exact = F / k * (1 - cos(omega * m["times"][n]))
+            if abs(u[n] - exact) > 1.0e-3 * F / k:
+                raise ValueError("Incorrect displacement")
+
+    def test_newmark_tabulated_history(self):
+        """
+        A triangular pulse given as a table: after the pulse the oscillator
+        vibrates freely with a constant amplitude (no damping).
+        """
+        k, mass = 100.0, 2.0
+        m = _oscillator(k, mass)
+        freedoms = m["freedoms"]
+        dynamics.add_load_history(
+            m["joints"][2], freedoms.U1, ([0.0, 0.05, 0.1], [0.0, 10.0, 0.0])
+        )
+        model.number_dofs(m)
+        out = array([[0.0]] * 2001)
+        dynamics.solve_transient(m, 0.001, 2000, out=out)
+        if m["displacement_history"] is not out:
+            raise ValueError("Output array not used")
+        u = out[:, 0]
+        if abs(abs(u[200:]).max() - abs(u[1000:]).max()) > 1.0e-3 * abs(u).max():
+            raise ValueError("Amplitude of free vibration must be constant")
+
+    def test_modal_transient_matches_direct_integration(self):
+        """
+        With all the modes retained and no damping, the modal superposition
+        reproduces the direct integration (both use the trapezoidal rule).
+        """
+        m = _chain(4, 100.0, 2.0)
+        freedoms = m["freedoms"]
+        dynamics.add_load_history(
+            m["joints"][5], freedoms.U1, ([0.0, 0.2, 0.4], [0.0, 10.0, 0.0])
+        )
+        model.number_dofs(m)
+        model.solve_free_vibration(m)
+        dofs = [m["joints"][5]["dof"][freedoms.U1], m["joints"][5]["dof"][freedoms.U2]]
+        dynamics.solve_transient(m, 0.01, 300, dofs=dofs)
+        direct = m["displacement_history"].copy()
+        dynamics.solve_modal_transient(m, 0.01, 300, dofs=dofs)
+        modal = m["displacement_history"]
+        if norm(modal - direct) > 1.0e-9 * norm(direct):
+            raise ValueError("Modal and direct integration disagree")
+        if norm(modal[:, 1]) != 0.0:
+            raise ValueError("Prescribed degree of freedom must not move")
+
+        # A slowly applied load: one mode with the static correction is
+        # close to the full solution, one mode without it is not.
+        m = _chain(4, 100.0, 2.0)
+        dynamics.add_load_history(
+            m["joints"][3], freedoms.U1, ([0.0, 20.0], [0.0, 10.0])
+        )
+        model.number_dofs(m)
+        model.solve_free_vibration(m)
+        dynamics.solve_modal_transient(m, 0.05, 400)
+        full = m["displacement_history"].copy()
+        dynamics.solve_modal_transient(m, 0.05, 400, nmodes=1)
+        truncated = m["displacement_history"].copy()
+        dynamics.solve_modal_transient(m, 0.05, 400, nmodes=1, static_correction=True)
+        corrected = m["displacement_history"]
+        if norm(corrected - full) > 0.1 * norm(truncated - full):
+            raise ValueError("Static correction ineffective")
+
+    def test_modal_harmonic_response(self):
+        """
+        Harmonic response by modal superposition against the direct solution.
+        """
+        m = _chain(3, 100.0, 2.0)
+        freedoms = m["freedoms"]
+        model.add_load(m["joints"][4], freedoms.U1, 1.0)
+        model.number_dofs(m)
+        model.solve_free_vibration(m)
+        nf = m["nfreedof"]
+        K = m["K"][0:nf, 0:nf]
+        M = m["M"][0:nf, 0:nf]
+        F = dynamics._load_vector(m)
+        frequencies = [0.1, 0.7, 1.3]
+        U = dynamics.modal_harmonic_response(m, frequencies)
+        if U.shape != (3, nf):
+            raise ValueError("Incorrect shape")
+        for k, f in enumerate(frequencies):
+            W = 2 * pi * f
+            Ud = numpy.linalg.solve(K - W**2 * M, F)
+            if norm(U[k] - Ud) > 1.0e-9 * norm(Ud):
+                raise ValueError("Incorrect harmonic response")
+        # At zero frequency one mode with the static correction is exact
+        U = dynamics.modal_harmonic_response(
+            m, [0.0], damping_ratios=0.05, nmodes=1, static_correction=True
+        )
+        Us = numpy.linalg.solve(K, F)
+        if norm(U[0] - Us) > 1.0e-9 * norm(Us):
+            raise ValueError("Incorrect static correction")
+
+    def test_frequency_response_sweep(self):
+        """
+        Frequency response by the direct sparse method, in parallel chunks,
+        and by the modal method.
+        """
+        m = _chain(20, 100.0, 2.0)
+        freedoms = m["freedoms"]
+        model.add_load(m["joints"][21], freedoms.U1, 1.0)
+        model.number_dofs(m)
+        nf = m["nfreedof"]
+        damping = (0.1, 0.001)
+        frequencies = numpy.linspace(0.0, 2.0, 41)
+        dofs = [m["joints"][11]["dof"][freedoms.U1], m["joints"][21]["dof"][freedoms.U1]]
+        U = dynamics.frequency_response(m, frequencies, damping=damping, dofs=dofs)
+        if U.shape != (41, 2):
+            raise ValueError("Incorrect shape")
+        K = model.build_stiffness_matrix(m)[0:nf, 0:nf]
+        M = model.build_mass_matrix(m)[0:nf, 0:nf]
+        C = damping[0] * M + damping[1] * K
+        F = dynamics._load_vector(m)
+        for k in [0, 13, 40]:
+            W = 2 * pi * frequencies[k]
+            Ud = numpy.linalg.solve(K - W**2 * M + 1j * W * C, F)[dofs]
+            if norm(U[k] - Ud) > 1.0e-9 * norm(Ud):
+                raise ValueError("Incorrect direct response")
+        Up = dynamics.frequency_response(
+            m, frequencies, damping=damping, dofs=dofs, workers=3
+        )
+        if norm(Up - U) > 1.0e-12 * norm(U):
+            raise ValueError("Parallel sweep disagrees")
+        model.solve_free_vibration(m)
+        Um = dynamics.frequency_response(
+            m, frequencies, method="modal", damping=damping, dofs=dofs, workers=2
+        )
+        if norm(Um - U) > 1.0e-9 * norm(U):
+            raise ValueError("Modal sweep disagrees")
+        # Truncated modes with the static correction, in parallel chunks
+        Ut = dynamics.frequency_response(
+            m, frequencies, method="modal", damping_ratios=0.02, nmodes=5, dofs=dofs, workers=2
+        )
+        Ur = dynamics.modal_harmonic_response(m, frequencies, 0.02, 5, True, dofs)
+        if norm(Ut - Ur) > 1.0e-12 * norm(Ur):
+            raise ValueError("Truncated modal sweep disagrees")
+
+    def test_response_spectrum(self):
+        """
+        Response spectrum analysis of an oscillator, and of a cantilever
+        column modeled with beams.
+        """
+        k, mass = 100.0, 2.0
+        m = _oscillator(k, mass)
+        model.number_dofs(m)
+        model.solve_free_vibration(m)
+        freedoms = m["freedoms"]
+        results = dynamics.response_spectrum(m, lambda f: 3.0, freedoms.U1)
+        if abs(results["total_mass"] - mass) > 1.0e-12:
+            raise ValueError("Incorrect total mass")
+        if abs(results["displacements"][0] - 3.0 / (k / mass)) > 1.0e-12:
+            raise ValueError("Incorrect displacement")
+        if abs(results["reactions"][1][freedoms.U1] - 3.0 * mass) > 1.0e-12:
+            raise ValueError("Incorrect reaction")
+
+        m = model.create(2)
+        freedoms = m["freedoms"]
+        for jid in range(1, 6):
+            model.add_joint(m, jid, [0.0, float(jid - 1)])
+        model.add_support(m["joints"][1], freedoms.ALL_DOFS)
+        s = section.beam_2d_section("s", E=2.0e11, A=1.0e-2, I=1.0e-4, rho=7850.0)
+        for mid in range(1, 5):
+            model.add_beam_member(m, mid, [mid, mid + 1], s)
+        model.add_mass(m["joints"][5], freedoms.U1, 500.0)
+        model.number_dofs(m)
+        model.solve_free_vibration(m)
+        spectrum = ([0.0, 1.0, 10.0, 100.0], [2.0, 5.0, 5.0, 1.0])
+        _, effective_masses, total_mass = dynamics.participation_factors(m, freedoms.U1)
+        if abs(effective_masses.sum() - total_mass) > 1.0e-9 * total_mass:
+            raise ValueError("Effective masses must add up to the total mass")
+        # The mass at the support does not move
+        if not (500.0 + 7850.0 * 1.0e-2 * 3 < total_mass < 500.0 + 7850.0 * 1.0e-2 * 4):
+            raise ValueError("Incorrect total mass")
+        for method in ["SRSS", "CQC"]:
+            results = dynamics.response_spectrum(
+                m, spectrum, [1.0, 0.0], method=method, nmodes=6
+            )
+            # The moment at the bottom of the column is the moment reaction.
+            Mb = results["end_forces"]["beam_members"][1]["Myi"]
+            R = results["reactions"][1][freedoms.UR3]
+            if abs(Mb - R) > 1.0e-6 * R:
+                raise ValueError("End forces and reactions disagree")
+        Y = results["modal_displacements"]
+        if Y.shape != (m["ntotaldof"], 6):
+            raise ValueError("Incorrect shape")
+
+        # A truss brace with the same identifier as a beam
+        model.add_joint(m, 6, [2.0, 2.0])
+        model.add_support(m["joints"][6], freedoms.ALL_DOFS)
+        model.add_truss_member(m, 1, [3, 6], section.truss_section("t", E=2.0e11, A=1.0e-4, rho=7850.0))
+        model.number_dofs(m)
+        model.solve_free_vibration(m)
+        results = dynamics.response_spectrum(m, spectrum, freedoms.U1, nmodes=6)
+        frequencies = numpy.sqrt(m["eigvals"][0:6]) / (2 * pi)
+        modal = resultants.end_forces(m, results["modal_displacements"])
+        for kind, name in [("truss_members", "N"), ("beam_members", "Myi")]:
+            r = modal[kind]
+            forces = r["forces"][r["mids"].index(1), r["keys"].index(name)]
+            expected = dynamics.modal_combination(forces, frequencies, 0.05, "CQC")
+            if abs(results["end_forces"][kind][1][name] - expected) > 1.0e-9 * abs(expected):
+                raise ValueError("End forces of the members of different kinds mixed up")
+        if set(results["end_forces"]["truss_members"][1].keys()) != {"N"}:
+            raise ValueError("Incorrect end forces of the truss")
+
+    def test_explicit_central_difference(self):
+        """
+        Explicit integration of the oscillator with a step load, and of a
+        cantilever beam against the modal superposition with the same lumped
+        mass.
+        """
+        k, mass, F = 100.0, 2.0, 3.0
+        omega = sqrt(k / mass)
+        m = _oscillator(k, mass)
+        freedoms = m["freedoms"]
+        dynamics.add_load_history(m["joints"][2], freedoms.U1, lambda t: F)
+        model.number_dofs(m)
+        dtc = dynamics.critical_time_step(m)
+        if not (0.5 * 2 / omega < dtc <= 2 / omega):
+            raise ValueError("Incorrect critical time step")
+        dynamics.solve_explicit(m, 2000, dt=0.001)
+        u = m["displacement_history"][:, 0]
+        t = m["times"]
+        exact = F / k * (1 - numpy.cos(omega * t))
+        if abs(u - exact).max() > 1.0e-3 * F / k:
+            raise ValueError("Incorrect displacement")
+
+        E, rho, b, h, L = 2.0e11, 7850.0, 0.05, 0.1, 2.0
+        s = section.beam_2d_section("s", E=E, rho=rho, A=b * h, I=b * h**3 / 12)
+        m = model.create(2)
+        model.add_joint(m, 1, [0.0, 0.0])
+        model.add_joint(m, 2, [L, 0.0])
+        model.add_support(m["joints"][1], freedoms.ALL_DOFS)
+        model.add_beam_member(m, 1, [1, 2], s)
+        model.refine_member(m, 1, 10)
+        tip = m["joints"][2]
+        dynamics.add_load_history(tip, freedoms.U2, ([0.0, 0.002, 0.004], [0.0, 1.0e3, 0.0]))
+        model.number_dofs(m)
+        model.solve_free_vibration(m, lumping="HRZ")
+        dtc = dynamics.critical_time_step(m)
+        if not (0.5 * 2 / sqrt(m["eigvals"][-1]) < dtc <= 2 / sqrt(m["eigvals"][-1])):
+            raise ValueError("Incorrect critical time step")
+        dof = tip["dof"][freedoms.U2]
+        nsteps = int(0.02 / dtc) + 1
+        dt = 0.02 / nsteps
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, "history.npy")
+            dynamics.solve_explicit(m, nsteps, dt=dt, dofs=[dof], every=10, filename=filename)
+            explicit = numpy.load(filename)[:, 0]
+            if len(explicit) != nsteps // 10 + 1:
+                raise ValueError("Incorrect decimation")
+            times = m["times"]
+            del m["displacement_history"]
+        dynamics.solve_modal_transient(m, dt, nsteps, dofs=[dof])
+        modal = m["displacement_history"][::10, 0]
+        if abs(explicit - modal).max() > 1.0e-2 * abs(modal).max():
+            raise ValueError("Explicit and modal solutions disagree")
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
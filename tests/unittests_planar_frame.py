@@ -5,8 +5,11 @@ pystran unit tests
 import unittest
 
 import context
+import os
+import tempfile
+import numpy
 from math import sqrt, pi, cos, sin
-from numpy import array, dot, outer, concatenate
+from numpy import array, dot, outer, concatenate, eye
 from numpy.linalg import norm
 from pystran import model
 from pystran import section
@@ -14,6 +17,13 @@ from pystran import geometry
 from pystran import beam
 from pystran import truss
 from pystran import rotation
+from pystran import superelement
+from pystran import eigen
+from pystran import resultants
+from pystran import loadcases
+from pystran import memberloads
+from pystran import influence
+from pystran import spatial
 
 
 class UnitTestsPlanarFrames(unittest.TestCase):
@@ -455,6 +465,790 @@ class UnitTestsPlanarFrames(unittest.TestCase):
         #     )
         #     plots.show(m)
 
+    def test_model_metadata(self):
+        """
+        The metadata of the model is maintained by the functions that add and
+        refine members.
+        """
+        m = model.create(2)
+        freedoms = m["freedoms"]
+        model.add_joint(m, 1, [0.0, 0.0])
+        model.add_joint(m, 2, [1.0, 0.0])
+        model.add_joint(m, 3, [1.0, 1.0])
+        st = section.truss_section("st", E=1.0, A=1.0)
+        model.add_truss_member(m, 1, [1, 2], st)
+        model.add_truss_member(m, 2, [2, 3], st)
+        if model.ndof_per_joint(m) != 2:
+            raise ValueError("Incorrect number of degrees of freedom per joint")
+        model.add_support(m["joints"][1], freedoms.UR3)
+        if model.ndof_per_joint(m) != 3:
+            raise ValueError("Rotation support not detected")
+        model.add_support(m["joints"][1], freedoms.ALL_DOFS)
+        model.add_support(m["joints"][2], freedoms.U2)
+        if m["metadata"]["rotation_supports"] != 1:
+            raise ValueError("Incorrect count of the supported rotations")
+        model.number_dofs(m)
+        if len(m["joints"][3]["dof"]) != 3:
+            raise ValueError("Incorrect numbering with a rotation support")
+        model.remove_supports(m)
+        if model.ndof_per_joint(m) != 2 or m["metadata"]["rotation_supports"] != 0:
+            raise ValueError("Rotation support not removed")
+
+        sb = section.beam_2d_section("sb", E=1.0, A=1.0, I=1.0)
+        model.add_beam_member(m, 3, [1, 3], sb)
+        model.refine_member(m, 3, 2)
+        meta = m["metadata"]
+        if meta["counts"]["truss_members"] != 2 or meta["counts"]["beam_members"] != 2:
+            raise ValueError("Incorrect member counts")
+        if model.ndof_per_joint(m) != 3:
+            raise ValueError("Incorrect number of degrees of freedom per joint")
+        if sorted(meta["adjacency"][2]) != [("truss_members", 1), ("truss_members", 2)]:
+            raise ValueError("Incorrect adjacency")
+        if meta["adjacency"][1] != [("truss_members", 1), ("beam_members", "3m0")]:
+            raise ValueError("Incorrect adjacency")
+        # Coincident joints supported in the same rotation are merged
+        model.add_joint(m, 4, [1.0, 1.0])
+        model.add_support(m["joints"][3], freedoms.ALL_DOFS)
+        model.add_support(m["joints"][4], freedoms.ALL_DOFS)
+        spatial.merge_coincident_joints(m, 1.0e-9)
+        if meta["rotation_supports"] != 1:
+            raise ValueError("Incorrect count of the supported rotations")
+
+    def test_lumped_mass_cantilever(self):
+        """
+        Cantilever beam: frequencies with the consistent and lumped mass.
+        """
+        E, rho, b, h, L = 2.0e11, 7850.0, 0.05, 0.1, 2.0
+        s = section.beam_2d_section("s", E=E, rho=rho, A=b * h, I=b * h**3 / 12)
+        m = model.create(2)
+        freedoms = m["freedoms"]
+        model.add_joint(m, 1, [0.0, 0.0])
+        model.add_joint(m, 2, [L, 0.0])
+        model.add_support(m["joints"][1], freedoms.ALL_DOFS)
+        model.add_beam_member(m, 1, [1, 2], s)
+        model.refine_member(m, 1, 20)
+        model.number_dofs(m)
+        model.solve_free_vibration(m)
+        consistent = m["frequencies"][0:4]
+        model.solve_free_vibration(m, lumping="HRZ")
+        lumped = m["frequencies"][0:4]
+        if m["M"].shape != (m["ntotaldof"],):
+            raise ValueError("Lumped mass must be a vector")
+        total = sum(m["M"][j["dof"][freedoms.U1]] for j in m["joints"].values())
+        if abs(total - rho * b * h * L) > 1.0e-9 * rho * b * h * L:
+            raise ValueError("Incorrect total mass")
+        # First bending frequency, Euler-Bernoulli theory
+        exact = 1.875104**2 / (2 * pi) * sqrt(E * b * h**3 / 12 / (rho * b * h * L**4))
+        for f in [consistent[0], lumped[0]]:
+            if abs(f - exact) > 0.01 * exact:
+                raise ValueError("Incorrect frequency")
+        # Lumped mass underestimates, consistent mass overestimates
+        if not (lumped[0] < consistent[0]):
+            raise ValueError("Unexpected ordering of the frequencies")
+        # The row-sum lumping leaves the rotations without mass
+        try:
+            model.solve_free_vibration(m, lumping="row-sum")
+        except RuntimeError:
+            pass
+        else:
+            raise ValueError("Massless rotations not detected")
+
+    def test_frequency_shift(self):
+        """
+        Free-free beam: the frequency shift removes the singularity of the
+        stiffness for all the methods of solution.
+        """
+        s = section.beam_2d_section("s", E=2.0e11, rho=7850.0, A=5.0e-3, I=4.0e-6)
+        m = model.create(2)
+        model.add_joint(m, 1, [0.0, 0.0])
+        model.add_joint(m, 2, [2.0, 0.0])
+        model.add_beam_member(m, 1, [1, 2], s)
+        model.refine_member(m, 1, 20)
+        model.number_dofs(m)
+        model.solve_free_vibration(m, freqshift=10.0)
+        reference = array(m["frequencies"][3:6])
+        # Three rigid body modes
+        if max(m["frequencies"][0:3]) > 1.0e-4 * reference[0]:
+            raise ValueError("Incorrect rigid body modes")
+        model.solve_free_vibration(m, freqshift=10.0, nmodes=6)
+        if norm(array(m["frequencies"][3:6]) - reference) > 1.0e-6 * norm(reference):
+            raise ValueError("Shift ignored by the block iterations")
+        for options in [dict(lumping="HRZ"), dict(lumping="row-sum", condensation="auto")]:
+            model.solve_free_vibration(m, **options)
+            unshifted = array(m["frequencies"][3:6])
+            model.solve_free_vibration(m, freqshift=10.0, **options)
+            if norm(array(m["frequencies"][3:6]) - unshifted) > 1.0e-8 * norm(unshifted):
+                raise ValueError("Incorrect shifted frequencies")
+        try:
+            model.solve_free_vibration(m, freqshift=10.0, band=(1.0, 100.0))
+        except ValueError:
+            pass
+        else:
+            raise ValueError("Shift combined with the band not detected")
+
+    def test_craig_bampton_superelement(self):
+        """
+        Portal frame whose girder is a superelement: statics and frequencies
+        against the full model, and reuse of the cached superelement.
+        """
+        s = section.beam_2d_section("s", E=2.0e11, A=1.0e-2, I=1.0e-4, rho=7850.0)
+
+        def girder():
+            sub = model.create(2)
+            model.add_joint(sub, 2, [0.0, 4.0])
+            model.add_joint(sub, 3, [6.0, 4.0])
+            model.add_beam_member(sub, 2, [2, 3], s)
+            model.refine_member(sub, 2, 12)
+            return sub
+
+        def frame(with_girder):
+            m = model.create(2)
+            freedoms = m["freedoms"]
+            model.add_joint(m, 1, [0.0, 0.0])
+            model.add_joint(m, 2, [0.0, 4.0])
+            model.add_joint(m, 3, [6.0, 4.0])
+            model.add_joint(m, 4, [6.0, 0.0])
+            model.add_support(m["joints"][1], freedoms.ALL_DOFS)
+            model.add_support(m["joints"][4], freedoms.ALL_DOFS)
+            model.add_beam_member(m, 1, [1, 2], s)
+            model.add_beam_member(m, 3, [3, 4], s)
+            if with_girder:
+                model.add_beam_member(m, 2, [2, 3], s)
+                model.refine_member(m, 2, 12)
+            model.add_load(m["joints"][2], freedoms.U1, 1.0e4)
+            return m
+
+        full = frame(True)
+        model.number_dofs(full)
+        model.solve_statics(full)
+        model.solve_free_vibration(full)
+
+        sub = girder()
+        model.number_dofs(sub)
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, "girder.npz")
+            se = superelement.craig_bampton(sub, [2, 3], 8, filename)
+            if not os.path.exists(filename):
+                raise ValueError("Superelement not saved")
+            other = girder()
+            model.number_dofs(other)
+            cached = superelement.craig_bampton(other, [2, 3], 8, filename)
+            if norm(cached["K"] - se["K"]) > 0.0 or cached["joints"] != [2, 3]:
+                raise ValueError("Superelement not reused")
+        if se["K"].shape != (6 + 8, 6 + 8):
+            raise ValueError("Incorrect size of the superelement")
+
+        m = frame(False)
+        model.add_superelement(m, "girder", [2, 3], se)
+        model.number_dofs(m)
+        if m["nfreedof"] != 6 + 8:
+            raise ValueError("Incorrect number of degrees of freedom")
+        model.solve_statics(m)
+        for jid in [2, 3]:
+            d = m["joints"][jid]["displacements"] - full["joints"][jid]["displacements"]
+            if norm(d) > 1.0e-9 * norm(full["joints"][jid]["displacements"]):
+                raise ValueError("Incorrect displacements")
+        # Recover the displacements inside the girder (statics is exact)
+        superelement.expand_superelement(m, "girder", sub)
+        for jid, j in sub["joints"].items():
+            fj = full["joints"][jid] if jid in full["joints"] else None
+            if fj is not None and norm(j["displacements"] - fj["displacements"]) > 1.0e-9 * norm(fj["displacements"]):
+                raise ValueError("Incorrect recovered displacements")
+        model.solve_free_vibration(m)
+        f, ff = m["frequencies"][0:3], full["frequencies"][0:3]
+        for a, b in zip(f, ff):
+            if not (b <= a < 1.001 * b):
+                raise ValueError("Incorrect frequencies")
+
+    def test_frequency_band_slicing(self):
+        """
+        Cantilever: the modes in a frequency band, computed in slices (also in
+        parallel processes), agree with the full solution.
+        """
+        E, rho, b, h, L = 2.0e11, 7850.0, 0.05, 0.1, 2.0
+        s = section.beam_2d_section("s", E=E, rho=rho, A=b * h, I=b * h**3 / 12)
+        m = model.create(2)
+        freedoms = m["freedoms"]
+        model.add_joint(m, 1, [0.0, 0.0])
+        model.add_joint(m, 2, [L, 0.0])
+        model.add_support(m["joints"][1], freedoms.ALL_DOFS)
+        model.add_beam_member(m, 1, [1, 2], s)
+        model.refine_member(m, 1, 40)
+        model.number_dofs(m)
+        model.solve_free_vibration(m)
+        frequencies = array(m["frequencies"])
+        band = (100.0, 3000.0)
+        expected = frequencies[(frequencies >= band[0]) & (frequencies < band[1])]
+        for nslices, workers in [(1, 1), (5, 1), (4, 2)]:
+            model.solve_free_vibration(m, band=band, nslices=nslices, workers=workers)
+            found = array(m["frequencies"])
+            if len(found) != len(expected) or norm(found - expected) > 1.0e-6 * norm(expected):
+                raise ValueError("Incorrect frequencies in the band")
+        nf = m["nfreedof"]
+        V = m["eigvecs"]
+        G = V.T @ (m["M"][0:nf, 0:nf] @ V)
+        if norm(G - numpy.eye(len(found))) > 1.0e-8:
+            raise ValueError("Modes must be mass-normalized")
+
+    def test_sturm_count(self):
+        """
+        Counting the natural frequencies below a given frequency without
+        solving the eigenvalue problem.
+        """
+        E, rho, b, h, L = 2.0e11, 7850.0, 0.05, 0.1, 2.0
+        s = section.beam_2d_section("s", E=E, rho=rho, A=b * h, I=b * h**3 / 12)
+        m = model.create(2)
+        freedoms = m["freedoms"]
+        model.add_joint(m, 1, [0.0, 0.0])
+        model.add_joint(m, 2, [L, 0.0])
+        model.add_support(m["joints"][1], freedoms.ALL_DOFS)
+        model.add_beam_member(m, 1, [1, 2], s)
+        model.refine_member(m, 1, 10)
+        model.number_dofs(m)
+        model.solve_free_vibration(m)
+        frequencies = array(m["frequencies"])
+        for f in [1.0, 50.0, 500.0, 2000.0, 1.0e5]:
+            expected = (frequencies < f).sum()
+            if model.count_frequencies_below(m, f) != expected:
+                raise ValueError("Incorrect count")
+        nf = m["nfreedof"]
+        K, M = m["K"][0:nf, 0:nf], m["M"][0:nf, 0:nf]
+        sigma = (2 * pi * 500.0) ** 2
+        if eigen.sturm_count(K, M, sigma) != (frequencies < 500.0).sum():
+            raise ValueError("Incorrect dense count")
+        lower, upper = eigen.bisect_eigenvalue(K, M, 2, 0.0, sigma)
+        if not (lower <= m["eigvals"][2] <= upper):
+            raise ValueError("Incorrect bracket")
+        if upper - lower > 1.0e-6 * upper:
+            raise ValueError("Bracket too wide")
+
+    def test_warm_started_lobpcg(self):
+        """
+        The lowest modes by block iterations, restarted from the modes of the
+        previous design.
+        """
+        E, rho, b, h, L = 2.0e11, 7850.0, 0.05, 0.1, 2.0
+        s = section.beam_2d_section("s", E=E, rho=rho, A=b * h, I=b * h**3 / 12)
+        m = model.create(2)
+        freedoms = m["freedoms"]
+        model.add_joint(m, 1, [0.0, 0.0])
+        model.add_joint(m, 2, [L, 0.0])
+        model.add_support(m["joints"][1], freedoms.ALL_DOFS)
+        model.add_beam_member(m, 1, [1, 2], s)
+        model.refine_member(m, 1, 40)
+        model.number_dofs(m)
+        model.solve_free_vibration(m)
+        reference = array(m["frequencies"][0:4])
+        model.solve_free_vibration(m, nmodes=4)
+        if norm(array(m["frequencies"]) - reference) > 1.0e-6 * norm(reference):
+            raise ValueError("Incorrect frequencies")
+        cold = m["eigen_iterations"]
+        # A slightly stiffer design
+        s["E"] = 1.01 * E
+        model.solve_free_vibration(m, warm_start=True)
+        if len(m["frequencies"]) != 4:
+            raise ValueError("Incorrect number of modes")
+        if norm(array(m["frequencies"]) - 1.01**0.5 * reference) > 1.0e-6 * norm(reference):
+            raise ValueError("Incorrect frequencies of the new design")
+        if m["eigen_iterations"] >= cold:
+            raise ValueError("Warm start did not reduce the iterations")
+        nf = m["nfreedof"]
+        V = m["eigvecs"]
+        if norm(V.T @ (m["M"][0:nf, 0:nf] @ V) - eye(4)) > 1.0e-8:
+            raise ValueError("Eigenvectors not mass-normalized")
+        # Starting from the converged modes, no iterations are needed
+        K, M = m["K"][0:nf, 0:nf], m["M"][0:nf, 0:nf]
+        _, _, iterations = eigen.solve_lobpcg(K, M, V)
+        if iterations != 0:
+            raise ValueError("Incorrect number of iterations")
+        try:
+            eigen.solve_lobpcg(K, M, eigen.initial_block(nf, 4), maxiter=1)
+        except RuntimeError:
+            pass
+        else:
+            raise ValueError("Non-convergence not detected")
+
+    def test_mode_tracking(self):
+        """
+        Tracking the modes of a column whose bending and axial modes swap
+        order when the moment of inertia increases.
+        """
+        E, rho, A, L = 2.0e11, 7850.0, 0.01, 3.0
+
+        def axial_mode(m):
+            # The lowest mode with axial displacement at the top
+            return (abs(m["eigvecs"][m["joints"][2]["dof"][0], :]) > 0.01).argmax()
+
+        s = section.beam_2d_section("s", E=E, rho=rho, A=A, I=1.0e-5)
+        m = model.create(2)
+        freedoms = m["freedoms"]
+        model.add_joint(m, 1, [0.0, 0.0])
+        model.add_joint(m, 2, [L, 0.0])
+        model.add_support(m["joints"][1], freedoms.ALL_DOFS)
+        model.add_beam_member(m, 1, [1, 2], s)
+        model.refine_member(m, 1, 8)
+        model.number_dofs(m)
+        model.solve_free_vibration(m)
+        reference = m["eigvecs"][:, 0:5].copy()
+        before = axial_mode(m)
+        s["I"] = 4.0e-4
+        model.solve_free_vibration(m)
+        if axial_mode(m) == before:
+            raise ValueError("The modes were expected to swap")
+        frequencies = array(m["frequencies"])
+        order = model.track_modes(m, reference)
+        if axial_mode(m) != before:
+            raise ValueError("Modes not tracked")
+        if norm(array(m["frequencies"]) - frequencies[order]) > 0.0:
+            raise ValueError("Frequencies not reordered")
+        if len(m["mac"]) != 5 or m["mac"].min() < 0.9:
+            raise ValueError("Incorrect MAC of the pairs")
+        nf = m["nfreedof"]
+        mac = eigen.modal_assurance(reference, m["eigvecs"], m["M"][0:nf, 0:nf])
+        if norm(numpy.diag(mac)[0:5] - m["mac"]) > 1.0e-12:
+            raise ValueError("Inconsistent MAC matrix")
+        if (numpy.diag(reference.T @ m["M"][0:nf, 0:nf] @ m["eigvecs"][:, 0:5]) < 0.0).any():
+            raise ValueError("Mode shapes not aligned")
+
+    def test_internal_force_diagrams(self):
+        """
+        Internal forces sampled along all the members of a portal frame at
+        once, compared with the member-by-member computation.
+        """
+        s = section.beam_2d_section("s", E=2.0e11, A=1.0e-2, I=1.0e-5)
+        m = model.create(2)
+        freedoms = m["freedoms"]
+        model.add_joint(m, 1, [0.0, 0.0])
+        model.add_joint(m, 2, [0.0, 3.0])
+        model.add_joint(m, 3, [4.0, 3.5])
+        model.add_joint(m, 4, [4.0, 0.0])
+        model.add_support(m["joints"][1], freedoms.ALL_DOFS)
+        model.add_support(m["joints"][4], freedoms.TRANSLATION_DOFS)
+        model.add_beam_member(m, 1, [1, 2], s)
+        model.add_beam_member(m, 2, [2, 3], s)
+        model.add_beam_member(m, 3, [3, 4], s)
+        model.add_load(m["joints"][2], freedoms.U1, 1.0e4)
+        model.add_load(m["joints"][3], freedoms.U2, -2.0e4)
+        model.number_dofs(m)
+        model.solve_statics(m)
+        xi = numpy.linspace(-1.0, 1.0, 13)
+        d = resultants.internal_forces(m, xi)
+        if d["My"].shape != (3, 13):
+            raise ValueError("Incorrect shape")
+        for k, mid in enumerate(d["mids"]):
+            member = m["beam_members"][mid]
+            i, j = [m["joints"][c] for c in member["connectivity"]]
+            for l, x in enumerate(xi):
+                My = beam.beam_2d_moment(member, i, j, x)
+                Qz = beam.beam_2d_shear_force(member, i, j, x)
+                N = beam.beam_2d_axial_force(member, i, j, x)
+                if abs(d["My"][k, l] - My) > 1.0e-9 * abs(d["My"]).max():
+                    raise ValueError("Incorrect moment")
+                if abs(d["Qz"][k, l] - Qz) > 1.0e-9 * abs(d["Qz"]).max():
+                    raise ValueError("Incorrect shear force")
+                if abs(d["N"][k, l] - N) > 1.0e-9 * abs(d["N"]).max():
+                    raise ValueError("Incorrect axial force")
+        # The moment at the pinned support vanishes
+        if abs(d["My"][2, -1]) > 1.0e-9 * abs(d["My"]).max():
+            raise ValueError("Moment at the pin must be zero")
+
+    def test_load_combinations_envelope(self):
+        """
+        Envelopes over load combinations of a portal frame, compared with the
+        solutions of the combined loads.
+        """
+        s = section.beam_2d_section("s", E=2.0e11, A=1.0e-2, I=1.0e-5)
+        m = model.create(2)
+        freedoms = m["freedoms"]
+        model.add_joint(m, 1, [0.0, 0.0])
+        model.add_joint(m, 2, [0.0, 3.0])
+        model.add_joint(m, 3, [4.0, 3.0])
+        model.add_joint(m, 4, [4.0, 0.0])
+        model.add_support(m["joints"][1], freedoms.ALL_DOFS)
+        model.add_support(m["joints"][4], freedoms.ALL_DOFS)
+        model.add_beam_member(m, 1, [1, 2], s)
+        model.add_beam_member(m, 2, [2, 3], s)
+        model.add_beam_member(m, 3, [3, 4], s)
+        model.number_dofs(m)
+        loadcases.add_load_case(m, "dead")
+        loadcases.add_case_load(m, "dead", 2, freedoms.U2, -1.0e4)
+        loadcases.add_case_load(m, "dead", 3, freedoms.U2, -1.0e4)
+        loadcases.add_load_case(m, "wind")
+        loadcases.add_case_load(m, "wind", 2, freedoms.U1, 5.0e3)
+        factors = {
+            "D": {"dead": 1.4},
+            "D+W": {"dead": 1.2, "wind": 1.6},
+            "D-W": {"dead": 1.2, "wind": -1.6},
+            "0.9D+W": {"dead": 0.9, "wind": 1.6},
+        }
+        for name, f in factors.items():
+            loadcases.add_combination(m, name, f)
+        loadcases.solve_load_cases(m)
+        xi = [-1.0, 0.0, 1.0]
+        env = loadcases.envelope(m, "internal_forces", xi=xi, chunk=3)
+        U_env = loadcases.envelope(m, "displacements")
+        R_env = loadcases.envelope(m, "reactions", chunk=1)
+        # Solve each combination directly
+        My, U, R = [], [], []
+        for f in factors.values():
+            model.remove_loads(m)
+            if "dead" in f:
+                model.add_load(m["joints"][2], freedoms.U2, -1.0e4 * f["dead"])
+                model.add_load(m["joints"][3], freedoms.U2, -1.0e4 * f["dead"])
+            if "wind" in f:
+                model.add_load(m["joints"][2], freedoms.U1, 5.0e3 * f["wind"])
+            model.solve_statics(m)
+            model.statics_reactions(m)
+            My.append(resultants.internal_forces(m, xi)["My"])
+            U.append(m["U"].copy())
+            R.append(array([m["joints"][1]["reactions"][d] for d in freedoms.ALL_DOFS]))
+        My, U, R = numpy.stack(My, axis=-1), numpy.stack(U, axis=-1), numpy.stack(R, axis=-1)
+        if norm(env["My"]["max"] - My.max(axis=-1)) > 1.0e-9 * norm(My):
+            raise ValueError("Incorrect maximum moments")
+        if norm(env["My"]["min"] - My.min(axis=-1)) > 1.0e-9 * norm(My):
+            raise ValueError("Incorrect minimum moments")
+        if (env["My"]["max_combination"] != My.argmax(axis=-1)).any():
+            raise ValueError("Incorrect governing combinations")
+        if norm(U_env["max"] - U.max(axis=-1)) > 1.0e-9 * norm(U):
+            raise ValueError("Incorrect maximum displacements")
+        dofs = m["joints"][1]["dof"] - m["nfreedof"]
+        if norm(R_env["min"][dofs] - R.min(axis=-1)) > 1.0e-9 * norm(R):
+            raise ValueError("Incorrect minimum reactions")
+        loadcases.apply_combination(m, "D-W")
+        if norm(m["U"] - U[:, 2]) > 1.0e-9 * norm(U):
+            raise ValueError("Incorrect combined displacements")
+
+    def test_member_loads(self):
+        """
+        Member loads: the thermal frame of tutorial 07 with a thermal load
+        instead of the hand-computed joint loads, and a simple beam with a
+        linearly varying load and a point load on one member, compared with a
+        refined mesh.
+        """
+        E, A, I, CTE = 30e6, 20, 100, 6.5e-6
+        Tbot, Ttop, depth = 0.0, 70.0, 10.0
+        m = model.create(2)
+        freedoms = m["freedoms"]
+        model.add_joint(m, 1, [0.0, 0.0])
+        model.add_joint(m, 2, [0.0, -12 * 12.0])
+        model.add_joint(m, 3, [12 * 7.0, 0.0])
+        model.add_support(m["joints"][2], freedoms.ALL_DOFS)
+        model.add_support(m["joints"][3], freedoms.ALL_DOFS)
+        s = section.beam_2d_section("s", E=E, A=A, I=I, CTE=CTE)
+        model.add_beam_member(m, 1, [1, 2], s)
+        model.add_beam_member(m, 2, [3, 1], s)
+        memberloads.add_thermal_load(
+            m, 2, dT=(Ttop + Tbot) / 2, dTdz=(Ttop - Tbot) / depth
+        )
+        model.number_dofs(m)
+        model.solve_statics(m)
+        ref1 = [-0.0191605, -0.00041134, 0.00068165]
+        if norm(m["joints"][1]["displacements"] / ref1 - 1) > 1.0e-3:
+            raise ValueError("Displacement calculation error")
+        r = resultants.end_forces(m)["beam_members"]
+        f = dict(zip(r["keys"], r["forces"][r["mids"].index(2)]))
+        if abs(f["Ni"] / 360 - 1) > 1e-2:
+            raise ValueError("Member 2, joint i, axial force error")
+        if abs(f["Qzi"] / 1710 - 1) > 1e-2:
+            raise ValueError("Member 2, joint i, shear force error")
+        if abs(f["Myi"] / -184000 - 1) > 1e-2:
+            raise ValueError("Member 2, joint i, bending moment error")
+
+        def simple_beam(n):
+            m = model.create(2)
+            for k in range(n + 1):
+                model.add_joint(m, k, [4.0 * k / n, 0.0])
+            s = section.beam_2d_section("s", E=2.0e5, A=1.0e-2, I=1.0e-4)
+            for k in range(n):
+                model.add_beam_member(m, k, [k, k + 1], s)
+            model.add_support(m["joints"][0], m["freedoms"].U1)
+            model.add_support(m["joints"][0], m["freedoms"].U2)
+            model.add_support(m["joints"][n], m["freedoms"].U2)
+            model.number_dofs(m)
+            return m
+
+        # The load varies from 1 to 5 (downward, along the local z), the point
+        # load is applied at x = 2.6
+        m = simple_beam(1)
+        memberloads.add_distributed_load(m, 0, "z", 1.0, 5.0)
+        memberloads.add_point_load(m, 0, "z", 7.0, 0.3)
+        model.solve_statics(m)
+        model.statics_reactions(m)
+        n = 20
+        mr = simple_beam(n)
+        x = numpy.arange(n + 1) * 4.0 / n
+        memberloads.add_distributed_load(mr, list(range(n)), "z", 1 + x[:-1], 1 + x[1:])
+        memberloads.add_point_load(mr, 13, "z", 7.0, -1.0)
+        model.solve_statics(mr)
+        model.statics_reactions(mr)
+        u, ur = m["joints"][1]["displacements"], mr["joints"][n]["displacements"]
+        if norm(u - ur) > 1.0e-9 * norm(ur):
+            raise ValueError("Incorrect displacements")
+        R = mr["joints"][0]["reactions"][1] + mr["joints"][n]["reactions"][1]
+        if abs(R - (12.0 + 7.0)) > 1.0e-9:
+            raise ValueError("Incorrect reactions")
+        xi = numpy.linspace(-1.0, 1.0, n + 1)[:-1]
+        d = resultants.internal_forces(m, xi)
+        dr = resultants.internal_forces(mr, [-1.0])
+        for q in ["N", "Qz", "My"]:
+            if norm(d[q][0] - dr[q][:, 0]) > 1.0e-9 * (1 + norm(dr[q])):
+                raise ValueError(f"Incorrect internal force {q}")
+
+    def test_member_loads_legacy_resultants(self):
+        """
+        The resultants of a single member computed from the joint
+        displacements include the member loads: simply supported beam with a
+        uniform load, :math:`M = qL^2/8` at the middle.
+        """
+        q, L = 1000.0, 4.0
+        m = model.create(2)
+        freedoms = m["freedoms"]
+        model.add_joint(m, 1, [0.0, 0.0])
+        model.add_joint(m, 2, [L, 0.0])
+        model.add_support(m["joints"][1], freedoms.TRANSLATION_DOFS)
+        model.add_support(m["joints"][2], freedoms.U2)
+        s = section.beam_2d_section("s", E=2.0e11, A=1.0e-2, I=1.0e-5)
+        model.add_beam_member(m, 1, [1, 2], s)
+        memberloads.add_distributed_load(m, 1, "z", q)
+        model.number_dofs(m)
+        model.solve_statics(m)
+        member = m["beam_members"][1]
+        i, j = m["joints"][1], m["joints"][2]
+        if abs(beam.beam_2d_moment(member, i, j, 0.0) - q * L**2 / 8) > 1.0e-9 * q * L**2:
+            raise ValueError("Incorrect moment")
+        f = beam.beam_2d_end_forces(member, i, j)
+        if abs(f["Myi"]) > 1.0e-9 * q * L**2 or abs(f["Myj"]) > 1.0e-9 * q * L**2:
+            raise ValueError("Incorrect end moments")
+        # Compared with the vectorized resultants, with an axial load and a
+        # point load added in a load combination
+        loadcases.add_load_case(m, "extra")
+        memberloads.add_distributed_load(m, 1, "x", 300.0, 100.0, case="extra")
+        memberloads.add_point_load(m, 1, "z", 500.0, 0.5, case="extra")
+        loadcases.add_combination(m, "all", {"extra": 1.5})
+        loadcases.solve_load_cases(m)
+        loadcases.apply_combination(m, "all")
+        xi = numpy.linspace(-1.0, 1.0, 9)
+        d = resultants.internal_forces(m, xi)
+        functions = dict(
+            N=beam.beam_2d_axial_force, Qz=beam.beam_2d_shear_force, My=beam.beam_2d_moment
+        )
+        for name, fun in functions.items():
+            values = array([fun(member, i, j, x) for x in xi])
+            if norm(values - d[name][0]) > 1.0e-9 * norm(d[name][0]):
+                raise ValueError(f"Incorrect internal force {name}")
+        f = beam.beam_2d_end_forces(member, i, j)
+        F = resultants.end_forces(m)["beam_members"]["forces"][0]
+        if norm(array([f[k] for k in resultants.BEAM_2D_END_FORCES]) - F) > 1.0e-9 * norm(F):
+            raise ValueError("Incorrect end forces")
+
+    def test_gravity_load_case(self):
+        """
+        Self weight as a load case: the consistent distribution is the product
+        of the mass matrix with the acceleration of gravity, the lumped one the
+        product of the lumped masses; the reactions balance the total weight.
+        """
+        g = array([0.0, -9.81])
+        sb = section.beam_2d_section("sb", E=2.0e11, A=1.0e-2, I=1.0e-5, rho=7850.0)
+        st = section.truss_section("st", E=2.0e11, A=2.0e-3, rho=7850.0)
+        m = model.create(2)
+        freedoms = m["freedoms"]
+        model.add_joint(m, 1, [0.0, 0.0])
+        model.add_joint(m, 2, [3.0, 0.0])
+        model.add_joint(m, 3, [6.0, 0.0])
+        model.add_joint(m, 4, [3.0, 2.0])
+        model.add_support(m["joints"][1], freedoms.U1)
+        model.add_support(m["joints"][1], freedoms.U2)
+        model.add_support(m["joints"][3], freedoms.U2)
+        model.add_support(m["joints"][4], freedoms.UR3)
+        model.add_beam_member(m, 1, [1, 2], sb)
+        model.add_beam_member(m, 2, [2, 3], sb)
+        model.add_truss_member(m, 3, [1, 4], st)
+        model.add_truss_member(m, 4, [4, 3], st)
+        model.number_dofs(m)
+        loadcases.add_gravity(m, g)
+        loadcases.add_gravity(m, g, "lumped gravity", lumping="HRZ")
+        names, F = loadcases.load_case_vectors(m)
+        G = numpy.zeros(m["ntotaldof"])
+        for j in m["joints"].values():
+            G[j["dof"][0:2]] = g
+        M = model.build_mass_matrix(m)
+        if norm(F[:, 0] - dot(M, G)) > 1.0e-12 * norm(F[:, 0]):
+            raise ValueError("Incorrect consistent weight")
+        M = model.build_lumped_mass_vector(m)
+        if norm(F[:, 1] - M * G) > 1.0e-12 * norm(F[:, 1]):
+            raise ValueError("Incorrect lumped weight")
+        loadcases.add_combination(m, "1.35G", {"gravity": 1.35})
+        loadcases.solve_load_cases(m)
+        weight = 7850.0 * 9.81 * (1.0e-2 * 6.0 + 2.0e-3 * 2 * sqrt(13.0))
+        R = m["load_case_results"]["R"]
+        if abs(R[:, 0].sum() - weight) > 1.0e-9 * weight:
+            raise ValueError("Reactions do not balance the weight")
+        loadcases.apply_combination(m, "1.35G")
+        My = resultants.internal_forces(m, [-1.0, 0.0, 1.0])["My"]
+        # The same weight applied in the static solution
+        memberloads.add_gravity_load(m, 1.35 * g)
+        model.solve_statics(m)
+        model.statics_reactions(m)
+        if norm(resultants.internal_forces(m, [-1.0, 0.0, 1.0])["My"] - My) > 1.0e-9 * norm(My):
+            raise ValueError("Incorrect moments of the combination")
+        if abs(My[1, 2]) > 1.0e-9 * abs(My).max():
+            raise ValueError("Nonzero moment at the simple support")
+
+    def test_influence_lines(self):
+        """
+        Influence lines of a continuous beam over three supports (one member
+        reversed along the path), compared with solutions for the unit load
+        placed at each position, and the envelope of a moving two-axle vehicle.
+        """
+
+        def continuous_beam():
+            m = model.create(2)
+            freedoms = m["freedoms"]
+            for k, x in enumerate([0.0, 2.5, 5.0, 8.5, 12.0]):
+                model.add_joint(m, k, [x, 0.0])
+            s = section.beam_2d_section("s", E=2.0e11, A=1.0e-2, I=1.0e-5)
+            model.add_beam_member(m, 1, [0, 1], s)
+            model.add_beam_member(m, 2, [1, 2], s)
+            model.add_beam_member(m, 3, [3, 2], s)
+            model.add_beam_member(m, 4, [3, 4], s)
+            model.add_support(m["joints"][0], freedoms.U1)
+            for jid in [0, 2, 4]:
+                model.add_support(m["joints"][jid], freedoms.U2)
+            model.number_dofs(m)
+            return m
+
+        def solve(loads):
+            # loads: list of (distance along the path, magnitude downward)
+            m = continuous_beam()
+            table = resultants.member_table(m, "beam_members")
+            for s, P in loads:
+                mids, xi = influence.path_positions(p, [s])
+                e = table["mids"].index(mids[0])
+                memberloads.add_point_load(m, mids[0], "z", -P * table["e_z"][e][1], xi[0])
+            model.solve_statics(m)
+            model.statics_reactions(m)
+            My = resultants.internal_forces(m, [0.3])["My"]
+            d = resultants.internal_forces(m, [-0.5])["Qz"]
+            return array(
+                [
+                    m["joints"][2]["reactions"][1],
+                    My[table["mids"].index(2), 0],
+                    d[table["mids"].index(3), 0],
+                    m["joints"][1]["displacements"][1],
+                ]
+            )
+
+        m = continuous_beam()
+        U2 = m["freedoms"].U2
+        quantities = [
+            ("reaction", 2, U2),
+            ("My", 2, 0.3),
+            ("Qz", 3, -0.5),
+            ("displacement", 1, U2),
+        ]
+        p = influence.path(m, [1, 2, 3, 4])
+        if p["forward"].tolist() != [True, True, False, True]:
+            raise ValueError("Incorrect orientation of the path")
+        s, lines = influence.influence_lines(m, quantities, p, npoints=13)
+        for k in range(len(s)):
+            ref = solve([(s[k], 1.0)])
+            if norm(lines[:, k] - ref) > 1.0e-9 * norm(ref):
+                raise ValueError("Incorrect influence line")
+        # Reaction at the middle support is one when the load is right on it
+        adjoint = influence.adjoint_solutions(m, quantities[0:1])
+        if abs(influence.influence_values(m, adjoint, [2], [1.0])[0, 0] - 1.0) > 1.0e-9:
+            raise ValueError("Incorrect reaction")
+        offsets, loads = [0.0, 1.5], [10.0, 20.0]
+        env = influence.vehicle_envelope(m, quantities, p, offsets, loads, npoints=41)
+        k = env["values"][1].argmax()
+        axles = [(env["s"][k] - d, P) for d, P in zip(offsets, loads)]
+        ref = solve([(x, P) for x, P in axles if 0.0 <= x <= 12.0])
+        if norm(env["values"][:, k] - ref) > 1.0e-9 * norm(ref):
+            raise ValueError("Incorrect vehicle response")
+        if abs(env["max"][1] - ref[1]) > 1.0e-9 * abs(ref[1]):
+            raise ValueError("Incorrect envelope")
+
+    def test_settlement_load_cases(self):
+        """
+        Settlements of tutorial 04 as load cases: several settlement patterns
+        and a load case are solved against one factorization, and compared
+        with the solutions with the prescribed displacements of the supports.
+        """
+        E, I, A, L = 2.9e6, 1.0, 1.0, 10 * 12
+
+        def continuous_beam(settlement2=0.0, settlement3=0.0):
+            m = model.create(2)
+            freedoms = m["freedoms"]
+            model.add_joint(m, 1, [0.0, 0.0])
+            model.add_joint(m, 2, [L, 0.0])
+            model.add_joint(m, 3, [2 * L, 0.0])
+            model.add_support(m["joints"][1], freedoms.ALL_DOFS)
+            model.add_support(m["joints"][2], freedoms.U2, settlement2)
+            model.add_support(m["joints"][3], freedoms.U2, settlement3)
+            s1 = section.beam_2d_section("s1", E, A, I)
+            model.add_beam_member(m, 1, [1, 2], s1)
+            model.add_beam_member(m, 2, [2, 3], s1)
+            model.number_dofs(m)
+            return m
+
+        m = continuous_beam()
+        freedoms = m["freedoms"]
+        loadcases.add_load_case(m, "settle 2")
+        loadcases.add_case_settlement(m, "settle 2", 2, freedoms.U2, -0.25)
+        loadcases.add_load_case(m, "settle 3")
+        loadcases.add_case_settlement(m, "settle 3", 3, freedoms.U2, 0.1)
+        loadcases.add_load_case(m, "load")
+        loadcases.add_case_load(m, "load", 2, freedoms.UR3, 100.0)
+        loadcases.solve_load_cases(m)
+        results = m["load_case_results"]
+        forces = resultants.end_forces(m, results["U"])["beam_members"]
+        keys = forces["keys"]
+        f = forces["forces"][forces["mids"].index(1), :, 0]
+        if abs(f[keys.index("Qzi")] / 3.9558 - 1) > 1e-3:
+            raise ValueError("Incorrect force")
+        if abs(f[keys.index("Myi")] / -258.92857 - 1) > 1e-3:
+            raise ValueError("Incorrect force")
+        nf = m["nfreedof"]
+        for c, (s2, s3) in enumerate([(-0.25, 0.0), (0.0, 0.1)]):
+            mc = continuous_beam(s2, s3)
+            model.solve_statics(mc)
+            model.statics_reactions(mc)
+            if norm(mc["U"] - results["U"][:, c]) > 1.0e-9 * norm(mc["U"]):
+                raise ValueError("Incorrect displacements")
+            R, Rc = [], []
+            for jid in [1, 2, 3]:
+                for dof, value in mc["joints"][jid]["reactions"].items():
+                    R.append(value)
+                    Rc.append(results["R"][m["joints"][jid]["dof"][dof] - nf, c])
+            if norm(array(R) - array(Rc)) > 1.0e-9 * norm(R):
+                raise ValueError("Incorrect reactions")
+        with self.assertRaises(RuntimeError):
+            loadcases.add_case_settlement(m, "load", 2, freedoms.U1, 0.1)
+
+    def test_moved_joint(self):
+        """
+        Moving a joint after a solution changes the next solution: the cached
+        geometry of the members follows the coordinates of the joints.
+        """
+
+        def cantilever(L):
+            m = model.create(2)
+            model.add_joint(m, 1, [0.0, 0.0])
+            model.add_joint(m, 2, [L, 0.0])
+            model.add_beam_member(m, 1, [1, 2], section.beam_2d_section("s", 1.0, 1.0, 1.0))
+            model.add_support(m["joints"][1], m["freedoms"].ALL_DOFS)
+            model.add_load(m["joints"][2], m["freedoms"].U2, -1.0)
+            model.number_dofs(m)
+            model.solve_statics(m)
+            return m
+
+        m = cantilever(1.0)
+        model.move_joint(m, 2, [2.0, 0.0])
+        model.solve_statics(m)
+        expected = cantilever(2.0)["joints"][2]["displacements"]
+        if norm(m["joints"][2]["displacements"] - expected) > 1.0e-12 * norm(expected):
+            raise ValueError("Stale geometry after moving a joint")
+
 
 def main():
     unittest.main()
@@ -15,6 +15,8 @@ from pystran import geometry
 from pystran import beam
 from pystran import truss
 from pystran import rotation
+from pystran import graph
+from pystran import spatial
 
 
 class UnitTestsPlanarTrusses(unittest.TestCase):
@@ -444,6 +446,209 @@ class UnitTestsPlanarTrusses(unittest.TestCase):
         # ax.set_title("Deformed shape (magnified 20 times)")
         # plots.show(m)
 
+    def test_number_dofs_lattice_with_links(self):
+        """
+        Numbering of a lattice of joints: free degrees of freedom first, in
+        the order of the joints, then the prescribed ones. A chain of links
+        makes all the joints in the chain share the same number.
+        """
+        m = model.create(2)
+        freedoms = m["freedoms"]
+        n = 4
+        for k in range(n * n):
+            model.add_joint(m, k, [k % n, k // n])
+        for k in range(n):
+            model.add_support(m["joints"][k], freedoms.TRANSLATION_DOFS)
+        model.add_dof_links(m, [5, 6], freedoms.U1)
+        model.add_dof_links(m, [6, 9], freedoms.U1)
+        model.number_dofs(m)
+
+        if m["nfreedof"] != 2 * n * (n - 1) - 2 or m["ntotaldof"] != 2 * n * n - 2:
+            raise ValueError("Incorrect number of degrees of freedom")
+        if list(m["joints"][4]["dof"]) != [0, 1]:
+            raise ValueError("Incorrect numbering")
+        if list(m["joints"][0]["dof"]) != [m["nfreedof"], m["nfreedof"] + 1]:
+            raise ValueError("Incorrect numbering")
+        d5 = m["joints"][5]["dof"]
+        if m["joints"][6]["dof"][0] != d5[0] or m["joints"][9]["dof"][0] != d5[0]:
+            raise ValueError("Linked joints must share the degree of freedom")
+        if m["joints"][6]["dof"][1] == d5[1]:
+            raise ValueError("Unlinked degrees of freedom must not be shared")
+
+    def test_connectivity_graph(self):
+        """
+        Connectivity queries: members at joints, neighbors, degrees, and
+        connected components.
+        """
+        m = model.create(2)
+        model.add_joint(m, 1, [0.0, 0.0])
+        model.add_joint(m, 2, [1.0, 0.0])
+        model.add_joint(m, 3, [1.0, 1.0])
+        model.add_joint(m, 4, [3.0, 0.0])
+        model.add_joint(m, 5, [4.0, 0.0])
+        model.add_joint(m, 6, [9.0, 9.0])
+        s = section.truss_section("s", E=1.0, A=1.0)
+        model.add_truss_member(m, 1, [1, 2], s)
+        model.add_truss_member(m, 2, [2, 3], s)
+        model.add_truss_member(m, 3, [1, 3], s)
+        model.add_truss_member(m, 4, [4, 5], s)
+
+        if sorted(graph.members_at_joint(m, 2)) != [("truss_members", 1), ("truss_members", 2)]:
+            raise ValueError("Incorrect members at joint")
+        if sorted(graph.adjacent_joints(m, 1)) != [2, 3]:
+            raise ValueError("Incorrect neighbors")
+        if graph.joint_degrees(m) != {1: 2, 2: 2, 3: 2, 4: 1, 5: 1, 6: 0}:
+            raise ValueError("Incorrect degrees")
+        components = graph.connected_components(m)
+        if components != [[1, 2, 3], [4, 5], [6]]:
+            raise ValueError("Incorrect components")
+        model.add_dof_links(m, [3, 4], m["freedoms"].U1)
+        if len(graph.connected_components(m)) != 2:
+            raise ValueError("Links must connect the joints")
+        if len(graph.connected_components(m, include_links=False)) != 3:
+            raise ValueError("Links must be ignored")
+        G, jids = graph.joint_graph(m)
+        if G.shape != (6, 6) or G.nnz != 2 * 5:
+            raise ValueError("Incorrect graph")
+
+    def test_merge_coincident_joints(self):
+        """
+        Joints at the same location are found and merged; joints connected by
+        a spring at the same location are left alone.
+        """
+        m = model.create(2)
+        freedoms = m["freedoms"]
+        model.add_joint(m, 1, [0.0, 0.0])
+        model.add_joint(m, 2, [1.0, 0.0])
+        model.add_joint(m, 3, [1.0, 1.0e-9])
+        model.add_joint(m, 4, [2.0, 0.0])
+        model.add_joint(m, 5, [0.0, 0.0])
+        s = section.truss_section("s", E=1.0, A=1.0)
+        model.add_truss_member(m, 1, [1, 2], s)
+        model.add_truss_member(m, 2, [3, 4], s)
+        model.add_spring_member(
+            m, 3, [1, 5], section.spring_section("k", "extension", [1.0, 0.0], 1.0)
+        )
+        model.add_load(m["joints"][2], freedoms.U2, 1.0)
+        model.add_load(m["joints"][3], freedoms.U2, 2.0)
+
+        if spatial.find_joint_near(m, [1.0, -0.1], 0.2) != 2:
+            raise ValueError("Incorrect nearest joint")
+        if spatial.find_joint_near(m, [1.5, 0.5], 0.2) is not None:
+            raise ValueError("There is no joint nearby")
+        if spatial.joints_in_box(m, [0.5, -1.0], [1.5, 1.0]) != [2, 3]:
+            raise ValueError("Incorrect joints in box")
+
+        merged = spatial.merge_coincident_joints(m, 1.0e-6)
+        if merged != {3: 2}:
+            raise ValueError("Incorrect merge")
+        if m["truss_members"][2]["connectivity"] != [2, 4]:
+            raise ValueError("Connectivity not rewritten")
+        if m["joints"][2]["loads"][freedoms.U2] != 3.0:
+            raise ValueError("Loads not combined")
+        if sorted(graph.adjacent_joints(m, 2)) != [1, 4]:
+            raise ValueError("Adjacency not updated")
+        if spatial.joints_within(m, [0.0, 0.0], 1.0e-3) != [1, 5]:
+            raise ValueError("Incorrect joints within radius")
+
+        # A conflict is found before anything is merged
+        m = model.create(2)
+        for jid, x in enumerate([0.0, 1.0, 1.0, 2.0, 2.0]):
+            model.add_joint(m, jid, [x, 0.0])
+        model.add_truss_member(m, 1, [0, 1], s)
+        model.add_truss_member(m, 2, [2, 3], s)
+        model.add_support(m["joints"][3], freedoms.U1, 0.0)
+        model.add_support(m["joints"][4], freedoms.U1, 0.1)
+        try:
+            spatial.merge_coincident_joints(m, 1.0e-6)
+            raise ValueError("Conflicting supports not detected")
+        except RuntimeError:
+            pass
+        if sorted(m["joints"].keys()) != [0, 1, 2, 3, 4]:
+            raise ValueError("Joints removed despite the conflict")
+        if m["truss_members"][2]["connectivity"] != [2, 3]:
+            raise ValueError("Connectivity rewritten despite the conflict")
+
+        # A third joint at the location of a zero-length spring, or of linked
+        # joints, is merged into one of them only; linked joints that are both
+        # merged keep their link
+        m = model.create(2)
+        for jid in range(1, 8):
+            model.add_joint(m, jid, [0.0, 0.0] if jid <= 3 else [5.0, 0.0] if jid <= 6 else [9.0, 0.0])
+        model.add_joint(m, 8, [9.0, 0.0])
+        model.add_joint(m, 9, [1.0, 0.0])
+        model.add_joint(m, 10, [1.0, 0.0])
+        model.add_spring_member(
+            m, 1, [1, 2], section.spring_section("k", "extension", [1.0, 0.0], 1.0)
+        )
+        model.add_dof_links(m, [4, 5], freedoms.U1)
+        model.add_dof_links(m, [8, 10], freedoms.U2)
+        merged = spatial.merge_coincident_joints(m, 1.0e-6)
+        if merged != {3: 1, 6: 4, 8: 7, 10: 9}:
+            raise ValueError("Incorrect merge of intentionally coincident joints")
+        if m["spring_members"][1]["connectivity"] != [1, 2]:
+            raise ValueError("Spring collapsed")
+        if m["joints"][4]["links"] != {5: [freedoms.U1]}:
+            raise ValueError("Incorrect links")
+        if m["joints"][7]["links"] != {9: [freedoms.U2]}:
+            raise ValueError("Links not remapped")
+        if m["joints"][9]["links"] != {7: [freedoms.U2]}:
+            raise ValueError("Links not remapped")
+
+    def test_bulk_construction(self):
+        """
+        A truss built with the bulk functions gives the same solution as the
+        truss built member by member.
+        """
+        from numpy import arange, zeros
+
+        def build(bulk):
+            m = model.create(2)
+            freedoms = m["freedoms"]
+            n = 6
+            X = zeros((2 * n, 2))
+            X[0:n, 0] = arange(n)
+            X[n:, 0] = arange(n)
+            X[n:, 1] = 1.0
+            chords = [[k, k + 1] for k in range(n - 1)] + [[n + k, n + k + 1] for k in range(n - 1)]
+            webs = [[k, n + k] for k in range(n)] + [[k, n + k + 1] for k in range(n - 1)]
+            s1 = section.truss_section("s1", E=1.0e3, A=2.0)
+            s2 = section.truss_section("s2", E=1.0e3, A=1.0)
+            if bulk:
+                model.add_joints(m, arange(2 * n), X)
+                model.add_truss_members(
+                    m, arange(len(chords + webs)), array(chords + webs), [s1, s2],
+                    [0] * len(chords) + [1] * len(webs)
+                )
+            else:
+                for k in range(2 * n):
+                    model.add_joint(m, k, X[k])
+                for k, c in enumerate(chords):
+                    model.add_truss_member(m, k, c, s1)
+                for k, c in enumerate(webs):
+                    model.add_truss_member(m, len(chords) + k, c, s2)
+            model.add_support(m["joints"][0], freedoms.TRANSLATION_DOFS)
+            model.add_support(m["joints"][n - 1], freedoms.U2)
+            model.add_load(m["joints"][2 * n - 3], freedoms.U2, -1.0)
+            model.number_dofs(m)
+            model.solve_statics(m)
+            return m
+
+        m1, m2 = build(True), build(False)
+        if norm(m1["U"] - m2["U"]) > 1.0e-12 * norm(m2["U"]):
+            raise ValueError("Incorrect solution")
+        if m1["metadata"]["adjacency"] != m2["metadata"]["adjacency"]:
+            raise ValueError("Incorrect adjacency")
+
+        m = model.create(2)
+        model.add_joints(m, [1, 2], [[0.0, 0.0], [1.0, 0.0]])
+        s = section.truss_section("s", E=1.0, A=1.0)
+        for mids, conn in [([1, 1], [[1, 2], [2, 1]]), ([1], [[1, 1]]), ([1], [[1, 3]])]:
+            with self.assertRaises(RuntimeError):
+                model.add_truss_members(m, mids, conn, s)
+        with self.assertRaises(RuntimeError):
+            model.add_joints(m, [2, 3], [[0.0, 0.0], [1.0, 0.0]])
+
 
 def main():
     unittest.main()
@@ -6,8 +6,10 @@ import unittest
 
 import context
 from math import sqrt, pi, cos, sin
+from time import perf_counter
 from numpy import array, dot, outer, concatenate, zeros
 from numpy.linalg import norm
+import numpy
 from pystran import model
 from pystran import section
 from pystran import geometry
@@ -15,6 +17,7 @@ from pystran import geometry
 from pystran import beam
 from pystran import truss
 from pystran import rotation
+from pystran import resultants
 
 
 class UnitTestsSpaceFrames(unittest.TestCase):
@@ -1410,6 +1413,221 @@ class UnitTestsSpaceFrames(unittest.TestCase):
         # ax.set_title("Deformation (x2))")
         # plots.show(m)
 
+    def test_lumped_mass_3d(self):
+        """
+        Lumped mass of a skewed 3d beam: the translational masses add up to the
+        mass of the beam, and the trace of the rotational inertia is invariant.
+        """
+        rho, A, Ix, h = 7850.0, 0.01, 2.0e-5, 3.0
+        e_x = array([1.0, 2.0, -2.0]) / 3.0
+        mg = beam.beam_3d_lumped_mass(e_x, h, rho, A, Ix, "HRZ")
+        if abs(mg[0:3].sum() + mg[6:9].sum() - 3 * rho * A * h) > 1.0e-9 * rho * A * h:
+            raise ValueError("Incorrect translational mass")
+        trace = rho * Ix * h / 2 + 2 * rho * A * h**3 / 78
+        if abs(mg[3:6].sum() - trace) > 1.0e-9 * trace:
+            raise ValueError("Incorrect rotational inertia")
+        mg = beam.beam_3d_lumped_mass(e_x, h, rho, A, Ix, "row-sum")
+        if norm(mg[3:6] - rho * Ix * h / 2 * e_x**2) > 1.0e-12:
+            raise ValueError("Incorrect rotational inertia")
+
+    def test_condensation_of_massless_dofs(self):
+        """
+        Space frame with massless members and translational joint masses: the
+        mass matrix is singular, but the rotations can be condensed.
+        """
+        s = section.beam_3d_section(
+            "s", E=2.0e11, G=8.0e10, A=1.0e-2, Ix=2.0e-5, Iy=1.0e-5, Iz=1.0e-5, J=2.0e-5,
+            rho=0.0, xz_vector=[0.0, 1.0, 0.0]
+        )
+        m = model.create(3)
+        freedoms = m["freedoms"]
+        corners = [[0.0, 0.0], [4.0, 0.0], [4.0, 3.0], [0.0, 3.0]]
+        for k, (x, y) in enumerate(corners):
+            model.add_joint(m, k + 1, [x, y, 0.0])
+            model.add_joint(m, k + 5, [x, y, 3.5])
+            model.add_support(m["joints"][k + 1], freedoms.ALL_DOFS)
+            model.add_mass(m["joints"][k + 5], freedoms.TRANSLATION_DOFS, 1000.0)
+        sx = section.beam_3d_section(
+            "sx", E=2.0e11, G=8.0e10, A=1.0e-2, Ix=2.0e-5, Iy=1.0e-5, Iz=1.0e-5, J=2.0e-5,
+            rho=0.0, xz_vector=[0.0, 0.0, 1.0]
+        )
+        for k in range(4):
+            model.add_beam_member(m, k + 1, [k + 1, k + 5], s)
+            model.add_beam_member(m, k + 5, [k + 5, (k + 1) % 4 + 5], sx)
+        model.number_dofs(m)
+        model.solve_free_vibration(m, condensation="auto")
+        nf = m["nfreedof"]
+        K, M = m["K"][0:nf, 0:nf], m["M"][0:nf, 0:nf]
+        V = m["eigvecs"]
+        if V.shape != (nf, 12):
+            raise ValueError("Incorrect number of modes")
+        if norm(V.T @ M @ V - numpy.eye(12)) > 1.0e-9:
+            raise ValueError("Modes must be mass-normalized")
+        R = K @ V - M @ V * m["eigvals"][None, :]
+        if norm(R) > 1.0e-6 * norm(K @ V):
+            raise ValueError("Incorrect eigenpairs")
+        # The same with the lumped mass and the rotations listed explicitly
+        rotations = [j["dof"][d] for j in m["joints"].values() for d in freedoms.ROTATION_DOFS]
+        rotations = [d for d in rotations if d < nf]
+        eigvals = m["eigvals"]
+        model.solve_free_vibration(m, lumping="row-sum", condensation=rotations)
+        if norm(m["eigvals"] - eigvals) > 1.0e-9 * norm(eigvals):
+            raise ValueError("Incorrect eigenvalues")
+        # The condensation is not available with the sparse solvers
+        for options in [dict(nmodes=4), dict(band=(1.0, 100.0))]:
+            try:
+                model.solve_free_vibration(m, condensation="auto", **options)
+            except ValueError:
+                pass
+            else:
+                raise ValueError("Condensation with the sparse solvers not detected")
+
+    def test_vectorized_end_forces(self):
+        """
+        End forces of all the members of a space frame with bracing bars, in
+        one pass, compared with the member-by-member computation.
+        """
+        s = section.beam_3d_section(
+            "s", E=2.0e11, G=8.0e10, A=1.0e-2, Ix=2.0e-5, Iy=1.0e-5, Iz=3.0e-5, J=2.0e-5,
+        )
+        sx = section.beam_3d_section(
+            "sx", E=2.0e11, G=8.0e10, A=1.0e-2, Ix=2.0e-5, Iy=1.0e-5, Iz=3.0e-5, J=2.0e-5,
+            xy_vector=[0.0, 0.0, 1.0]
+        )
+        t = section.truss_section("t", E=2.0e11, A=1.0e-3)
+        m = model.create(3)
+        freedoms = m["freedoms"]
+        corners = [[0.0, 0.0], [4.0, 0.0], [4.0, 3.0], [0.0, 3.0]]
+        for k, (x, y) in enumerate(corners):
+            model.add_joint(m, k + 1, [x, y, 0.0])
+            model.add_joint(m, k + 5, [x, y, 3.5])
+            model.add_support(m["joints"][k + 1], freedoms.ALL_DOFS)
+            model.add_load(m["joints"][k + 5], freedoms.U1, 1.0e4 * (k + 1))
+            model.add_load(m["joints"][k + 5], freedoms.U3, -2.0e4)
+        for k in range(4):
+            model.add_beam_member(m, k + 1, [k + 1, k + 5], s)
+            model.add_beam_member(m, k + 5, [k + 5, (k + 1) % 4 + 5], sx)
+            model.add_truss_member(m, k + 9, [k + 1, (k + 1) % 4 + 5], t)
+        model.number_dofs(m)
+        model.solve_statics(m)
+        result = resultants.end_forces(m)
+        b = result["beam_members"]
+        if b["forces"].shape != (8, 12):
+            raise ValueError("Incorrect shape")
+        for k, mid in enumerate(b["mids"]):
+            member = m["beam_members"][mid]
+            i, j = [m["joints"][c] for c in member["connectivity"]]
+            expected = beam.beam_3d_end_forces(member, i, j)
+            for q, key in enumerate(b["keys"]):
+                if abs(b["forces"][k, q] - expected[key]) > 1.0e-9 * abs(b["forces"]).max():
+                    raise ValueError(f"Incorrect {key} of member {mid}")
+        t = result["truss_members"]
+        for k, mid in enumerate(t["mids"]):
+            member = m["truss_members"][mid]
+            i, j = [m["joints"][c] for c in member["connectivity"]]
+            N = truss.truss_axial_force(member, i, j, 0.0)
+            if abs(t["forces"][k, 0] - N) > 1.0e-9 * abs(t["forces"]).max():
+                raise ValueError(f"Incorrect axial force of member {mid}")
+        # Several displacement vectors at once
+        U = numpy.stack([m["U"], -2.0 * m["U"]], axis=1)
+        forces = resultants.end_forces(m, U)["beam_members"]["forces"]
+        if norm(forces[:, :, 1] + 2.0 * b["forces"]) > 1.0e-9 * norm(b["forces"]):
+            raise ValueError("Incorrect forces of several cases")
+
+    def test_member_geometry_cache(self):
+        """
+        The cached geometry of the members agrees with the geometry computed
+        member by member, and it is rebuilt when the coordinates change.
+        """
+        s = section.beam_3d_section(
+            "s", E=2.0e11, G=8.0e10, A=1.0e-2, Ix=2.0e-5, Iy=1.0e-5, Iz=3.0e-5, J=2.0e-5,
+            xy_vector=[0.0, 0.0, 1.0]
+        )
+        t = section.truss_section("t", E=2.0e11, A=1.0e-3)
+        m = model.create(3)
+        model.add_joint(m, 1, [0.0, 0.0, 0.0])
+        model.add_joint(m, 2, [4.0, 1.0, 0.5])
+        model.add_joint(m, 3, [4.0, 3.0, 3.0])
+        model.add_beam_member(m, 1, [1, 2], s)
+        model.add_beam_member(m, 2, [2, 3], s)
+        model.add_truss_member(m, 3, [1, 3], t)
+        table = model.member_geometry_table(m, "beam_members")
+        for k, mid in enumerate(table["mids"]):
+            member = m["beam_members"][mid]
+            i, j = [m["joints"][c] for c in member["connectivity"]]
+            expected = geometry.member_3d_geometry(i, j, s["xy_vector"], None)
+            cached = geometry.member_geometry(member, i, j)
+            for a, b in zip(expected, cached):
+                if norm(a - b) > 1.0e-12:
+                    raise ValueError("Incorrect cached geometry")
+        if abs(model.volume(m) - (table["h"].sum() * 1.0e-2 + sqrt(34.0) * 1.0e-3)) > 1.0e-12:
+            raise ValueError("Incorrect volume")
+        # Members added later are included
+        model.add_joint(m, 4, [0.0, 3.0, 0.0])
+        model.add_beam_member(m, 4, [3, 4], s)
+        if len(model.member_geometry_table(m, "beam_members")["h"]) != 3:
+            raise ValueError("New member not included")
+        # Moving a joint discards the cache
+        model.move_joint(m, 3, [4.0, 3.0, 6.0])
+        if m["metadata"]["geometry"] is not None:
+            raise ValueError("Cache not discarded")
+        table = model.member_geometry_table(m, "beam_members")
+        if abs(table["h"][1] - sqrt(4.0 + 36.0 - 12.0 * 0.5 + 0.25)) > 1.0e-12:
+            raise ValueError("Geometry not rebuilt")
+        if abs(model.volume(m) - (table["h"].sum() * 1.0e-2 + sqrt(61.0) * 1.0e-3)) > 1.0e-12:
+            raise ValueError("Stale geometry of the truss member")
+        # The members do not hold any geometry
+        if any("geometry" in member for member in m["beam_members"].values()):
+            raise ValueError("Geometry stored in the members")
+        # Changing the orientation of the section
+        model.set_section_orientation(m, s, xy_vector=[1.0, 0.0, 0.0])
+        i, j = m["joints"][1], m["joints"][2]
+        expected = geometry.member_3d_geometry(i, j, s["xy_vector"], None)
+        if norm(model.member_geometry_table(m, "beam_members")["e_y"][0] - expected[1]) > 1.0e-12:
+            raise ValueError("Stale orientation of the section")
+        try:
+            model.set_section_orientation(m, s, [1.0, 0.0, 0.0], [0.0, 0.0, 1.0])
+        except ValueError:
+            pass
+        else:
+            raise ValueError("Two orientation vectors accepted")
+        # Direct modifications require a rebuild
+        m["joints"][4]["coordinates"][2] = 4.0
+        table = model.member_geometry_table(m, "beam_members", rebuild=True)
+        if abs(table["h"][2] - sqrt(16.0 + 4.0)) > 1.0e-12:
+            raise ValueError("Geometry not rebuilt")
+
+    def test_member_geometry_cache_speedup(self):
+        """
+        Retrieving the cached geometry of many members is much faster than
+        computing it.
+        """
+        s = section.beam_3d_section(
+            "s", E=2.0e11, G=8.0e10, A=1.0e-2, Ix=2.0e-5, Iy=1.0e-5, Iz=3.0e-5, J=2.0e-5,
+            xy_vector=[0.0, 0.0, 1.0]
+        )
+        n = 5000
+        X = numpy.zeros((n + 1, 3))
+        X[:, 0] = numpy.arange(n + 1)
+        X[:, 1] = numpy.sin(numpy.arange(n + 1))
+        m = model.create(3)
+        model.add_joints(m, numpy.arange(n + 1), X)
+        model.add_beam_members(m, numpy.arange(n), numpy.stack([numpy.arange(n), numpy.arange(1, n + 1)], axis=1), s)
+
+        def best(rebuild):
+            times = []
+            for _ in range(5):
+                start = perf_counter()
+                model.member_geometry_table(m, "beam_members", rebuild)
+                times.append(perf_counter() - start)
+            return min(times)
+
+        computed = best(True)
+        model.member_geometry_table(m, "beam_members")
+        cached = best(False)
+        if cached * 10.0 > computed:
+            raise ValueError(f"No speedup from the cache: {computed} versus {cached}")
+
 
 def main():
     unittest.main()
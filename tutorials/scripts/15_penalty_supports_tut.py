@@ -120,7 +120,10 @@ model.add_truss_member(
 
 # %% [markdown]
 # Since the model is so simple, we can print it to inspect all items.
-# Noted that each of the bars has its own section.
+# Noted that each of the bars has its own section. The model also holds its
+# metadata (key `metadata`): the number of members of each kind, the members
+# connected to each joint, and the number of supported rotations, which the
+# `model` functions keep up to date.
 # 
 
 # %%